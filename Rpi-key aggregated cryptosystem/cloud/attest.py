@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# cloud/attest.py - device attestation: nonce challenge, ATECC signature, session token.
+#
+#   POST /auth/challenge           -> {"nonce", "ttl"}         single use, CHALLENGE_TTL seconds
+#   POST /auth/session {serial, nonce, sig}
+#                                  -> {"token", "expires"}     sig = P-256 r||s over sha256(message())
+#   Authorization: Bearer <token>  on /download and /list
+#
+# A device signs once per session instead of once per request; the token is
+# "<serial>.<expires>.<hmac>" under a server key kept in storage/, so checking it costs one
+# HMAC and no state. Devices are enrolled in devices.json ({serial: {"pub": x||y hex, "name"}}),
+# re-read when it changes, so removing a device also kills its live tokens.
+#
+#   python3 attest.py add <serial> <pub_hex> [--name NAME]     (both printed by member/atecc_attest.py)
+import os, sys, hmac, json, time, secrets, hashlib, argparse
+from Cryptodome.PublicKey import ECC
+from Cryptodome.Signature import DSS
+from Cryptodome.Hash import SHA256
+
+CHALLENGE_TTL = 60
+TOKEN_TTL = 15 * 60
+MAX_PENDING = 10000
+
+def message(nonce: bytes, serial: str) -> bytes:
+    """What the device signs; binds the nonce to the device and to this protocol."""
+    return b"kac/attest/v1\0" + nonce + bytes.fromhex(serial)
+
+def _load_key(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        key = secrets.token_bytes(32)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        return key
+
+class Devices:
+    """devices.json, reloaded when its mtime changes."""
+
+    def __init__(self, path):
+        self.path, self._mtime, self._devs, self._keys = path, None, {}, {}
+
+    def get(self, serial: str):
+        try:
+            m = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            m = None
+        if m != self._mtime:
+            self._devs, self._keys, self._mtime = {}, {}, m
+            if m is not None:
+                with open(self.path) as f:
+                    self._devs = {k.lower(): v for k, v in json.load(f).items()}
+        return self._devs.get(serial.lower())
+
+    def public_key(self, serial: str):
+        dev = self.get(serial)
+        if not dev:
+            return None
+        k = self._keys.get(serial)
+        if k is None:
+            xy = bytes.fromhex(dev["pub"])
+            k = self._keys[serial] = ECC.construct(curve="P-256", point_x=int.from_bytes(xy[:32], "big"),
+                                                   point_y=int.from_bytes(xy[32:], "big"))
+        return k
+
+class Attestation:
+    def __init__(self, devices_path, key_path, token_ttl=TOKEN_TTL):
+        self.devices = Devices(devices_path)
+        self._key = _load_key(key_path)
+        self.token_ttl = token_ttl
+        self._pending = {}   # nonce -> expiry
+
+    def challenge(self):
+        now = time.time()
+        if len(self._pending) >= MAX_PENDING:
+            self._pending = {n: t for n, t in self._pending.items() if t > now}
+            if len(self._pending) >= MAX_PENDING:
+                raise OverflowError("too many open challenges")
+        nonce = secrets.token_bytes(32)
+        self._pending[nonce] = now + CHALLENGE_TTL
+        return nonce.hex()
+
+    def session(self, serial: str, nonce_hex: str, sig_hex: str):
+        """Token string, or ValueError saying why not."""
+        nonce = bytes.fromhex(nonce_hex)
+        if self._pending.pop(nonce, 0) < time.time():   # single use, even if the signature is bad
+            raise ValueError("unknown or expired challenge")
+        key = self.devices.public_key(serial)
+        if key is None:
+            raise ValueError("device not enrolled")
+        try:
+            DSS.new(key, "fips-186-3").verify(SHA256.new(message(nonce, serial)), bytes.fromhex(sig_hex))
+        except ValueError:
+            raise ValueError("bad signature")
+        exp = int(time.time()) + self.token_ttl
+        body = f"{serial.lower()}.{exp}"
+        return f"{body}.{self._mac(body)}", exp
+
+    def _mac(self, body: str) -> str:
+        return hmac.new(self._key, body.encode(), hashlib.sha256).hexdigest()
+
+    def check(self, auth_header):
+        """Serial of a valid 'Bearer <token>', else None."""
+        if not auth_header or not auth_header.startswith("Bearer "):
+            return None
+        serial, _, rest = auth_header[7:].strip().partition(".")
+        exp, _, mac = rest.partition(".")
+        if not (exp.isdigit() and hmac.compare_digest(mac, self._mac(f"{serial}.{exp}"))):
+            return None
+        if int(exp) < time.time() or not self.devices.get(serial):
+            return None
+        return serial
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Enroll member devices for attestation")
+    sub = ap.add_subparsers(dest="op", required=True)
+    p = sub.add_parser("add")
+    p.add_argument("serial")
+    p.add_argument("pub", help="uncompressed P-256 public key, x||y hex (128 chars)")
+    p.add_argument("--name", default="")
+    p = sub.add_parser("remove")
+    p.add_argument("serial")
+    ap.add_argument("--devices", default="devices.json")
+    args = ap.parse_args()
+
+    devs = json.load(open(args.devices)) if os.path.exists(args.devices) else {}
+    if args.op == "add":
+        if len(bytes.fromhex(args.pub)) != 64:
+            sys.exit("pub must be 64 bytes (x||y) in hex")
+        devs[args.serial.lower()] = {"pub": args.pub.lower(), "name": args.name}
+    else:
+        devs.pop(args.serial.lower(), None)
+    tmp = args.devices + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(devs, f, indent=2)
+    os.replace(tmp, args.devices)
+    print(f"[OK] {len(devs)} device(s) in {args.devices}")
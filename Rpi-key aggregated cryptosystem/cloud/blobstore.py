@@ -0,0 +1,163 @@
+# cloud/blobstore.py
+# Content-addressed, deduplicated storage for ciphertext blobs.
+#
+#   storage/blobs/ab/cd/<sha256>        immutable ciphertext, keyed by its SHA-256
+#   storage/blobs/ab/cd/<sha256>.ref    number of names pointing at it
+#   storage/names/xx/yy/<filename>      {"digest": ..., "header": {...}}  (xx/yy = sha256(name))
+#
+# A name entry is one small file replaced with rename, so a reader always gets a
+# header together with the digest it was uploaded with; blobs never change in place.
+# Pre-CAS uploads (storage/<fn> + storage/<fn>.hdr) are still served read-only.
+import os, json, hashlib, tempfile, threading, zlib
+
+_STRIPES = 256
+
+def _fan(h: str) -> str:
+    return os.path.join(h[:2], h[2:4])
+
+def valid_digest(d) -> bool:
+    return isinstance(d, str) and len(d) == 64 and all(c in "0123456789abcdef" for c in d)
+
+class BlobStore:
+    def __init__(self, root="storage"):
+        self.root = root
+        self.tmp = os.path.join(root, "tmp")
+        os.makedirs(self.tmp, exist_ok=True)
+        # lock order is always name -> blob, never the other way round
+        self._name_locks = [threading.Lock() for _ in range(_STRIPES)]
+        self._blob_locks = [threading.Lock() for _ in range(_STRIPES)]
+
+    @staticmethod
+    def _stripe(locks, key: str) -> threading.Lock:
+        return locks[zlib.crc32(key.encode()) % _STRIPES]
+
+    # ---------------- paths ----------------
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", _fan(digest), digest)
+
+    def name_path(self, name: str) -> str:
+        h = hashlib.sha256(name.encode()).hexdigest()
+        return os.path.join(self.root, "names", _fan(h), name)
+
+    def has(self, digest: str) -> bool:
+        return valid_digest(digest) and os.path.exists(self.blob_path(digest))
+
+    # ---------------- writes ----------------
+    def new_temp(self):
+        """(fd, path) of a temp file on the same filesystem as the blobs."""
+        return tempfile.mkstemp(prefix=".up_", dir=self.tmp)
+
+    def _replace(self, tmp: str, dst: str):
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        os.replace(tmp, dst)
+
+    def _adjust_ref(self, digest: str, delta: int, tmp: str = None):
+        """Add delta to digest's refcount. With tmp, first move it into place as the
+        blob (or drop it if the blob is already stored). Collects the blob at zero."""
+        path = self.blob_path(digest)
+        with self._stripe(self._blob_locks, digest):
+            if tmp:
+                if os.path.exists(path):
+                    os.unlink(tmp)
+                else:
+                    self._replace(tmp, path)
+            if delta > 0 and not os.path.exists(path):
+                raise KeyError(digest)
+            try:
+                with open(path + ".ref") as f:
+                    n = int(f.read() or 0)
+            except FileNotFoundError:
+                n = 0
+            n += delta
+            if n > 0:
+                fd, rtmp = self.new_temp()
+                with os.fdopen(fd, "w") as f:
+                    f.write(str(n))
+                os.replace(rtmp, path + ".ref")
+                return
+            for p in (path, path + ".ref"):   # last name gone: collect the blob
+                try:
+                    os.unlink(p)
+                except FileNotFoundError:
+                    pass
+
+    def link(self, name: str, header: dict, digest: str, tmp: str = None):
+        """Point `name` at blob `digest`, releasing whatever it pointed at before.
+        tmp is the freshly uploaded ciphertext; without it the blob must already
+        be stored (dedup hit), otherwise KeyError."""
+        dst = self.name_path(name)
+        with self._stripe(self._name_locks, dst):
+            old = self._read_entry(dst)
+            old_digest = old["digest"] if old else None
+            if old_digest != digest:
+                self._adjust_ref(digest, +1, tmp)
+            elif tmp:
+                os.unlink(tmp)
+            fd, etmp = self.new_temp()
+            with os.fdopen(fd, "w") as f:
+                json.dump({"digest": digest, "header": header}, f)
+            self._replace(etmp, dst)
+            if old_digest and old_digest != digest:
+                self._adjust_ref(old_digest, -1)
+
+    def rewrite_headers(self, updates) -> int:
+        """updates: [(name, entry_as_read, new_header)]. Swap each name's header and keep
+        its blob (legacy entries have digest None and live in <name>.hdr). An entry that
+        changed since it was read is left alone. The batch is synced once instead of
+        fsyncing every entry. Returns the number of headers written."""
+        staged = []
+        for name, old, hdr in updates:
+            fd, etmp = self.new_temp()
+            with os.fdopen(fd, "w") as f:
+                json.dump({"digest": old["digest"], "header": hdr} if old["digest"] else hdr, f)
+            staged.append((name, old, etmp))
+        os.sync()
+        n = 0
+        for name, old, etmp in staged:
+            dst = self.name_path(name) if old["digest"] else os.path.join(self.root, name + ".hdr")
+            with self._stripe(self._name_locks, dst):
+                cur = self._read_entry(dst)
+                if cur is not None and not old["digest"]:
+                    cur = {"digest": None, "header": cur}
+                if cur == old:
+                    os.replace(etmp, dst)
+                    n += 1
+                else:
+                    os.unlink(etmp)
+        return n
+
+    # ---------------- reads ----------------
+    @staticmethod
+    def _read_entry(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def lookup(self, name: str):
+        """(header_dict, digest_or_None) for name, or None. Legacy objects have no digest."""
+        e = self._read_entry(self.name_path(name))
+        if e:
+            return e["header"], e["digest"]
+        legacy = os.path.join(self.root, name)
+        try:
+            with open(legacy + ".hdr") as f:
+                return json.load(f), None
+        except FileNotFoundError:
+            return None
+
+    def open(self, name: str):
+        """(header_dict, open blob file) for name, or None."""
+        for _ in range(3):   # a concurrent re-upload may GC the blob between the two reads
+            found = self.lookup(name)
+            if not found:
+                return None
+            hdr, digest = found
+            try:
+                return hdr, open(self.blob_path(digest) if digest else os.path.join(self.root, name), "rb")
+            except FileNotFoundError:
+                continue
+        return None
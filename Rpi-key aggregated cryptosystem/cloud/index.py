@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# cloud/index.py
+# SQLite (WAL) metadata index over the blob store, so objects can be listed and
+# filtered by class/time without globbing and parsing thousands of header files.
+#
+#   python3 index.py build [--storage storage]   # one bulk pass over an existing storage/
+import os, json, time, sqlite3, threading, argparse, datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    name      TEXT PRIMARY KEY,
+    class     TEXT,
+    size      INTEGER,
+    uploaded  REAL,
+    ct_sha256 TEXT,
+    pt_sha256 TEXT,
+    env       TEXT
+);
+CREATE INDEX IF NOT EXISTS objects_class_time ON objects(class, uploaded, name);
+CREATE INDEX IF NOT EXISTS objects_time ON objects(uploaded, name);
+"""
+
+_COLS = ("name", "class", "size", "uploaded", "ct_sha256", "pt_sha256", "env")
+
+def _row(name, hdr, size, uploaded):
+    env = hdr.get("env")
+    return (name, hdr.get("class"), size, uploaded, hdr.get("ct_sha256"),
+            hdr.get("pt_sha256"), json.dumps(env) if env is not None else None)
+
+def parse_since(s):
+    """Epoch seconds or ISO-8601 -> epoch seconds."""
+    try:
+        return float(s)
+    except ValueError:
+        dt = datetime.datetime.fromisoformat(s)
+        if dt.tzinfo is None:
+            dt = dt.astimezone()
+        return dt.timestamp()
+
+class Index:
+    def __init__(self, path="storage/index.db"):
+        self.path = path
+        self._local = threading.local()   # one connection per (executor) thread
+        with self._conn() as db:
+            db.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def put(self, name, hdr, size, uploaded=None):
+        with self._conn() as db:
+            db.execute(f"INSERT OR REPLACE INTO objects VALUES ({','.join('?' * len(_COLS))})",
+                       _row(name, hdr, size, time.time() if uploaded is None else uploaded))
+
+    def put_many(self, rows):
+        """rows: iterable of (name, hdr, size, uploaded); one transaction."""
+        with self._conn() as db:
+            db.executemany(f"INSERT OR REPLACE INTO objects VALUES ({','.join('?' * len(_COLS))})",
+                           (_row(*r) for r in rows))
+
+    def list(self, cls=None, since=None, after=None, limit=100):
+        """One page ordered by (uploaded, name). `after` is the previous page's cursor."""
+        where, args = [], []
+        if cls is not None:
+            where.append("class = ?"); args.append(cls)
+        if since is not None:
+            where.append("uploaded >= ?"); args.append(since)
+        if after:
+            ts, _, name = after.partition("|")
+            where.append("(uploaded, name) > (?, ?)"); args += [float(ts), name]
+        sql = ("SELECT * FROM objects" + (" WHERE " + " AND ".join(where) if where else "")
+               + " ORDER BY uploaded, name LIMIT ?")
+        rows = self._conn().execute(sql, args + [limit]).fetchall()
+        items = []
+        for r in rows:
+            d = dict(zip(_COLS, r))
+            d["env"] = json.loads(d["env"]) if d["env"] else None
+            d["uploaded_iso"] = datetime.datetime.fromtimestamp(d["uploaded"]).isoformat(timespec="seconds")
+            items.append(d)
+        nxt = f"{rows[-1][3]!r}|{rows[-1][0]}" if len(rows) == limit else None
+        return items, nxt
+
+def _scan(storage):
+    """Yield (name, hdr, size, mtime) for every object in a storage/ directory."""
+    from blobstore import BlobStore
+    store = BlobStore(storage)
+    names = os.path.join(storage, "names")
+    for dirpath, _, files in os.walk(names):
+        for fn in files:
+            p = os.path.join(dirpath, fn)
+            try:
+                with open(p) as f:
+                    e = json.load(f)
+                st = os.stat(store.blob_path(e["digest"]))
+            except (OSError, ValueError, KeyError):
+                continue
+            yield fn, e["header"], st.st_size, os.path.getmtime(p)
+    with os.scandir(storage) as it:   # pre-CAS flat layout
+        for de in it:
+            if de.is_file() and de.name.endswith(".hdr") and os.path.isfile(de.path[:-4]):
+                try:
+                    with open(de.path) as f:
+                        hdr = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                yield de.name[:-4], hdr, os.path.getsize(de.path[:-4]), de.stat().st_mtime
+
+def build(storage="storage", batch=10000):
+    idx = Index(os.path.join(storage, "index.db"))
+    n, t0, buf = 0, time.perf_counter(), []
+    for row in _scan(storage):
+        buf.append(row)
+        if len(buf) >= batch:
+            idx.put_many(buf); n += len(buf); buf = []
+    idx.put_many(buf); n += len(buf)
+    dt = time.perf_counter() - t0
+    print(f"✅ Indexed {n} objects in {dt:.1f}s ({n / max(dt, 1e-9):.0f}/s) -> {idx.path}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="KAC cloud metadata index")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_b = sub.add_parser("build", help="(re)build the index from an existing storage/ directory")
+    p_b.add_argument("--storage", default="storage")
+    args = ap.parse_args()
+    build(args.storage)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# cloud/loadtest.py
+# Hammer a running server.py (started with --allow-anonymous: the downloads carry no token)
+# with concurrent uploads/downloads of a few shared names
+# and check every download is a consistent (header, blob) pair: the blob must hash
+# to the ct_sha256 of the header it came with.
+import os, sys, json, time, asyncio, hashlib, argparse
+import aiohttp
+
+async def _client(sess, base, names, size, rounds, lat, errors):
+    for i in range(rounds):
+        fn = names[i % len(names)]
+        blob = os.urandom(size)
+        hdr = {"class": "load", "ct_sha256": hashlib.sha256(blob).hexdigest()}
+        form = aiohttp.FormData()
+        form.add_field("header", json.dumps(hdr))
+        form.add_field("filename", fn)
+        form.add_field("file", blob, filename=fn, content_type="application/octet-stream")
+        t0 = time.perf_counter()
+        async with sess.post(f"{base}/upload", data=form) as r:
+            if r.status != 200:
+                errors.append(f"upload {fn}: {r.status}")
+        lat["upload"].append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        async with sess.get(f"{base}/download/{fn}") as r:
+            body = await r.read()
+            if r.status != 200:
+                errors.append(f"download {fn}: {r.status}")
+            elif hashlib.sha256(body).hexdigest() != json.loads(r.headers["X-KAC-HEADER"])["ct_sha256"]:
+                errors.append(f"download {fn}: header/blob mismatch")
+        lat["download"].append(time.perf_counter() - t0)
+
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p / 100 * len(xs)))] * 1000 if xs else 0.0
+
+async def main(args):
+    names = [f"load_{i}.bin" for i in range(args.names)]
+    lat, errors = {"upload": [], "download": []}, []
+    conn = aiohttp.TCPConnector(limit=args.clients)
+    async with aiohttp.ClientSession(connector=conn) as sess:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(_client(sess, args.base, names, args.size, args.rounds, lat, errors)
+                               for _ in range(args.clients)))
+        dt = time.perf_counter() - t0
+    n = args.clients * args.rounds * 2
+    print(f"{args.clients} clients x {args.rounds} rounds, {args.size} B blobs: "
+          f"{n / dt:.0f} req/s, {n * args.size / dt / 1e6:.1f} MB/s")
+    for k, v in lat.items():
+        print(f"  {k:8s} p50 {_pct(v, 50):7.1f} ms  p99 {_pct(v, 99):7.1f} ms")
+    for e in errors[:10]:
+        print("  [ERR]", e)
+    print(f"  {len(errors)} errors")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Concurrent load test for server.py")
+    ap.add_argument("--base", default="http://127.0.0.1:5000")
+    ap.add_argument("--clients", type=int, default=200)
+    ap.add_argument("--rounds", type=int, default=10)
+    ap.add_argument("--size", type=int, default=64 * 1024)
+    ap.add_argument("--names", type=int, default=8, help="shared object names (forces same-name races)")
+    sys.exit(asyncio.run(main(ap.parse_args())))
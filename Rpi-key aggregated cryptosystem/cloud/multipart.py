@@ -0,0 +1,109 @@
+# cloud/multipart.py
+# Upload sessions for large ciphertexts over flaky links.
+#
+#   storage/uploads/<id>/meta.json      {"filename", "size", "part_size", "created"}
+#   storage/uploads/<id>/data           sparse file, part n lives at n * part_size
+#   storage/uploads/<id>/parts/<n>      sha256 of part n, written only after it verified
+#
+# Parts are written in place, so "assembling" is just hashing the data file once and
+# handing it to BlobStore.link. Re-sending a part rewrites the same bytes (idempotent).
+# The data file sits under storage/ so the final rename stays on one filesystem.
+import os, json, time, uuid, shutil, hashlib
+
+MIN_PART = 64 * 1024
+MAX_PART = 256 * 1024 * 1024
+MAX_AGE = 7 * 86400   # abandoned sessions are dropped after a week
+
+class Sessions:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, sid: str) -> str:
+        if not (isinstance(sid, str) and len(sid) == 32 and all(c in "0123456789abcdef" for c in sid)):
+            raise KeyError(sid)
+        return os.path.join(self.root, sid)
+
+    def create(self, filename: str, size: int, part_size: int) -> dict:
+        if not MIN_PART <= part_size <= MAX_PART or size < 0:
+            raise ValueError("bad size or part_size")
+        sid = uuid.uuid4().hex
+        d = self._dir(sid)
+        os.makedirs(os.path.join(d, "parts"))
+        with open(os.path.join(d, "data"), "wb") as f:
+            f.truncate(size)
+        meta = {"id": sid, "filename": filename, "size": size, "part_size": part_size,
+                "parts": max(1, -(-size // part_size)), "created": time.time()}
+        with open(os.path.join(d, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        return meta
+
+    def meta(self, sid: str) -> dict:
+        try:
+            with open(os.path.join(self._dir(sid), "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(sid)
+
+    def received(self, sid: str) -> dict:
+        d = os.path.join(self._dir(sid), "parts")
+        out = {}
+        try:
+            for n in os.listdir(d):
+                if not n.startswith("."):
+                    with open(os.path.join(d, n)) as f:
+                        out[int(n)] = f.read()
+        except FileNotFoundError:   # dropped meanwhile
+            raise KeyError(sid)
+        return out
+
+    @staticmethod
+    def span(meta: dict, n: int):
+        """(offset, length) of part n, or ValueError."""
+        if not 0 <= n < meta["parts"]:
+            raise ValueError(f"part {n} out of range 0-{meta['parts'] - 1}")
+        off = n * meta["part_size"]
+        return off, min(meta["part_size"], meta["size"] - off)
+
+    def data_fd(self, sid: str) -> int:
+        try:
+            return os.open(os.path.join(self._dir(sid), "data"), os.O_WRONLY)
+        except FileNotFoundError:
+            raise KeyError(sid)
+
+    def mark(self, sid: str, n: int, digest: str):
+        d = os.path.join(self._dir(sid), "parts")
+        tmp = os.path.join(d, f".{n}.tmp")
+        try:
+            with open(tmp, "w") as f:
+                f.write(digest)
+            os.replace(tmp, os.path.join(d, str(n)))
+        except FileNotFoundError:
+            raise KeyError(sid)
+
+    def finish(self, sid: str):
+        """(data_path, sha256, size) once every part is in; ValueError otherwise, KeyError
+        if the session is gone."""
+        meta = self.meta(sid)
+        missing = set(range(meta["parts"])) - set(self.received(sid))
+        if missing:
+            raise ValueError(f"{len(missing)} part(s) missing, first {min(missing)}")
+        path = os.path.join(self._dir(sid), "data")
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            while b := f.read(1 << 20):
+                h.update(b)
+        return path, h.hexdigest(), meta["size"]
+
+    def drop(self, sid: str):
+        shutil.rmtree(self._dir(sid), ignore_errors=True)
+
+    def gc(self, max_age=MAX_AGE):
+        cutoff = time.time() - max_age
+        for sid in os.listdir(self.root):
+            p = os.path.join(self.root, sid)
+            try:
+                if os.path.getmtime(p) < cutoff:
+                    shutil.rmtree(p, ignore_errors=True)
+            except OSError:
+                pass
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# cloud/rewrap.py - key rotation without re-encryption.
+# Walks every stored header, unwraps the per-file key with the old aggregate key and
+# wraps it again with the new one. Only name entries / .hdr files are rewritten; the
+# ciphertext blobs (and their ct_sha256) are never touched, so dedup and the index stay valid.
+#
+#   python3 rewrap.py --old old_agg.json --new new_agg.json [--storage storage] [--workers 4]
+#
+# Run it where the storage directory lives, with both key files to hand (they are only
+# read, never sent anywhere). Headers are handled in batches by a process pool; after each
+# batch that completed in order the position is saved to --checkpoint, so an interrupted
+# run continues where it stopped. Before rewriting, the old wrap is checked against the
+# blob's first segment tag (one segment read; single-shot v1 objects are streamed through
+# GCM once), so headers wrapped under some other key are skipped instead of being
+# corrupted; --no-verify skips that read, and can't be used to resume a run.
+import os, sys, json, time, hashlib, argparse, collections
+from concurrent.futures import ProcessPoolExecutor
+from Cryptodome.Cipher import AES
+from blobstore import BlobStore
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "member"))
+from kac_client import KACClient
+from kac_stream import _nonce, TAG_LEN
+
+BATCH = 500
+
+def entries(storage):
+    """Yield (pos, name, entry) in a fixed order; pos only grows, so it is the checkpoint."""
+    names = os.path.join(storage, "names")
+    for a in sorted(os.listdir(names)) if os.path.isdir(names) else []:
+        for b in sorted(os.listdir(os.path.join(names, a))):
+            d = os.path.join(names, a, b)
+            for fn in sorted(os.listdir(d)):
+                yield f"{a}/{b}/{fn}", fn, os.path.join(d, fn)
+    for fn in sorted(os.listdir(storage)):   # pre-CAS flat layout sorts after the hex fan-out
+        if fn.endswith(".hdr") and os.path.isfile(os.path.join(storage, fn[:-4])):
+            yield f"legacy/{fn}", fn[:-4], os.path.join(storage, fn)
+
+def _batches(it, n=BATCH):
+    batch = []
+    for x in it:
+        batch.append(x)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _fingerprint(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+_w = None
+
+def _init(storage, old, new, verify):
+    global _w
+    _w = (BlobStore(storage), KACClient(old), KACClient(new), verify)
+
+def _opens(blob, key, hdr):
+    """True if key opens the blob's first segment."""
+    chunk, size = hdr["chunk"], hdr["size"]
+    n = min(chunk, size)
+    with open(blob, "rb") as f:
+        seg = f.read(n + TAG_LEN)
+    c = AES.new(key, AES.MODE_GCM, nonce=_nonce(bytes.fromhex(hdr["nonce"]), 0, size <= chunk))
+    try:
+        c.decrypt_and_verify(seg[:-TAG_LEN], seg[-TAG_LEN:])
+        return True
+    except ValueError:
+        return False
+
+def _opens_v1(blob, key, hdr, blk=1 << 20):
+    """True if key opens a single-shot (v1) blob; reads it all once."""
+    c = AES.new(key, AES.MODE_GCM, nonce=bytes.fromhex(hdr["nonce"]))
+    with open(blob, "rb") as f:
+        while b := f.read(blk):
+            c.decrypt(b)
+    try:
+        c.verify(bytes.fromhex(hdr["tag"]))
+        return True
+    except ValueError:
+        return False
+
+def _rewrap_batch(batch):
+    store, old, new, verify = _w
+    stats = collections.Counter()
+    updates = []
+    for _, name, path in batch:
+        try:
+            with open(path) as f:
+                e = json.load(f)
+        except (OSError, ValueError):
+            stats["unreadable"] += 1
+            continue
+        if path.endswith(".hdr"):
+            e = {"digest": None, "header": e}
+        hdr = e["header"]
+        cls = hdr.get("class")
+        if not (old.authorized(cls) and new.authorized(cls)) or "wrap" not in hdr:
+            stats["other_class"] += 1
+            continue
+        key = old.unwrap(hdr["wrap"], cls)
+        if verify:
+            opens = _opens if hdr.get("v", 1) >= 2 else _opens_v1
+            blob = store.blob_path(e["digest"]) if e["digest"] else path[:-4]
+            try:
+                if not opens(blob, key, hdr):   # a batch finished before an interrupt, or a foreign key
+                    stats["already_new" if opens(blob, new.unwrap(hdr["wrap"], cls), hdr) else "other_key"] += 1
+                    continue
+            except OSError:
+                stats["unreadable"] += 1
+                continue
+        updates.append((name, e, dict(hdr, wrap=new.wrap(key, cls))))
+    written = store.rewrite_headers(updates) if updates else 0
+    stats["rewrapped"] += written
+    stats["changed_meanwhile"] += len(updates) - written
+    return stats
+
+def _save(ckpt, state):
+    tmp = ckpt + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, ckpt)
+
+def _wrong_key(total):
+    # every checked wrap failed under both keys: almost certainly the wrong --old file
+    return total["other_key"] and not total["rewrapped"] and not total["already_new"]
+
+def rewrap(storage, old, new, workers=4, checkpoint="rewrap.checkpoint.json", verify=True):
+    keys = [_fingerprint(old), _fingerprint(new)]
+    state = {"storage": os.path.abspath(storage), "keys": keys, "pos": "", "stats": {}}
+    if os.path.exists(checkpoint):
+        saved = json.load(open(checkpoint))
+        if saved.get("keys") != keys or saved.get("storage") != state["storage"]:
+            sys.exit(f"{checkpoint} belongs to another rotation; remove it to start over")
+        if not verify:
+            # batches past pos may already be rewritten; unwrapping those with the old key
+            # would write garbage back, and only verification can tell them apart
+            sys.exit(f"{checkpoint} exists: resume without --no-verify (or remove it and start over)")
+        state = saved
+        print(f"[OK] Resuming after {state['pos'] or 'start'}")
+    total = collections.Counter(state["stats"])
+    todo = (x for x in entries(storage) if x[0] > state["pos"])
+
+    t0, seen = time.perf_counter(), 0
+    with ProcessPoolExecutor(workers, initializer=_init, initargs=(storage, old, new, verify)) as pool:
+        window = collections.deque()
+        batches = _batches(todo)
+        def fill():
+            while len(window) < workers * 4:
+                b = next(batches, None)
+                if b is None:
+                    return
+                window.append((b[-1][0], len(b), pool.submit(_rewrap_batch, b)))
+        try:
+            fill()
+            while window:   # results are taken in submission order, so pos is a low-water mark
+                pos, n, fut = window.popleft()
+                total.update(fut.result())
+                seen += n
+                state.update(pos=pos, stats=dict(total))
+                _save(checkpoint, state)
+                fill()
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            sys.exit(f"Interrupted after {state['pos'] or 'start'}; run again to resume")
+    dt = time.perf_counter() - t0
+    if os.path.exists(checkpoint):
+        os.unlink(checkpoint)
+    left = total["unreadable"] + total["changed_meanwhile"]
+    if _wrong_key(total):
+        print(f"[WARN] Nothing rotated: {total['other_key']} headers open under neither key - is --old right?")
+    elif left:
+        print(f"[WARN] Rotation incomplete: {seen} headers in {dt:.2f}s, {left} may still be under the old key")
+    else:
+        print(f"✅ Rotation done: {seen} headers in {dt:.2f}s ({seen / dt if dt else 0:.0f} headers/s)")
+    for k, v in sorted(total.items()):
+        print(f"   {k:18s} {v}")
+    return total
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Re-wrap stored headers from an old aggregate key to a new one")
+    ap.add_argument("--old", required=True, help="old aggregate key file")
+    ap.add_argument("--new", required=True, help="new aggregate key file")
+    ap.add_argument("--storage", default="storage")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--checkpoint", default="rewrap.checkpoint.json")
+    ap.add_argument("--no-verify", dest="verify", action="store_false",
+                    help="do not check the old wrap against the blob before rewriting")
+    args = ap.parse_args()
+    total = rewrap(args.storage, args.old, args.new, args.workers, args.checkpoint, args.verify)
+    sys.exit(1 if total["unreadable"] + total["changed_meanwhile"] or _wrong_key(total) else 0)
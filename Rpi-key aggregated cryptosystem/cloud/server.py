@@ -1,23 +1,367 @@
-from flask import Flask, request, send_file, make_response
-import os, json
-app = Flask(__name__)
-os.makedirs("storage", exist_ok=True)
-
-@app.post("/upload")
-def upload():
-    f = request.files["file"]
-    fn = request.form["filename"]
-    hdr = json.loads(request.form["header"])
-    open(f"storage/{fn}", "wb").write(f.read())
-    open(f"storage/{fn}.hdr", "w").write(json.dumps(hdr))
-    return "OK"
-
-@app.get("/download/<fn>")
-def download(fn):
-    hdr = open(f"storage/{fn}.hdr").read()
-    resp = make_response(send_file(f"storage/{fn}"))
-    resp.headers["X-KAC-HEADER"] = hdr
+# cloud/server.py
+# Blind storage for ciphertext + KAC headers (asyncio / aiohttp).
+# Upload bodies are streamed straight to a temp file while being hashed, then
+# handed to the content-addressed BlobStore: identical ciphertext is kept once,
+# and a name flips to its new (header, blob) pair with a single rename, so nobody
+# sees a new header next to an old blob. Clients HEAD /blob/<ct_sha256> first and
+# skip sending bytes the server already holds. Downloads use sendfile + HTTP Range,
+# with ETag "<ct_sha256>": members holding that blob get a 304 carrying only the header.
+# Members attest once per session (/auth, see attest.py) and send the token with downloads
+# and listings; a missing or bad token is a 401 unless the server runs with --allow-anonymous.
+# Large ciphertexts can go up as a resumable session (/uploads, see multipart.py):
+# numbered parts are PUT independently and in any order, then completed in one call.
+# Per-route and per-stage timings are kept as histograms (member/kac_metrics.py) and served
+# in Prometheus text format on GET /metrics.
+import os, sys, json, time, asyncio, hashlib, argparse, contextlib
+from aiohttp import web
+from blobstore import BlobStore, valid_digest
+from index import Index, parse_since
+from multipart import Sessions
+from attest import Attestation, CHALLENGE_TTL
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "member"))
+import kac_header, kac_metrics   # binary header codec and stage timings, shared with the members
+
+STORAGE = "storage"
+CHUNK = 64 * 1024
+STORE = BlobStore(STORAGE)
+INDEX = Index(os.path.join(STORAGE, "index.db"))
+SESSIONS = Sessions(os.path.join(STORAGE, "uploads"))
+SESSIONS.gc()
+ATTEST = Attestation("devices.json", os.path.join(STORAGE, ".token_key"))
+REQUIRE_ATTESTATION = os.environ.get("KAC_ALLOW_ANONYMOUS") != "1"
+
+routes = web.RouteTableDef()
+
+def _name(fn: str) -> str:
+    if not fn or fn != os.path.basename(fn) or fn.startswith("."):
+        raise web.HTTPBadRequest(text="bad filename")
+    return fn
+
+def _authorize(request):
+    if REQUIRE_ATTESTATION and not ATTEST.check(request.headers.get("Authorization")):
+        raise web.HTTPUnauthorized(text="attest via /auth/challenge and /auth/session",
+                                   headers={"WWW-Authenticate": "Bearer"})
+
+def _write(f, h, chunk):
+    f.write(chunk)
+    h.update(chunk)
+
+def _commit(fn, hdr, digest, tmp, size):
+    STORE.link(fn, hdr, digest, tmp)
+    if size is None:
+        size = os.path.getsize(STORE.blob_path(digest))
+    INDEX.put(fn, hdr, size)
+
+@routes.post("/auth/challenge")
+async def auth_challenge(request):
+    try:
+        return web.json_response({"nonce": ATTEST.challenge(), "ttl": CHALLENGE_TTL})
+    except OverflowError as e:
+        raise web.HTTPServiceUnavailable(text=str(e))
+
+@routes.post("/auth/session")
+async def auth_session(request):
+    try:
+        body = await request.json()
+        token, exp = await asyncio.get_running_loop().run_in_executor(
+            None, ATTEST.session, body["serial"], body["nonce"], body["sig"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise web.HTTPForbidden(text=f"attestation failed: {e}")
+    return web.json_response({"token": token, "expires": exp})
+
+@routes.head("/blob/{digest}")
+async def blob_exists(request):
+    d = request.match_info["digest"].lower()
+    if not await asyncio.get_running_loop().run_in_executor(None, STORE.has, d):
+        raise web.HTTPNotFound()
+    return web.Response()
+
+@routes.post("/upload")
+async def upload(request):
+    loop = asyncio.get_running_loop()
+    reader = await request.multipart()
+    fields, tmp, digest, size = {}, None, None, None
+    try:
+        async for part in reader:
+            if part.name == "file":
+                fd, tmp = STORE.new_temp()
+                h = hashlib.sha256()
+                st = kac_metrics.Stages("upload")   # receive (network) / write (disk + hash)
+                with os.fdopen(fd, "wb") as f:
+                    while chunk := await part.read_chunk(CHUNK):
+                        st.lap("receive")
+                        await loop.run_in_executor(None, _write, f, h, chunk)
+                        st.lap("write")
+                    size = f.tell()
+                st.done()
+                digest = h.hexdigest()
+            elif part.name == "header_bin":
+                fields[part.name] = await part.read()
+            else:
+                fields[part.name] = await part.text()
+        if "filename" not in fields or not ("header" in fields or "header_bin" in fields):
+            raise web.HTTPBadRequest(text="need filename and header")
+        fn = _name(fields["filename"])
+        try:
+            hdr = (kac_header.decode(fields["header_bin"]) if "header_bin" in fields
+                   else json.loads(fields["header"]))
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=f"bad header: {e}")
+        if not isinstance(hdr, dict):
+            raise web.HTTPBadRequest(text="bad header: not an object")
+        claimed = (hdr.get("ct_sha256") or "").lower()
+        if digest is None:
+            # header-only upload: the client found the blob via HEAD /blob/<digest>
+            if not valid_digest(claimed):
+                raise web.HTTPBadRequest(text="need file or a valid ct_sha256")
+            digest = claimed
+        elif claimed and claimed != digest:
+            raise web.HTTPBadRequest(text="ct_sha256 does not match uploaded bytes")
+        try:
+            with kac_metrics.span("upload.commit"):
+                await loop.run_in_executor(None, _commit, fn, hdr, digest, tmp, size)
+            tmp = None
+        except KeyError:
+            raise web.HTTPNotFound(text="blob not stored; send the file")
+    finally:
+        if tmp and os.path.exists(tmp):
+            os.unlink(tmp)
+    return web.Response(text="OK")
+
+# part PUTs write into a session's data file in place, and /complete renames that file into
+# the blob store, so the two are ordered here (one process, one event loop): a complete waits
+# for the part writers already in flight, and parts or completes arriving meanwhile get 409
+_writers = {}        # sid -> part PUTs writing into its data file
+_idle = {}           # sid -> Event, set when its last writer is done
+_completing = set()
+
+@contextlib.contextmanager
+def _part_writer(sid):
+    if sid in _completing:
+        raise web.HTTPConflict(text="upload is being completed")
+    _writers[sid] = _writers.get(sid, 0) + 1
+    try:
+        yield
+    finally:
+        _writers[sid] -= 1
+        if not _writers[sid]:
+            del _writers[sid]
+            if sid in _idle:
+                _idle.pop(sid).set()
+
+async def _writers_done(sid):
+    while _writers.get(sid):
+        await _idle.setdefault(sid, asyncio.Event()).wait()
+
+def _session(request):
+    try:
+        sid = request.match_info["sid"]
+        return sid, SESSIONS.meta(sid)
+    except KeyError:
+        raise web.HTTPNotFound(text="no such upload session")
+
+@routes.post("/uploads")
+async def upload_init(request):
+    try:
+        body = await request.json()
+        fn = _name(body["filename"])
+        meta = SESSIONS.create(fn, int(body["size"]), int(body.get("part_size", 8 << 20)))
+    except (ValueError, KeyError, TypeError) as e:
+        raise web.HTTPBadRequest(text=f"bad upload request: {e}")
+    return web.json_response(meta)
+
+@routes.get("/uploads/{sid}")
+async def upload_status(request):
+    sid, meta = _session(request)
+    try:
+        received = await asyncio.get_running_loop().run_in_executor(None, SESSIONS.received, sid)
+    except KeyError:
+        raise web.HTTPNotFound(text="no such upload session")
+    return web.json_response(dict(meta, received={str(n): d for n, d in received.items()}))
+
+@routes.put("/uploads/{sid}/{n}")
+async def upload_part(request):
+    sid, meta = _session(request)
+    want = (request.headers.get("X-Part-SHA256") or "").lower()
+    try:
+        n = int(request.match_info["n"])
+        off, length = SESSIONS.span(meta, n)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    if not valid_digest(want):
+        raise web.HTTPBadRequest(text="need X-Part-SHA256")
+    loop = asyncio.get_running_loop()
+    with _part_writer(sid):
+        try:
+            fd = SESSIONS.data_fd(sid)
+        except KeyError:
+            raise web.HTTPNotFound(text="no such upload session")
+        h, got = hashlib.sha256(), 0
+        try:
+            while chunk := await request.content.read(CHUNK):
+                if got + len(chunk) > length:
+                    raise web.HTTPBadRequest(text=f"part {n} is longer than {length} bytes")
+                h.update(chunk)
+                await loop.run_in_executor(None, os.pwrite, fd, chunk, off + got)
+                got += len(chunk)
+        finally:
+            os.close(fd)
+        if got != length or h.hexdigest() != want:
+            # bytes in place may be garbage, but without a marker the part counts as missing
+            raise web.HTTPBadRequest(text=f"part {n}: short body ({got}/{length} bytes)"
+                                     if got != length else f"part {n}: X-Part-SHA256 mismatch")
+        try:
+            await loop.run_in_executor(None, SESSIONS.mark, sid, n, want)
+        except KeyError:   # aborted meanwhile
+            raise web.HTTPNotFound(text="no such upload session")
+    return web.Response(text="OK")
+
+@routes.post("/uploads/{sid}/complete")
+async def upload_complete(request):
+    sid, meta = _session(request)
+    try:
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise ValueError("body is not an object")
+        hdr = (kac_header.from_http(body["header_bin"]) if "header_bin" in body
+               else body["header"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise web.HTTPBadRequest(text=f"bad header: {e}")
+    if not isinstance(hdr, dict):
+        raise web.HTTPBadRequest(text="bad header: not an object")
+    if sid in _completing:
+        raise web.HTTPConflict(text="upload is being completed")
+    loop = asyncio.get_running_loop()
+    _completing.add(sid)
+    try:
+        await _writers_done(sid)
+        try:
+            path, digest, size = await loop.run_in_executor(None, SESSIONS.finish, sid)
+        except KeyError:   # completed by a call that got in just before this one
+            raise web.HTTPNotFound(text="no such upload session")
+        except ValueError as e:
+            raise web.HTTPConflict(text=str(e))
+        claimed = (hdr.get("ct_sha256") or "").lower()
+        if claimed and claimed != digest:
+            SESSIONS.drop(sid)   # every part verified, so the client sealed something else
+            raise web.HTTPBadRequest(text="ct_sha256 does not match uploaded bytes")
+        await loop.run_in_executor(None, _commit, meta["filename"], hdr, digest, path, size)
+        await loop.run_in_executor(None, SESSIONS.drop, sid)
+    finally:
+        _completing.discard(sid)
+    return web.Response(text="OK")
+
+@routes.delete("/uploads/{sid}")
+async def upload_abort(request):
+    sid, _ = _session(request)
+    if sid in _completing:
+        raise web.HTTPConflict(text="upload is being completed")
+    await asyncio.get_running_loop().run_in_executor(None, SESSIONS.drop, sid)
+    return web.Response(text="OK")
+
+async def _send_fd(request, f, size, headers):
+    """Stream an already-open file (or a Range of it) with loop.sendfile."""
+    try:
+        rng = request.http_range
+        start, stop = rng.start, rng.stop
+    except ValueError:
+        start = stop = None
+    status = 200
+    if start is not None or stop is not None:
+        start = 0 if start is None else (size + start if start < 0 else start)
+        stop = size if stop is None else min(stop, size)
+        if not 0 <= start < stop:
+            raise web.HTTPRequestRangeNotSatisfiable(headers={"Content-Range": f"bytes */{size}"})
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+        status = 206
+    else:
+        start, stop = 0, size
+
+    resp = web.StreamResponse(status=status, headers=headers)
+    resp.content_type = "application/octet-stream"
+    resp.content_length = stop - start
+    await resp.prepare(request)
+    if request.method != "HEAD" and stop > start:
+        await asyncio.get_running_loop().sendfile(request.transport, f, start, stop - start)
+    await resp.write_eof()
     return resp
 
+@routes.get("/list")
+async def list_objects(request):
+    _authorize(request)
+    q = request.query
+    try:
+        since = parse_since(q["since"]) if "since" in q else None
+        limit = max(1, min(int(q.get("limit", 100)), 1000))
+        items, nxt = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: INDEX.list(q.get("class"), since, q.get("after"), limit))
+    except ValueError:
+        raise web.HTTPBadRequest(text="bad since/after/limit")
+    return web.json_response({"items": items, "next": nxt})
+
+def _etag_match(request, etag):
+    # If-None-Match: "a", W/"b" | * ; the ETag is the ciphertext hash, so weak == strong here
+    inm = request.headers.get("If-None-Match")
+    if not inm or not etag:
+        return False
+    return any(t.strip().removeprefix("W/").strip('"') in ("*", etag) for t in inm.split(","))
+
+@routes.get("/download/{fn}")
+async def download(request):
+    _authorize(request)
+    fn = _name(request.match_info["fn"])
+    with kac_metrics.span("download.open"):
+        found = await asyncio.get_running_loop().run_in_executor(None, STORE.open, fn)
+    if not found:
+        raise web.HTTPNotFound()
+    hdr, f = found
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        headers = {"Accept-Ranges": "bytes"}
+        if request.headers.get("X-KAC-Header-Format") == "bin":
+            headers["X-KAC-HEADER-BIN"] = kac_header.to_http(hdr)
+        else:
+            headers["X-KAC-HEADER"] = json.dumps(hdr)
+        etag = (hdr.get("ct_sha256") or "").lower()   # checked against the bytes at upload
+        if etag:
+            headers["ETag"] = f'"{etag}"'
+        if _etag_match(request, etag):
+            # the header still comes along: a rewrap changes it without touching the blob
+            return web.Response(status=304, headers=headers)
+        with kac_metrics.span("download.send"):
+            return await _send_fd(request, f, size, headers)
+
+@routes.get("/metrics")
+async def metrics(request):
+    return web.Response(body=kac_metrics.prometheus().encode(),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+@web.middleware
+async def _timed(request, handler):
+    # one histogram per route handler ("http.upload", "http.download", ...), errors included
+    t0 = time.perf_counter()
+    try:
+        return await handler(request)
+    finally:
+        name = getattr(request.match_info.handler, "__name__", "other")
+        kac_metrics.observe(f"http.{name}", time.perf_counter() - t0, t0)
+
+def make_app():
+    # client_max_size only bounds the small form fields; the file part is read in chunks
+    app = web.Application(client_max_size=1 << 20, middlewares=[_timed] if kac_metrics.ENABLED else [])
+    app.add_routes(routes)
+    return app
+
+app = make_app()
+
 if __name__ == "__main__":
-    app.run("0.0.0.0", 5000)
+    ap = argparse.ArgumentParser(description="KAC cloud storage server")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=5000)
+    ap.add_argument("--allow-anonymous", action="store_true",
+                    help="serve /download and /list without a session token (legacy members, tests)")
+    args = ap.parse_args()
+    REQUIRE_ATTESTATION = REQUIRE_ATTESTATION and not args.allow_anonymous
+    if not REQUIRE_ATTESTATION:
+        print("[WARN] Anonymous access: /download and /list are open to anyone who can reach this port")
+    web.run_app(app, host=args.host, port=args.port)
@@ -0,0 +1,3 @@
+# cloud/tests/conftest.py - the cloud modules import each other flat, as when run from cloud/
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
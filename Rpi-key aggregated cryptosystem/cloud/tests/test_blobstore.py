@@ -0,0 +1,71 @@
+# cloud/tests/test_blobstore.py
+import os, hashlib
+import pytest
+from blobstore import BlobStore, valid_digest
+
+def _put(store, name, data, header=None):
+    """Upload data under name the way server.py does: temp file, then link."""
+    digest = hashlib.sha256(data).hexdigest()
+    fd, tmp = store.new_temp()
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    store.link(name, header or {"ct_sha256": digest}, digest, tmp)
+    return digest
+
+def _refs(store, digest):
+    with open(store.blob_path(digest) + ".ref") as f:
+        return int(f.read())
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / "storage"))
+
+def test_identical_uploads_share_one_blob(store):
+    a = _put(store, "a.bin", b"same bytes")
+    b = _put(store, "b.bin", b"same bytes")
+    assert a == b and store.has(a) and _refs(store, a) == 2
+    assert os.listdir(store.tmp) == []   # the second temp file was dropped, not stored
+
+def test_header_only_link_needs_a_stored_blob(store):
+    d = _put(store, "a.bin", b"x")
+    store.link("b.bin", {"ct_sha256": d}, d)   # dedup hit: no bytes sent
+    assert _refs(store, d) == 2
+    with pytest.raises(KeyError):
+        store.link("c.bin", {}, hashlib.sha256(b"never uploaded").hexdigest())
+    assert store.lookup("c.bin") is None
+
+def test_refcount_reaching_zero_deletes_the_blob(store):
+    old = _put(store, "a.bin", b"v1")
+    _put(store, "b.bin", b"v1")
+    new = _put(store, "a.bin", b"v2")     # a.bin moves on, b.bin still holds v1
+    assert store.has(old) and _refs(store, old) == 1
+    _put(store, "b.bin", b"v2")           # last name on v1 gone
+    assert not store.has(old) and not os.path.exists(store.blob_path(old) + ".ref")
+    assert _refs(store, new) == 2
+
+def test_relinking_the_same_blob_keeps_the_count(store):
+    d = _put(store, "a.bin", b"x", {"v": 1})
+    _put(store, "a.bin", b"x", {"v": 2})  # re-upload: new header, same blob
+    assert _refs(store, d) == 1
+    assert store.lookup("a.bin") == ({"v": 2}, d)
+
+def test_open_returns_header_with_its_blob(store):
+    d = _put(store, "a.bin", b"payload", {"ct_sha256": hashlib.sha256(b"payload").hexdigest()})
+    hdr, f = store.open("a.bin")
+    with f:
+        assert hashlib.sha256(f.read()).hexdigest() == hdr["ct_sha256"] == d
+    assert store.open("missing.bin") is None
+
+def test_legacy_objects_are_served(store):
+    with open(os.path.join(store.root, "old.bin"), "wb") as f:
+        f.write(b"legacy")
+    with open(os.path.join(store.root, "old.bin.hdr"), "w") as f:
+        f.write('{"v": 1}')
+    hdr, f = store.open("old.bin")
+    with f:
+        assert hdr == {"v": 1} and f.read() == b"legacy"
+
+def test_digests_are_validated(store):
+    assert valid_digest("ab" * 32)
+    assert not valid_digest("AB" * 32) and not valid_digest("ab" * 31) and not valid_digest(None)
+    assert not store.has("../../etc/passwd")
@@ -0,0 +1,72 @@
+# cloud/tests/test_multipart.py
+import os, hashlib
+import pytest
+from multipart import Sessions, MIN_PART
+
+P = MIN_PART
+
+@pytest.fixture
+def sessions(tmp_path):
+    return Sessions(str(tmp_path / "uploads"))
+
+def _send_all(s, meta, data):
+    """Write and mark every part the way server.py's upload_part does."""
+    for n in range(meta["parts"]):
+        off, ln = Sessions.span(meta, n)
+        fd = s.data_fd(meta["id"])
+        try:
+            os.pwrite(fd, data[off:off + ln], off)
+        finally:
+            os.close(fd)
+        s.mark(meta["id"], n, hashlib.sha256(data[off:off + ln]).hexdigest())
+
+@pytest.mark.parametrize("size, parts, last", [(0, 1, 0), (P, 1, P), (P + 1, 2, 1), (3 * P - 5, 3, P - 5)])
+def test_part_count_and_last_span(sessions, size, parts, last):
+    meta = sessions.create("f.bin", size, P)
+    assert meta["parts"] == parts
+    assert Sessions.span(meta, parts - 1) == ((parts - 1) * P, last)
+
+@pytest.mark.parametrize("n", [-1, 3, 1000])
+def test_out_of_range_part_is_rejected(sessions, n):
+    meta = sessions.create("f.bin", 3 * P, P)
+    with pytest.raises(ValueError):
+        Sessions.span(meta, n)
+
+@pytest.mark.parametrize("size, part_size", [(-1, P), (10, P - 1), (10, 0)])
+def test_bad_sizes_are_rejected(sessions, size, part_size):
+    with pytest.raises(ValueError):
+        sessions.create("f.bin", size, part_size)
+
+def test_finish_hashes_the_assembled_file(sessions):
+    data = os.urandom(2 * P + 123)
+    meta = sessions.create("f.bin", len(data), P)
+    _send_all(sessions, meta, data)
+    assert set(sessions.received(meta["id"])) == {0, 1, 2}
+    path, digest, size = sessions.finish(meta["id"])
+    assert digest == hashlib.sha256(data).hexdigest() and size == len(data)
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+def test_finish_refuses_missing_parts(sessions):
+    data = os.urandom(2 * P)
+    meta = sessions.create("f.bin", len(data), P)
+    fd = sessions.data_fd(meta["id"])
+    os.pwrite(fd, data[:P], 0)
+    os.close(fd)
+    sessions.mark(meta["id"], 0, hashlib.sha256(data[:P]).hexdigest())
+    with pytest.raises(ValueError, match="first 1"):
+        sessions.finish(meta["id"])
+
+def test_dropped_session_is_gone(sessions):
+    sid = sessions.create("f.bin", P, P)["id"]
+    sessions.drop(sid)
+    for call in (sessions.meta, sessions.received, sessions.data_fd, sessions.finish):
+        with pytest.raises(KeyError):
+            call(sid)
+    with pytest.raises(KeyError):
+        sessions.mark(sid, 0, "00" * 32)
+
+@pytest.mark.parametrize("sid", ["../etc", "A" * 32, "0" * 31, None])
+def test_malformed_ids_are_unknown(sessions, sid):
+    with pytest.raises(KeyError):
+        sessions.meta(sid)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# bench_tree.py - GGM class tree: per-file derivation cost and aggregate key size.
+# Classes form a 10-ary tree ("n3/n0/n7"), 10^3..10^6 leaves.
+#   python3 bench_tree.py [--max 1000000]
+import os, sys, json, time, random, argparse
+import kac_tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "member"))
+from kac_client import _child, _class_key
+
+def leaves(depth, prefix=()):
+    if depth == 0:
+        yield "/".join(prefix)
+        return
+    for i in range(10):
+        yield from leaves(depth - 1, prefix + (f"n{i}",))
+
+def derive(seeds, cls):   # what a member does per file (no cache)
+    parts = tuple(cls.split("/"))
+    for i in range(len(parts), 0, -1):
+        s = seeds.get(parts[:i])
+        if s is not None:
+            for label in parts[i:]:
+                s = _child(s, label)
+            return _class_key(s)
+
+def _us(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) * 1e6 / n
+
+def main(max_n):
+    tree = kac_tree.Tree(os.urandom(32))
+    print(f"{'classes':>9} {'depth':>5} | {'grant':28s} {'classes':>8} {'seeds':>6} {'key B':>7} "
+          f"{'flat list B':>11} | {'derive us':>9} {'issue ms':>8}")
+    depth = 3
+    while 10 ** depth <= max_n:
+        n = 10 ** depth
+        all_classes = list(leaves(depth))
+        reg = kac_tree.counts(all_classes)
+        grants = {
+            "everything": all_classes,
+            "one top-level subtree": [c for c in all_classes if c.startswith("n4/")],
+            "3 level-2 subtrees": [c for c in all_classes if c[:5] in ("n1/n2", "n5/n5", "n9/n0")],
+            "100 scattered leaves": random.Random(depth).sample(all_classes, 100),
+        }
+        for label, granted in grants.items():
+            t0 = time.perf_counter()
+            seeds = tree.aggregate(granted, reg)
+            issue_ms = (time.perf_counter() - t0) * 1000
+            key_b = len(json.dumps(seeds))
+            parsed = {tuple(p.split("/")): bytes.fromhex(h) for p, h in seeds.items()}
+            probe = random.Random(1).choice(granted)
+            assert derive(parsed, probe) == kac_tree.class_key(tree.seed(probe))
+            us = _us(lambda: derive(parsed, probe), 2000)
+            print(f"{n:>9} {depth:>5} | {label:28s} {len(granted):>8} {len(seeds):>6} {key_b:>7} "
+                  f"{len(granted) * 32:>11} | {us:>9.2f} {issue_ms:>8.1f}")
+        depth += 1
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--max", type=int, default=1_000_000)
+    main(ap.parse_args().max)
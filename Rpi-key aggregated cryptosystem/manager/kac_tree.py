@@ -0,0 +1,75 @@
+# kac_tree.py - GGM-style class tree for hierarchical classes ("iot/site42/line3").
+#
+#   seed(root)          = HKDF(master, info="kac/tree")
+#   seed(parent/label)  = HMAC-SHA256(seed(parent), "kac/node/" + label)
+#   class key(path)     = HMAC-SHA256(seed(path), "kac/key")
+#
+# A seed opens its whole subtree and nothing outside it, so an aggregate key is just the
+# minimal set of subtree seeds covering the granted classes: its size grows with the number
+# of covered subtrees, not with the number of classes. A member derives a file's class key
+# in O(depth) HMACs (member/kac_client.py holds the same two derivation steps).
+import hmac
+from hashlib import sha256
+from Cryptodome.Protocol.KDF import HKDF
+from Cryptodome.Hash import SHA256
+
+def split(path: str) -> tuple:
+    parts = tuple(path.strip().strip("/").split("/"))
+    if not parts or not all(parts):
+        raise ValueError(f"bad class path {path!r}")
+    return parts
+
+def root_seed(master: bytes) -> bytes:
+    return HKDF(master, 32, b"", SHA256, context=b"kac/tree")
+
+def child(seed: bytes, label: str) -> bytes:
+    return hmac.new(seed, b"kac/node/" + label.encode(), sha256).digest()
+
+def class_key(seed: bytes) -> bytes:
+    return hmac.new(seed, b"kac/key", sha256).digest()
+
+def counts(registry) -> dict:
+    """node -> number of registered classes at or below it. Build once, pass to cover()."""
+    total = {}
+    for r in map(split, registry):
+        for i in range(1, len(r) + 1):
+            total[r[:i]] = total.get(r[:i], 0) + 1
+    return total
+
+def _minimal(nodes):
+    return {p for p in nodes if not any(p[:i] in nodes for i in range(1, len(p)))}
+
+def cover(paths, registry=None) -> list:
+    """Minimal set of subtree roots covering `paths`; paths under another granted path
+    are dropped. With a registry (every class that exists, or its counts()), a node whose
+    registered classes are all granted is replaced by the node itself - note that this
+    also grants classes added under it later. Granted classes missing from the registry
+    are kept as they are and never complete an ancestor."""
+    granted = _minimal({split(p) for p in paths})
+    if registry is not None:
+        total = registry if isinstance(registry, dict) else counts(registry)
+        done = {}
+        for g in granted:   # disjoint subtrees, so nothing is counted twice
+            n = total.get(g, 0)
+            for i in range(1, len(g)):
+                done[g[:i]] = done.get(g[:i], 0) + n
+        granted = _minimal(granted | {a for a, d in done.items() if d == total.get(a)})
+    return sorted("/".join(p) for p in granted)
+
+class Tree:
+    """Issuer side: seeds for arbitrary nodes, memoising interior nodes so bulk issuance
+    over a shared hierarchy walks each edge once."""
+
+    def __init__(self, master: bytes):
+        self.root = root_seed(master)
+        self._seeds = {(): self.root}
+
+    def seed(self, path) -> bytes:
+        parts = split(path) if isinstance(path, str) else tuple(path)
+        s = self._seeds.get(parts)
+        if s is None:
+            s = self._seeds[parts] = child(self.seed(parts[:-1]), parts[-1])
+        return s
+
+    def aggregate(self, paths, registry=None) -> dict:
+        return {p: self.seed(p).hex() for p in cover(paths, registry)}
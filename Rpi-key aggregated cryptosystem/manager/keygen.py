@@ -1,21 +1,177 @@
 #!/usr/bin/env python3
-import json, os, sys
+# keygen.py - issue aggregate keys to member devices.
+#   python3 keygen.py <device_name> <class1> [class2] ...
+#   python3 keygen.py --bulk devices.csv|devices.jsonl [--out keys/bundle.jsonl] [--workers N]
+#   python3 keygen.py --extract keys/bundle.jsonl <device_name>
+#   add --tree [--collapse classes.txt] to either form for hierarchical classes (kac_tree.py)
+#
+# Bulk input: CSV rows "device,class1,class2,..." (a cell may also hold "a;b"), or JSONL
+# {"device": ..., "classes": [...]}. The bundle is one JSONL line per device; each line is
+# exactly what goes into that device's /etc/kac_agg.json.
+#
+# Derivation ("kdf" in system_params.json):
+#   hkdf-sha256  class subkey  = HKDF(master, info="kac/class/<cls>")
+#                aggregate key = HKDF(subkey_a || subkey_b || ..., info="kac/agg")   (classes sorted)
+#   sha256       aggregate key = sha256(master + ",".join(sorted(classes)))        (systems set up
+#                before the field existed; kept so their keys stay consistent)
+# Devices with the same class set always get the same key; both steps are cached.
+#   --tree       "seeds": {subtree: seed} covering the classes, "kdf": "ggm" (see kac_tree.py)
+import json, os, sys, csv, time, argparse
 from hashlib import sha256
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from Cryptodome.Protocol.KDF import HKDF
+from Cryptodome.Hash import SHA256
+import kac_tree
 
-if not os.path.exists("keys/system_params.json"):
-    sys.exit("Run setup.py first.")
+PARAMS_FILE = "keys/system_params.json"
+BATCH = 5000
 
-params = json.load(open("keys/system_params.json"))
+def load_params(path=PARAMS_FILE):
+    if not os.path.exists(path):
+        sys.exit("Run setup.py first.")
+    return json.load(open(path))
 
-def issue(device_name: str, classes):
-    master = bytes.fromhex(params["master_secret"])
-    digest = sha256(master + ",".join(sorted(classes)).encode()).digest()
-    out = {"device": device_name, "classes": classes, "key": digest.hex(), "system_id": params["system_id"]}
+class Deriver:
+    def __init__(self, params, tree=False, registry=None):
+        self.master = bytes.fromhex(params["master_secret"])
+        self.tree = kac_tree.Tree(self.master) if tree else None
+        self.registry = registry   # kac_tree.counts() of all known classes, or None
+        self.system_id = params["system_id"]
+        self.kdf = params.get("kdf", "sha256")
+        if self.kdf not in ("sha256", "hkdf-sha256"):
+            raise ValueError(f"unknown kdf {self.kdf!r}")
+        self.class_key = lru_cache(maxsize=None)(self._class_key)
+        self.agg_key = lru_cache(maxsize=65536)(self._agg_key)
+
+    def _class_key(self, cls: str) -> bytes:
+        return HKDF(self.master, 32, b"", SHA256, context=f"kac/class/{cls}".encode())
+
+    def _agg_key(self, classes: tuple) -> bytes:
+        # classes: sorted, de-duplicated tuple
+        if self.kdf == "sha256":
+            return sha256(self.master + ",".join(classes).encode()).digest()
+        return HKDF(b"".join(self.class_key(c) for c in classes), 32, b"", SHA256, context=b"kac/agg")
+
+    def entry(self, device: str, classes) -> dict:
+        if self.tree:
+            return {"device": device, "classes": list(classes), "kdf": "ggm", "system_id": self.system_id,
+                    "seeds": self.tree.aggregate(classes, self.registry)}
+        key = self.agg_key(tuple(sorted(set(classes))))
+        return {"device": device, "classes": list(classes), "key": key.hex(),
+                "system_id": self.system_id, "kdf": self.kdf}
+
+def load_registry(path):
+    if not path:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return kac_tree.counts(ln.strip() for ln in f if ln.strip() and not ln.startswith("#"))
+
+def issue(device_name: str, classes, tree=False, registry=None):
+    out = Deriver(load_params(), tree, registry).entry(device_name, classes)
     fn = f"keys/{device_name}_agg.json"
     json.dump(out, open(fn, "w"), indent=2)
     print(f"✅ Issued aggregate key for {device_name} -> {fn}")
 
+def read_devices(path):
+    """Yield (device, [classes]) from a CSV or JSONL file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    d = json.loads(line)
+                    yield str(d["device"]), list(d["classes"])
+            return
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].startswith("#") or row[0].strip() == "device":
+                continue
+            classes = [c.strip() for cell in row[1:] for c in cell.split(";") if c.strip()]
+            yield row[0].strip(), classes
+
+_worker = None
+
+def _init_worker(params, tree=False, registry=None):
+    global _worker
+    _worker = Deriver(params, tree, registry)
+
+def _derive_batch(rows):
+    return "".join(json.dumps(_worker.entry(d, c)) + "\n" for d, c in rows)
+
+def _batches(rows, n=BATCH):
+    batch = []
+    for r in rows:
+        if not r[1]:
+            raise ValueError(f"device {r[0]!r} has no classes")
+        batch.append(r)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def issue_bulk(src, out, workers=1, params=None, tree=False, registry=None):
+    params = params or load_params()
+    t0 = time.perf_counter()
+    n = 0
+    tmp = out + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        os.fchmod(f.fileno(), 0o600)
+        if workers <= 1:
+            _init_worker(params, tree, registry)
+            results = map(_derive_batch, _batches(read_devices(src)))
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(params, tree, registry))
+            results = pool.map(_derive_batch, _batches(read_devices(src)))
+        try:
+            for chunk in results:
+                f.write(chunk)
+                n += chunk.count("\n")
+        finally:
+            if pool:
+                pool.shutdown()
+    os.replace(tmp, out)
+    dt = time.perf_counter() - t0
+    print(f"✅ Issued {n} aggregate keys -> {out}")
+    print(f"   {dt:.2f}s, {n / dt if dt else 0:.0f} devices/s ({workers} worker{'s' if workers != 1 else ''})")
+    return n
+
+def extract(bundle, device):
+    with open(bundle, encoding="utf-8") as f:
+        for line in f:
+            d = json.loads(line)
+            if d["device"] == device:
+                fn = f"keys/{device}_agg.json"
+                json.dump(d, open(fn, "w"), indent=2)
+                print(f"✅ {device} -> {fn}")
+                return fn
+    sys.exit(f"{device} not in {bundle}")
+
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python3 keygen.py <device_name> <class1> [class2] ..."); sys.exit(1)
-    issue(sys.argv[1], sys.argv[2:])
+    ap = argparse.ArgumentParser(usage="python3 keygen.py [--tree] <device_name> <class1> [class2] ...\n"
+                                       "       python3 keygen.py [--tree] --bulk FILE [--out FILE] [--workers N]\n"
+                                       "       python3 keygen.py --extract BUNDLE DEVICE")
+    ap.add_argument("device", nargs="?")
+    ap.add_argument("classes", nargs="*")
+    g = ap.add_mutually_exclusive_group()
+    g.add_argument("--bulk", metavar="FILE", help="CSV or JSONL of devices and class sets")
+    g.add_argument("--extract", nargs=2, metavar=("BUNDLE", "DEVICE"))
+    ap.add_argument("--out", default="keys/bundle.jsonl")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="derivation processes; pays off with many distinct class sets (each set is derived once)")
+    ap.add_argument("--tree", action="store_true", help="hierarchical classes: issue subtree seeds")
+    ap.add_argument("--collapse", metavar="REGISTRY",
+                    help="with --tree: all known classes, one per line; a subtree whose registered classes"
+                         " are all granted is issued as one seed (which also opens classes added there later)")
+    args = ap.parse_args()
+    if args.collapse and not args.tree:
+        ap.error("--collapse needs --tree")
+    registry = load_registry(args.collapse)
+    if args.bulk:
+        issue_bulk(args.bulk, args.out, args.workers, tree=args.tree, registry=registry)
+    elif args.extract:
+        extract(*args.extract)
+    elif args.device and args.classes:
+        issue(args.device, args.classes, args.tree, registry)
+    else:
+        ap.print_usage(); sys.exit(1)
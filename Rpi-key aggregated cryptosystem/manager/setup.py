@@ -8,6 +8,7 @@ def setup():
     params = {
         "system_id": os.urandom(4).hex(),
         "master_secret": get_random_bytes(32).hex(),
+        "kdf": "hkdf-sha256",
         "public_params": {
             "algo": "AES-GCM",
             "classes_supported": ["finance", "iot", "hr", "security"]
@@ -1,17 +1,26 @@
 # member/atecc_attest.py
-import hashlib, board, busio
-try:
-    from adafruit_atecc.adafruit_atecc import ATECC
-except ImportError:
-    from adafruit_atecc import ATECC
+# Everything here goes through the chip object, ATECC or fake_hw.FakeATECC (software key):
+#   .serial_number, .sign(sha256 digest) -> signature, .gen_key(buf, slot, private_key=False) -> x||y
+#   python3 atecc_attest.py     prints serial and public key for cloud/attest.py add
+import json, hashlib
+import fake_hw, kac_metrics
+if not fake_hw.ENABLED:
+    import board, busio
+    try:
+        from adafruit_atecc.adafruit_atecc import ATECC
+    except ImportError:
+        from adafruit_atecc import ATECC
 
 _i2c = None
 _chip = None
 def _get_chip():
     global _i2c, _chip
     if _chip is None:
-        _i2c = busio.I2C(board.SCL, board.SDA)
-        _chip = ATECC(_i2c, address=0x60)
+        if fake_hw.ENABLED:
+            _chip = fake_hw.FakeATECC()
+        else:
+            _i2c = busio.I2C(board.SCL, board.SDA)
+            _chip = ATECC(_i2c, address=0x60)
     return _chip
 
 def device_serial_hex() -> str:
@@ -26,6 +35,12 @@ def device_serial_hex() -> str:
             return ser.encode().hex()
     return bytes(ser).hex()
 
+def public_key_hex() -> str:
+    """Slot-0 public key as x||y hex (64 bytes), for enrolling the device."""
+    buf = bytearray(64)
+    _get_chip().gen_key(buf, 0, False)
+    return bytes(buf).hex()
+
 def _der_to_raw(sig: bytes) -> bytes:
     if len(sig) == 64:
         return sig
@@ -42,6 +57,7 @@ def _der_to_raw(sig: bytes) -> bytes:
     s = s.lstrip(b"\x00")[-32:].rjust(32, b"\x00")
     return r + s
 
+@kac_metrics.timed("atecc.sign")
 def sign_challenge(challenge: bytes) -> bytes:
     chip = _get_chip()
     digest = hashlib.sha256(challenge).digest()
@@ -55,3 +71,6 @@ def sign_challenge(challenge: bytes) -> bytes:
         sig = bytes(sig)
     sig = bytes(sig)
     return _der_to_raw(sig)
+
+if __name__ == "__main__":
+    print(json.dumps({"serial": device_serial_hex(), "pub": public_key_hex()}))
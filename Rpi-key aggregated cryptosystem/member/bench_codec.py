@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# bench_codec.py - compression ratio and throughput per codec, and what "auto" would pick.
+# Numbers are for this CPU; run it on the Pi, or scale with --cpu-factor (~4 for a Pi 4
+# against a desktop core) to estimate from elsewhere.
+#   python3 bench_codec.py [--mb 8] [--uplink 1,10,100] [--cpu-factor 1]
+import os, io, json, time, random, argparse
+import kac_codec
+
+def _datasets(n):
+    rnd = random.Random(7)
+    csv, ts = io.StringIO("ts,temp_c,humidity_pct,pressure_hpa\n"), 1700000000
+    while csv.tell() < n:
+        ts += 1
+        csv.write(f"{ts},{21 + rnd.random() * 2:.2f},{40 + rnd.random() * 4:.1f},{1012 + rnd.random():.1f}\n")
+    js = io.StringIO()
+    while js.tell() < n:
+        js.write(json.dumps({"device": f"pi-{rnd.randrange(50)}", "ts": ts, "event": rnd.choice(["tap", "enc", "dec"]),
+                             "ok": rnd.random() > 0.1, "latency_ms": round(rnd.random() * 80, 1)}) + "\n")
+        ts += 1
+    return {"sensor CSV": csv.getvalue().encode()[:n], "JSON lines": js.getvalue().encode()[:n],
+            "random (pre-compressed)": os.urandom(n)}
+
+def _run(name, data):
+    t0 = time.perf_counter()
+    r = kac_codec.CompressReader(io.BytesIO(data), name)
+    packed = r.read()
+    tc = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    out = b"".join(kac_codec.decompress([packed[i:i + 65536] for i in range(0, len(packed), 65536)], name)
+                   if name else [packed])
+    td = time.perf_counter() - t0
+    assert out == data
+    return len(packed), tc, td
+
+def main(mb, uplinks, factor):
+    n = int(mb * 1e6)
+    for label, data in _datasets(n).items():
+        print(f"{label}, {n / 1e6:.0f} MB")
+        print(f"  {'codec':6s} {'ratio':>6s} {'comp MB/s':>9s} {'decomp MB/s':>11s} | "
+              + " ".join(f"{f'{u:g} Mbit/s':>11s}" for u in uplinks))
+        for name in [None] + sorted(kac_codec.CODECS):
+            size, tc, td = _run(name, data)
+            tc, td = tc * factor, td * factor
+            total = [tc + size / (u * 1e6 / 8) for u in uplinks]
+            dec = f"{n / 1e6 / max(td, 1e-9):11.1f}" if name else f"{'-':>11s}"
+            print(f"  {name or 'none':6s} {size / n:6.1%} {n / 1e6 / max(tc, 1e-9):9.1f} {dec} | "
+                  + " ".join(f"{t:10.2f}s" for t in total))
+        head = data[:kac_codec.SAMPLE_CHUNKS * 65536]
+        print("  auto picks (timed on this CPU): " + ", ".join(f"{kac_codec.choose(head, u * 1e6 / 8) or 'none'} @ {u:g} Mbit/s"
+                                           for u in uplinks))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=float, default=8)
+    ap.add_argument("--uplink", default="1,10,100", help="Mbit/s values for the time-to-upload columns")
+    ap.add_argument("--cpu-factor", type=float, default=1.0, help="multiply CPU times (emulate a slower core)")
+    args = ap.parse_args()
+    main(args.mb, [float(u) for u in args.uplink.split(",")], args.cpu_factor)
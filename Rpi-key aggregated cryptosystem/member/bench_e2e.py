@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# bench_e2e.py - member <-> cloud end to end: encrypt_file + decrypt_file against a fresh local
+# cloud/server.py, on the fake Pi peripherals (KAC_FAKE_HW=1), swept over file sizes and
+# concurrency. Per level: MB/s, ops/s, p50/p99 latency, peak RSS of both processes and bytes on
+# loopback, written to JSON. --compare flags regressions between two such files.
+#   python3 bench_e2e.py [--sizes 1K,64K,1M,16M,256M] [--concurrency 1,4] [--rounds 3] [--out run.json]
+#   python3 bench_e2e.py --sizes 4G --concurrency 1 --rounds 1       # needs ~3x the size free in --work
+#   python3 bench_e2e.py --compare base.json new.json [--threshold 10]
+# Uses the aggregate key in /etc/kac_agg.json (--key for another); --class must be one of its classes.
+import os, sys, json, time, socket, shutil, argparse, platform, tempfile, contextlib, subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER = os.path.join(HERE, "..", "cloud", "server.py")
+_UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+_METRICS = (   # (path, higher is better)
+    ("encrypt.mb_s", True), ("decrypt.mb_s", True),
+    ("encrypt.p50_ms", False), ("encrypt.p99_ms", False),
+    ("decrypt.p50_ms", False), ("decrypt.p99_ms", False),
+    ("peak_rss_mb", False), ("server_peak_rss_mb", False), ("wire_bytes", False),
+)
+
+def _size(s: str) -> int:
+    s = s.strip().upper().rstrip("B")
+    return int(float(s[:-1]) * _UNITS[s[-1]]) if s[-1] in _UNITS else int(s)
+
+def _fmt(n: int) -> str:
+    for u in "GMK":
+        if n >= _UNITS[u] and n % _UNITS[u] == 0:
+            return f"{n // _UNITS[u]}{u}"
+    return str(n)
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, int(q * len(xs)))] * 1000, 2) if xs else None
+
+def _lo_bytes():
+    # loopback rx bytes: every request and response crosses lo once, TCP/HTTP overhead included
+    try:
+        with open("/proc/net/dev") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name.strip() == "lo":
+                    return int(rest.split()[0])
+    except OSError:
+        pass
+    return None
+
+def _hwm(pid="self", reset=False):
+    """Peak RSS in MB since the last reset (Linux)."""
+    try:
+        if reset:
+            with open(f"/proc/{pid}/clear_refs", "w") as f:
+                f.write("5")
+            return None
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+@contextlib.contextmanager
+def _server(work):
+    """A fresh server.py with its own storage/, on a free port."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    root = tempfile.mkdtemp(prefix="srv_", dir=work)
+    # no devices.json in the scratch dir, so the fake ATECC can't attest: serve without tokens
+    p = subprocess.Popen([sys.executable, SERVER, "--host", "127.0.0.1", "--port", str(port), "--allow-anonymous"],
+                         cwd=root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 20
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if p.poll() is not None or time.time() > deadline:
+                    raise RuntimeError(f"server.py did not start (exit {p.poll()})")
+                time.sleep(0.1)
+        yield base, p.pid
+    finally:
+        p.terminate()
+        p.wait()
+        shutil.rmtree(root, ignore_errors=True)
+
+def _make_src(path, size):
+    with open(path, "wb") as f:
+        left = size
+        while left:
+            n = min(left, 1 << 20)
+            f.write(os.urandom(n))
+            left -= n
+
+def _level(sess, auth, src, size, conc, ops, cls, spid):
+    """ops x (encrypt, decrypt) of src, conc at a time."""
+    import encrypt, decrypt
+    names = []
+    for i in range(ops):
+        names.append(f"e2e_{_fmt(size)}_c{conc}_{i}.bin")
+        os.link(src, names[-1])
+    lat = {"encrypt": [], "decrypt": []}
+    errors = []
+
+    def one(name, op):
+        t0 = time.perf_counter()
+        try:
+            if op == "encrypt":
+                encrypt.encrypt_file(name, cls, sess)
+            elif decrypt.decrypt_file(name, sess=sess, view=False, auth=auth) is None:
+                raise RuntimeError("decrypt failed")
+            lat[op].append(time.perf_counter() - t0)
+        except Exception as e:
+            errors.append(f"{op} {name}: {e}")
+        finally:
+            if op == "decrypt":
+                for fn in (name, "dec_" + name, f"enc_report_{name}.json", name + ".sha256"):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(fn)
+
+    out = {"size": size, "concurrency": conc, "ops": ops}
+    _hwm(reset=True)
+    _hwm(spid, reset=True)
+    wire0 = _lo_bytes()
+    with ThreadPoolExecutor(conc) as ex:
+        for op in ("encrypt", "decrypt"):
+            t0 = time.perf_counter()
+            list(ex.map(lambda n: one(n, op), names))
+            dt = time.perf_counter() - t0
+            xs = lat[op]
+            out[op] = {"seconds": round(dt, 4), "ops_s": round(len(xs) / dt, 2),
+                       "mb_s": round(len(xs) * size / dt / 1e6, 2),
+                       "p50_ms": _pct(xs, .5), "p99_ms": _pct(xs, .99)}
+    wire1 = _lo_bytes()
+    out["peak_rss_mb"] = _hwm()
+    out["server_peak_rss_mb"] = _hwm(spid)
+    out["wire_bytes"] = wire1 - wire0 if wire0 is not None and wire1 is not None else None
+    out["wire_overhead"] = round(out["wire_bytes"] / (2 * ops * size), 3) if out["wire_bytes"] else None
+    out["errors"] = errors
+    return out
+
+def run(a):
+    os.environ["KAC_FAKE_HW"] = "1"
+    os.environ.setdefault("KAC_FAKE_OLED_DELAY", "0")
+    import requests
+    from requests.adapters import HTTPAdapter
+    import kac_client, encrypt, decrypt
+    decrypt.CACHE_MB = 0   # every decrypt is a real download
+    kac_client.AGG_FILE = a.key
+    try:
+        if not kac_client.get_client().authorized(a.cls):
+            sys.exit(f"[ERR] class {a.cls!r} is not in {a.key}; pick one with --class")
+    except RuntimeError as e:
+        sys.exit(f"[ERR] {e} (issue one with manager/keygen.py, or point --key at one)")
+
+    sizes = [_size(s) for s in a.sizes.split(",")]
+    levels = [int(c) for c in a.concurrency.split(",")]
+    work = tempfile.mkdtemp(prefix="kac_e2e_", dir=a.work)
+    home = os.getcwd()
+    out_path = os.path.abspath(a.out)
+    report = {"meta": {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": platform.node(), "machine": platform.machine(),
+        "cpus": os.cpu_count(), "python": platform.python_version(), "class": a.cls, "rounds": a.rounds,
+        "rev": subprocess.run(["git", "-C", HERE, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True).stdout.strip() or None,
+    }, "results": []}
+    print(f"sizes {', '.join(map(_fmt, sizes))}; concurrency {', '.join(map(str, levels))}; class {a.cls}")
+    print(f"  {'size':>6s} {'conc':>4s} {'ops':>4s} | {'enc MB/s':>9s} {'p50 ms':>9s} {'p99 ms':>9s}"
+          f" | {'dec MB/s':>9s} {'p50 ms':>9s} {'p99 ms':>9s} | {'RSS MB':>7s} {'srv MB':>7s} {'wire':>6s}")
+    try:
+        os.chdir(work)
+        for size in sizes:
+            src = os.path.join(work, f"src_{_fmt(size)}")
+            _make_src(src, size)
+            with _server(work) as (base, spid):
+                encrypt.BASE = decrypt.BASE = base
+                for conc in levels:
+                    sess = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=conc)
+                    sess.mount("http://", adapter)
+                    with contextlib.redirect_stdout(open(os.devnull, "w")):
+                        auth = decrypt.authenticate()
+                        if auth is not None:
+                            ops = conc * (a.rounds if size < (64 << 20) else 1)
+                            res = _level(sess, auth, src, size, conc, ops, a.cls, spid)
+                    if auth is None:
+                        sys.exit(f"[ERR] fake badge {os.environ.get('KAC_FAKE_UID', 1)} is not enrolled"
+                                 " (KAC_FAKE_HW=1 python3 enroll_rfid.py --name bench)")
+                    report["results"].append(res)
+                    e, d = res["encrypt"], res["decrypt"]
+                    print(f"  {_fmt(size):>6s} {conc:4d} {ops:4d} | {e['mb_s']:9.2f} {e['p50_ms'] or 0:9.1f}"
+                          f" {e['p99_ms'] or 0:9.1f} | {d['mb_s']:9.2f} {d['p50_ms'] or 0:9.1f} {d['p99_ms'] or 0:9.1f}"
+                          f" | {res['peak_rss_mb'] or 0:7.1f} {res['server_peak_rss_mb'] or 0:7.1f}"
+                          f" {res['wire_overhead'] or 0:5.2f}x")
+                    for err in res["errors"][:3]:
+                        print("  [ERR]", err)
+            os.unlink(src)
+    finally:
+        os.chdir(home)
+        shutil.rmtree(work, ignore_errors=True)
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[OK] Wrote {out_path}")
+    return 1 if any(r["errors"] for r in report["results"]) else 0
+
+def _get(d, path):
+    for k in path.split("."):
+        d = d.get(k) if isinstance(d, dict) else None
+    return d
+
+def compare(base_path, new_path, threshold):
+    """Print new vs base per (size, concurrency); 1 if any metric got worse by > threshold %."""
+    base, new = (json.load(open(p)) for p in (base_path, new_path))
+    old = {(r["size"], r["concurrency"]): r for r in base["results"]}
+    bad = 0
+    print(f"{base_path} ({base['meta'].get('rev')}) -> {new_path} ({new['meta'].get('rev')}),"
+          f" threshold {threshold:g}%")
+    for r in new["results"]:
+        b = old.get((r["size"], r["concurrency"]))
+        if b is None:
+            continue
+        cells = []
+        for path, higher in _METRICS:
+            x, y = _get(b, path), _get(r, path)
+            if not x or y is None:
+                continue
+            change = (y - x) / x * 100
+            worse = -change if higher else change
+            flag = worse > threshold
+            bad += flag
+            if flag or abs(change) > threshold:
+                cells.append(f"{path} {x:g} -> {y:g} ({change:+.0f}%){' REGRESSION' if flag else ''}")
+        print(f"  {_fmt(r['size']):>6s} x{r['concurrency']:<3d} " + ("; ".join(cells) or "within threshold"))
+    print(f"[{'ERR' if bad else 'OK'}] {bad} regression(s)")
+    return 1 if bad else 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="End-to-end encrypt/decrypt benchmark against a local server")
+    ap.add_argument("--sizes", default="1K,64K,1M,16M,256M", help="comma list, K/M/G suffixes (up to 4G)")
+    ap.add_argument("--concurrency", default="1,4")
+    ap.add_argument("--rounds", type=int, default=3, help="ops per worker below 64M (one above)")
+    ap.add_argument("--class", dest="cls", default="iot")
+    ap.add_argument("--key", default="/etc/kac_agg.json", help="member aggregate key file")
+    ap.add_argument("--work", default=None, help="scratch dir (default: system temp)")
+    ap.add_argument("--out", default=f"bench_e2e_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    ap.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"))
+    ap.add_argument("--threshold", type=float, default=10, help="percent worse that counts as a regression")
+    a = ap.parse_args()
+    sys.exit(compare(*a.compare, a.threshold) if a.compare else run(a))
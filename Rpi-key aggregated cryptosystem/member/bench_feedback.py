@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# bench_feedback.py - caller-side cost of OLED/LED feedback, measured on the fake display.
+#   python3 bench_feedback.py [--frames 1000]
+import os, time, argparse
+os.environ["KAC_FAKE_HW"] = "1"
+from hardware_io import oled, ui, feedback, show, _draw, _leds
+
+def _ms(dt):
+    return f"{dt * 1000:9.2f} ms"
+
+def main(frames):
+    # what feedback() used to cost the caller: draw + push + sleep(2) + LEDs off
+    t0 = time.perf_counter()
+    _leds(True, False); _draw(["Hello", "Access granted"]); time.sleep(2); _leds(False, False)
+    print(f"  synchronous feedback (old)        {_ms(time.perf_counter() - t0)}")
+
+    t0 = time.perf_counter()
+    feedback(True, ["Hello", "Access granted"])
+    print(f"  queued feedback, caller returns   {_ms(time.perf_counter() - t0)}")
+    ui.flush()
+
+    # decrypt path: tap granted + result = two statuses, the second replaces the first
+    t0 = time.perf_counter()
+    feedback(True, ["Hello Tester", "Access granted"])
+    feedback(True, ["Welcome Tester", "Class iot", "Access Granted"])
+    print(f"  rfid + decrypt feedback, caller   {_ms(time.perf_counter() - t0)}   (was ~4000 ms)")
+    ui.flush()
+
+    # viewer scrolling: a burst of page frames coalesces to what the panel can keep up with
+    n0, d0 = oled.frames, ui.drawn
+    t0 = time.perf_counter()
+    for i in range(frames):
+        show([f"page {i}"])
+    posted = time.perf_counter() - t0
+    ui.flush()
+    print(f"  {frames} frames posted in          {_ms(posted)}   ({posted * 1e6 / frames:.1f} us/frame)")
+    print(f"  frames pushed to the OLED         {oled.frames - n0:9d}   (fake push {oled.delay * 1000:.0f} ms)")
+    assert oled.last is not None
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=1000)
+    main(ap.parse_args().frames)
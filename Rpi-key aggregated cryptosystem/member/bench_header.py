@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# bench_header.py - JSON vs binary KAC header: serialize/parse cost and bytes per object.
+#   python3 bench_header.py [--n 200000]
+import os, json, time, argparse
+import kac_header
+
+def _sample(v2=True):
+    h = {"v": 2, "class": "iot/site42/line3", "nonce": os.urandom(7).hex(), "chunk": 65536,
+         "size": 734003200, "wrap": os.urandom(32).hex(), "pt_sha256": os.urandom(32).hex(),
+         "ct_sha256": os.urandom(32).hex(),
+         "env": {"temp_c": 22.31, "humidity_pct": 41.2, "pressure_hpa": 1012.8}}
+    if not v2:   # legacy single-shot header
+        h = {"class": "finance", "nonce": os.urandom(16).hex(), "tag": os.urandom(16).hex(),
+             "wrap": h["wrap"], "pt_sha256": h["pt_sha256"], "ct_sha256": h["ct_sha256"], "env": None}
+    return h
+
+def _us(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) * 1e6 / n
+
+def main(n):
+    for label, h in (("v2 segmented", _sample()), ("v1 legacy", _sample(False))):
+        j, b, b64 = json.dumps(h), kac_header.encode(h), kac_header.to_http(h)
+        assert kac_header.decode(b) == h and json.loads(j) == h
+        print(f"{label}:")
+        print(f"  bytes        JSON {len(j):5d}   binary {len(b):5d}   base64 (HTTP header) {len(b64):5d}"
+              f"   ({len(b64) / len(j):.0%} of JSON)")
+        print(f"  serialize    JSON {_us(lambda: json.dumps(h), n):6.2f} us   binary {_us(lambda: kac_header.encode(h), n):6.2f} us"
+              f"   +base64 {_us(lambda: kac_header.to_http(h), n):6.2f} us")
+        print(f"  parse        JSON {_us(lambda: json.loads(j), n):6.2f} us   binary {_us(lambda: kac_header.decode(b), n):6.2f} us"
+              f"   +base64 {_us(lambda: kac_header.from_http(b64), n):6.2f} us")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200_000)
+    main(ap.parse_args().n)
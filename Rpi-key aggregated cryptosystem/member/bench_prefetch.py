@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# bench_prefetch.py - tap-to-plaintext latency on the fake reader: download after the tap
+# (decrypt_file) vs download while waiting for it (decrypt_prefetched), cold cache each run.
+# --mbps throttles the body stream to a Pi-like link. Needs a running cloud server (config.json)
+# that either has the fake ATECC enrolled or runs with --allow-anonymous.
+#   python3 bench_prefetch.py [--mb 16] [--tap 2] [--mbps 40] [--runs 3] [--class iot]
+import os, sys, time, tempfile, argparse, contextlib, statistics
+ap = argparse.ArgumentParser()
+ap.add_argument("--mb", type=float, default=16)
+ap.add_argument("--tap", type=float, default=2.0, help="seconds the fake reader waits for a badge")
+ap.add_argument("--mbps", type=float, default=40, help="simulated link, megabits/s (0 = unthrottled)")
+ap.add_argument("--runs", type=int, default=3)
+ap.add_argument("--class", dest="cls", default="iot")
+a = ap.parse_args()
+os.environ["KAC_FAKE_HW"] = "1"
+os.environ["KAC_FAKE_TAP_DELAY"] = str(a.tap)
+import requests
+import decrypt, hardware_io
+from encrypt import encrypt_file
+
+def _throttle(r, *args, **kw):
+    inner = r.iter_content
+    def slow(chunk_size=1, decode_unicode=False):
+        for p in inner(chunk_size, decode_unicode):
+            time.sleep(len(p) * 8 / (a.mbps * 1e6))
+            yield p
+    r.iter_content = slow
+    return r
+
+def _cold(name):
+    c = decrypt.get_cache()
+    d = c and c.etag(name)
+    if d:
+        c.evict(d)
+
+def _run(fn, name, sess):
+    _cold(name)
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        t0 = time.monotonic()
+        out = fn(name, sess=sess, view=False)
+        t1 = time.monotonic()
+    return out, t1 - hardware_io._reader.tapped_at[-1], t1 - t0
+
+def main():
+    sess = requests.Session()
+    if a.mbps:
+        sess.hooks["response"].append(_throttle)
+    work = tempfile.mkdtemp(prefix="kac_pre_")
+    os.chdir(work)
+    name = "bench_prefetch.bin"
+    with open(name, "wb") as f:
+        f.write(os.urandom(int(a.mb * 1e6)))
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        encrypt_file(name, a.cls, sess)
+    link = f"{a.mbps:g} Mbit/s link" if a.mbps else "unthrottled link"
+    print(f"{a.mb:g} MB object, class {a.cls}, {link}, tap after {a.tap:g} s, {a.runs} runs")
+
+    res = {}
+    for label, fn in (("download after tap", decrypt.decrypt_file),
+                      ("prefetch during tap", decrypt.decrypt_prefetched)):
+        runs = [_run(fn, name, sess) for _ in range(a.runs)]
+        if any(out is None for out, _, _ in runs):
+            sys.exit(f"[ERR] {label}: decrypt failed (server up? class {a.cls} in the key?)")
+        res[label] = [lat for _, lat, _ in runs]
+        print(f"  {label:22s} tap->plaintext mean {statistics.mean(res[label]) * 1000:8.1f} ms"
+              f"   min {min(res[label]) * 1000:8.1f} ms   total {statistics.mean(t for *_, t in runs):6.2f} s")
+    print(f"  speedup {statistics.mean(res['download after tap']) / statistics.mean(res['prefetch during tap']):.1f}x")
+
+    hardware_io._reader.uid = 0xDEAD   # not enrolled
+    _, lat, _ = _run(decrypt.decrypt_prefetched, name, sess)
+    leftover = decrypt.get_cache().etag(name) if decrypt.get_cache() else None
+    print(f"  denied tap: prefetch cancelled {lat * 1000:.1f} ms after the tap,"
+          f" ciphertext {'LEFT IN CACHE' if leftover else 'discarded'}")
+    for fn in os.listdir(work):
+        os.unlink(os.path.join(work, fn))
+    os.rmdir(work)
+
+if __name__ == "__main__":
+    main()
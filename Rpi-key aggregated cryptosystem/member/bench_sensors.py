@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# bench_sensors.py - cost of an env reading to the caller (encrypt header, tap screen):
+# three synchronous BME280 reads (old read_bme280) vs the background sampler's ring buffer,
+# on the fake sensor with a per-reading bus delay, present and unplugged.
+#   python3 bench_sensors.py [--delay 0.01] [--hz 10] [--calls 200]
+import os, time, argparse
+os.environ["KAC_FAKE_HW"] = "1"
+import sensors, fake_hw
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] * 1e6
+
+def _lat(fn, n):
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+def _row(label, xs):
+    print(f"  {label:34s} p50 {_pct(xs, .5):10.1f} us   p99 {_pct(xs, .99):10.1f} us")
+
+def main(delay, hz, calls):
+    print(f"fake BME280, {delay * 1000:g} ms per reading, sampler at {hz:g} Hz, {calls} calls")
+    for absent in (False, True):
+        bme = fake_hw.FakeBME280(delay=delay, absent=absent)
+        print("sensor unplugged:" if absent else "sensor present:")
+        _row("synchronous read (old)", _lat(lambda: sensors.poll(bme), max(10, calls // 10)))
+        s = sensors.use(bme, rate_hz=hz)
+        s._tried.wait(5)
+        _row("sampler latest()", _lat(s.latest, calls))
+        time.sleep(1.0)   # let a window's worth of samples arrive
+        _row(f"sampler summary() ({min(s._n, s.size)} samples)", _lat(s.summary, calls))
+        if absent:
+            print(f"  sampler: {s.errors} failed polls in ~1 s (backs off up to {sensors.MAX_BACKOFF} s),"
+                  f" latest() = {s.latest()}")
+        else:
+            print(f"  latest {s.latest()}\n  window {s.summary()}")
+        s.stop()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--delay", type=float, default=0.01)
+    ap.add_argument("--hz", type=float, default=10)
+    ap.add_argument("--calls", type=int, default=200)
+    a = ap.parse_args()
+    main(a.delay, a.hz, a.calls)
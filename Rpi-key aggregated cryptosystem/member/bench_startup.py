@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# bench_startup.py - cold CLI runs vs calls into a warm kacd.
+# Needs a running cloud server (config.json) and, off the Pi, KAC_FAKE_HW=1.
+#   KAC_FAKE_HW=1 python3 bench_startup.py [--runs 5] [--size 65536]
+import os, sys, time, tempfile, subprocess, argparse, statistics
+import kacctl
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _run(cmd, cwd):
+    t0 = time.perf_counter()
+    subprocess.run(cmd, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+def _report(label, xs):
+    print(f"  {label:38s} mean {statistics.mean(xs) * 1000:8.1f} ms   min {min(xs) * 1000:8.1f} ms")
+
+def main(runs, size, cls):
+    py = sys.executable
+    with tempfile.TemporaryDirectory() as work:
+        src = os.path.join(work, "bench.bin")
+        with open(src, "wb") as f:
+            f.write(os.urandom(size))
+        sock = os.path.join(work, "kacd.sock")
+
+        print(f"{runs} runs, {size} B file, class {cls}")
+        _report("cold: import + device init", [_run(
+            [py, "-c", "import encrypt, decrypt, sensors, atecc_attest; sensors._get_bme(); "
+                       "atecc_attest._get_chip()"], HERE) for _ in range(runs)])
+        _report("cold: python3 encrypt.py", [_run([py, os.path.join(HERE, "encrypt.py"), src, cls], work)
+                                             for _ in range(runs)])
+
+        d = subprocess.Popen([py, os.path.join(HERE, "kacd.py"), "--socket", sock], cwd=HERE,
+                             stdout=subprocess.DEVNULL)
+        try:
+            t0 = time.perf_counter()
+            while True:
+                try:
+                    kacctl.call({"op": "ping"}, sock)
+                    break
+                except OSError:
+                    if d.poll() is not None:
+                        sys.exit("kacd exited during start-up")
+                    time.sleep(0.02)
+            print(f"  kacd start-up (once)                   {(time.perf_counter() - t0) * 1000:8.1f} ms")
+            _report("warm: kacctl.py ping", [_run([py, os.path.join(HERE, "kacctl.py"), "--socket", sock,
+                                                   "ping"], work) for _ in range(runs)])
+            _report("warm: kacctl.py encrypt", [_run([py, os.path.join(HERE, "kacctl.py"), "--socket", sock,
+                                                      "encrypt", src, cls], work) for _ in range(runs)])
+            xs = []
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                kacctl.call({"op": "encrypt", "path": src, "class": cls, "cwd": work}, sock)
+                xs.append(time.perf_counter() - t0)
+            _report("warm: in-process socket call, encrypt", xs)
+        finally:
+            d.terminate()
+            d.wait()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--size", type=int, default=64 * 1024)
+    ap.add_argument("--cls", default="iot")
+    args = ap.parse_args()
+    main(args.runs, args.size, args.cls)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# bench_tags.py - RFID allow-list lookup per tap: re-parse JSON (old) vs TagStore snapshot.
+# Also times the reload after an enrollment, bulk import/export, and counts taps that saw
+# a half-written file while another process keeps rewriting it.
+#   python3 bench_tags.py [--tags 100000] [--taps 2000]
+import os, io, json, time, random, shutil, tempfile, argparse, threading
+import tag_store
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+def _lat(fn, uids):
+    out = []
+    for u in uids:
+        t0 = time.perf_counter()
+        fn(u)
+        out.append((time.perf_counter() - t0) * 1e6)
+    return out
+
+def _old_lookup(path):
+    def f(uid):   # what rfid_check did on every tap
+        try:
+            with open(path, "r", encoding="utf-8") as fp:
+                d = {int(k): v for k, v in json.load(fp).items()}
+        except Exception:
+            d = {}
+        return d.get(uid)
+    return f
+
+def _torn(path, lookup, uid, writer, seconds=1.0):
+    """Taps that missed a known uid while `writer` keeps rewriting the file."""
+    stop, misses, taps = threading.Event(), 0, 0
+    t = threading.Thread(target=lambda: [writer() for _ in iter(stop.is_set, True)], daemon=True)
+    t.start()
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        taps += 1
+        misses += lookup(uid) is None
+    stop.set()
+    t.join()
+    return misses, taps
+
+def main(n, taps):
+    d = tempfile.mkdtemp(prefix="kac_tags_")
+    path = os.path.join(d, "authorized_tags.json")
+    tags = {random.randrange(1 << 40): f"User {i}" for i in range(n)}
+    uids = random.choices(list(tags), k=taps)
+    store = tag_store.TagStore(path)
+
+    csv_buf = io.StringIO()
+    for u, name in tags.items():
+        csv_buf.write(f"{u},{name}\n")
+    t0 = time.perf_counter()
+    with store.edit() as db:
+        db.update(tag_store.read_bulk(io.StringIO(csv_buf.getvalue())))
+    t_import = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    store.export(io.StringIO())
+    t_export = time.perf_counter() - t0
+    print(f"{len(store)} tags, {os.path.getsize(path) / 1e6:.1f} MB on disk")
+    print(f"  import CSV   {t_import * 1000:8.1f} ms      export CSV {t_export * 1000:8.1f} ms")
+
+    old = _lat(_old_lookup(path), uids[:max(20, taps // 100)])   # slow: sample fewer taps
+    store.refresh()
+    new = _lat(store.lookup, uids)
+    print(f"  per tap      old re-parse p50 {_pct(old, .5):10.1f} us  p99 {_pct(old, .99):10.1f} us")
+    print(f"               TagStore     p50 {_pct(new, .5):10.1f} us  p99 {_pct(new, .99):10.1f} us"
+          f"   ({_pct(old, .5) / _pct(new, .5):.0f}x)")
+
+    with store.edit() as db:
+        db[12345] = "New Hire"
+    t0 = time.perf_counter()
+    assert store.lookup(12345) == "New Hire"
+    print(f"  first tap after an enrollment (reload) {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    probe = uids[0]
+    body = json.dumps({str(k): v for k, v in tags.items()}, indent=2)
+    def rewrite_in_place():   # old enroll_rfid._save
+        with open(path, "w") as f:
+            f.write(body)
+    def rewrite_atomic():
+        store._write(tags)
+    m, t = _torn(path, _old_lookup(path), probe, rewrite_in_place)
+    print(f"  under concurrent rewrites: old {m}/{t} taps denied a valid badge", end="")
+    m, t = _torn(path, tag_store.TagStore(path).lookup, probe, rewrite_atomic)
+    print(f", TagStore {m}/{t}")
+    shutil.rmtree(d)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tags", type=int, default=100_000)
+    ap.add_argument("--taps", type=int, default=2000)
+    a = ap.parse_args()
+    main(a.tags, a.taps)
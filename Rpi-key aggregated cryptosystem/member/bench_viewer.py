@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# bench_viewer.py - OLED pager on a large decrypted log, measured on the fake display:
+# time to first page, per-page-flip latency and peak Python memory, eager (old) vs lazy.
+#   python3 bench_viewer.py [--mb 8] [--flips 200]
+import os, time, random, tempfile, argparse, tracemalloc
+os.environ["KAC_FAKE_HW"] = "1"
+import mmap
+import text_oled_viewer as tv
+from hardware_io import Image, ImageDraw, oled, ui
+
+def _old_render(lines, start, title):
+    # the pre-LazyText _render_page: fresh image, every glyph redrawn on each keypress
+    img = Image.new("1", (oled.width, oled.height))
+    d = ImageDraw.Draw(img)
+    d.text((0, 0), title[:tv._COLS], font=tv._font, fill=255)
+    y = 12
+    for ln in lines[start:start + tv._LINES_PER_PAGE]:
+        d.text((0, y), ln, font=tv._font, fill=255)
+        y += 12
+    d.text((0, oled.height - 12), f"{start+1}-{start+tv._LINES_PER_PAGE}/{len(lines)}", font=tv._font, fill=255)
+    ui.frame(img)
+
+def _make_log(path, mb):
+    words = ["sensor", "temp=21.4C", "rh=40%", "OK", "WARN", "door", "open", "closed", "badge",
+             "uid=12345678", "latency", "ms", "retry", "uplink", "segment", "verified"]
+    rnd = random.Random(1)
+    with open(path, "w") as f:
+        n = 0
+        while n < mb * 1e6:
+            line = f"2025-06-01T12:{n % 60:02d}:00 " + " ".join(rnd.choices(words, k=rnd.randint(3, 18))) + "\n"
+            f.write(line)
+            n += len(line)
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] * 1000
+
+def _flips(render, n):
+    pos = [i * tv._LINES_PER_PAGE for i in range(n)]
+    out = []
+    for start in pos + pos[::-1]:   # page down, then back up
+        t0 = time.perf_counter()
+        render(start)
+        out.append(time.perf_counter() - t0)
+        ui.flush()   # keypresses come slower than the panel; don't time GIL hand-offs to it
+    return out
+
+def main(mb, flips):
+    path = os.path.join(tempfile.mkdtemp(prefix="kac_view_"), "dec_log.txt")
+    _make_log(path, mb)
+    print(f"{os.path.getsize(path) / 1e6:.1f} MB log, fake OLED push {oled.delay * 1000:.0f} ms (asynchronous)")
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    with open(path, "rb") as f:
+        lines = tv._wrap_text(f.read().decode("utf-8"))
+    _old_render(lines, 0, "dec_log.txt")
+    old_first = time.perf_counter() - t0
+    old_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    old = _flips(lambda s: _old_render(lines, s, "dec_log.txt"), flips)
+    del lines
+    ui.flush()
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    f = open(path, "rb")
+    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    doc = tv.LazyText(buf)
+    pages = tv._Pages(doc)
+    tv._render_page(pages, 0, "dec_log.txt")
+    new_first = time.perf_counter() - t0
+    new_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    new = _flips(lambda s: tv._render_page(pages, s, "dec_log.txt"), flips)
+    ui.flush()
+
+    print(f"  time to first page   eager {old_first * 1000:9.1f} ms   lazy {new_first * 1000:7.2f} ms"
+          f"   ({old_first / new_first:.0f}x)")
+    back = new[flips:flips + pages._size]   # first pages paged back to are still in the LRU
+    print(f"  page flip p50        eager {_pct(old, .5):9.2f} ms   lazy {_pct(new[:flips], .5):7.2f} ms"
+          f"   revisit {_pct(back, .5):6.3f} ms")
+    print(f"  page flip p99        eager {_pct(old, .99):9.2f} ms   lazy {_pct(new[:flips], .99):7.2f} ms"
+          f"   revisit {_pct(back, .99):6.3f} ms")
+    print(f"  page bitmaps         {pages.hits} cache hits / {pages.misses} renders"
+          f" ({pages._size}-page LRU); {len(doc)} lines indexed so far")
+    print(f"  peak Python memory   eager {old_peak / 1e6:9.1f} MB   lazy {new_peak / 1e6:7.2f} MB (file is mmap'd)")
+    t0 = time.perf_counter()
+    total = doc.ensure(1 << 62)
+    print(f"  End key (index all)  {(time.perf_counter() - t0) * 1000:.0f} ms for {total} lines")
+    buf.close()
+    f.close()
+    os.unlink(path)
+    os.rmdir(os.path.dirname(path))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=float, default=8)
+    ap.add_argument("--flips", type=int, default=200)
+    a = ap.parse_args()
+    main(a.mb, a.flips)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# bench_wrap.py - per-key cost of KAC key wrapping, single vs bulk.
+#   python3 bench_wrap.py [--n 1000000]
+import os, json, time, tempfile, argparse
+import kac_client
+from kac_client import KACClient
+
+def _client():
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"key": os.urandom(32).hex(), "classes": ["bench"]}, f)
+    try:
+        return KACClient(f.name)
+    finally:
+        os.unlink(f.name)
+
+def _time(label, fn, n):
+    t0 = time.perf_counter()
+    fn()
+    dt = time.perf_counter() - t0
+    print(f"  {label:34s} {dt * 1e9 / n:9.1f} ns/key  ({dt:.3f}s)")
+    return dt
+
+def main(n):
+    kac = _client()
+    w = len(kac.key)
+    keys = os.urandom(n * w)
+    hexes = [keys[i:i + w].hex() for i in range(0, len(keys), w)]
+    print(f"{n} keys of {w} bytes")
+
+    def generator_xor():   # what wrap() used to do
+        k = kac.key
+        for i in range(0, len(keys), w):
+            bytes(a ^ b for a, b in zip(keys[i:i + w], k)).hex()
+    _time("per-key generator XOR (old)", generator_xor, n)
+    _time("per-key wrap() int XOR", lambda: [kac.wrap(keys[i:i + w]) for i in range(0, len(keys), w)], n)
+    _time("per-key unwrap() from hex", lambda: [kac.unwrap(h) for h in hexes], n)
+
+    np_mod = kac_client.np
+    if np_mod is not None:
+        _time("wrap_many (numpy)", lambda: kac.wrap_many(keys), n)
+    kac_client.np = None
+    _time("wrap_many (int.from_bytes)", lambda: kac.wrap_many(keys), n)
+    kac_client.np = np_mod
+    _time("unwrap_many from hex list", lambda: kac.unwrap_many(bytes.fromhex("".join(hexes))), n)
+
+    assert kac.unwrap_many(kac.wrap_many(keys)) == keys
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=1_000_000)
+    main(ap.parse_args().n)
@@ -1,84 +1,372 @@
 #!/usr/bin/env python3
-import os, sys, json, requests, hashlib, datetime
-from Cryptodome.Cipher import AES
+import os, sys, json, requests, datetime, tempfile, uuid, time, glob, queue, threading, argparse
+from requests.adapters import HTTPAdapter
 from Cryptodome.Random import get_random_bytes
-from kac_client import KACClient
+from kac_client import get_client
+from kac_stream import FORMAT, CHUNK, PREFIX_LEN, seal_stream
+import kac_header, kac_codec, kac_multipart, kac_metrics
 from hardware_io import feedback
-from sensors import read_bme280
-
-def _sha256_hex(b: bytes) -> str:
-    return hashlib.sha256(b).hexdigest()
+from sensors import read_bme280, env_summary
 
 CONF = json.load(open(os.path.join(os.path.dirname(__file__), "config.json")))
 BASE = CONF["cloud_base"].rstrip("/")
+CHUNK_SIZE = int(CONF.get("chunk_size", CHUNK))
+UPLOAD_TIMEOUT = float(CONF.get("upload_timeout", 60))
+SPOOL_MAX = 1 << 20   # ciphertexts up to 1 MiB stay in memory, larger ones spill to disk
+DEDUP_MIN = 64 * 1024  # below this an exists round-trip costs more than just sending
+BIN_HEADER = CONF.get("header_format", "json") == "bin"   # needs a server that knows header_bin
+COMPRESS = CONF.get("compression", "none")   # none | auto | zlib | lzma
+UPLINK_BPS = float(CONF.get("uplink_mbps", 10)) * 1e6 / 8   # for "auto": what a saved byte is worth
+MULTIPART_MIN = int(float(CONF.get("multipart_min_mb", 64)) * (1 << 20))   # sealed into outbox/, resumable
+PART_SIZE = int(float(CONF.get("part_mb", 8)) * (1 << 20))
+PART_PARALLEL = int(CONF.get("part_parallel", 4))
+
+class _StreamingForm:
+    """multipart/form-data body that streams the file part from disk.
+    requests would otherwise read the whole file into memory for files=.
+    With fp=None only the fields are sent (server already has the blob)."""
+
+    def __init__(self, fields: dict, filename: str, fp=None, size: int = 0, blk: int = CHUNK):
+        self.boundary = uuid.uuid4().hex
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n'.encode()
+            + (v if isinstance(v, bytes) else v.encode()) + b"\r\n" for k, v in fields.items())
+        if fp is not None:
+            head += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="file"; '
+                     f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n').encode()
+            tail = f"\r\n--{self.boundary}--\r\n"
+        else:
+            tail = f"--{self.boundary}--\r\n"
+        self.head, self.tail = head, tail.encode()
+        self.fp, self.size, self.blk = fp, size, blk
 
-def encrypt_file(path, cls):
-    kac = KACClient()
-    data = open(path, "rb").read()
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
 
-    # --- AES-GCM encrypt ---
-    key = get_random_bytes(32)
-    cipher = AES.new(key, AES.MODE_GCM)
-    ct, tag = cipher.encrypt_and_digest(data)
+    def __len__(self):
+        return len(self.head) + self.size + len(self.tail)
 
-    # --- optional env snapshot from BME280 ---
+    def __iter__(self):
+        yield self.head
+        if self.fp is None:
+            yield self.tail
+            return
+        self.fp.seek(0)
+        while True:
+            b = self.fp.read(self.blk)
+            if not b:
+                break
+            yield b
+        yield self.tail
+
+def _env_meta():
+    # --- optional env snapshot from the BME280 sampler: latest reading + recent min/mean/max ---
     env = read_bme280()
-    if env is not None:
-        env_meta = {
-            "temp_c": round(env[0], 2),
-            "humidity_pct": round(env[1], 1),
-            "pressure_hpa": round(env[2], 1)
-        }
+    if env is None:
+        return None, None
+    return {
+        "temp_c": round(env[0], 2),
+        "humidity_pct": round(env[1], 1),
+        "pressure_hpa": round(env[2], 1)
+    }, env_summary()
+
+def _seal(path, cls, kac, env_meta, compress=None):
+    """Encrypt one file into a spooled temp file, or for large files into an outbox slot
+    so the upload can be resumed. Returns (header, ct_file, size)."""
+    compress = compress or COMPRESS
+    if os.path.getsize(path) >= MULTIPART_MIN:
+        ct = kac_multipart.new_slot()   # locked while open: --resume leaves it alone
     else:
-        env_meta = None
+        ct = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX)
+    try:
+        with open(path, "rb") as src:
+            # --- optional compression, picked per file from a sample of its first chunks ---
+            codec = head = None
+            if compress == "auto":
+                head = src.read(kac_codec.SAMPLE_CHUNKS * CHUNK_SIZE)
+                codec = kac_codec.choose(head, UPLINK_BPS)
+            elif compress != "none":
+                codec = compress
+            # --- segmented AES-GCM encrypt, hashing pt/ct in the same pass ---
+            key = get_random_bytes(32)
+            wrapped = kac.wrap(key, cls)   # tree keys: fails here if cls is not covered
+            prefix = get_random_bytes(PREFIX_LEN)
+            if codec or head:
+                raw = kac_codec.CompressReader(src, codec, head or b"", CHUNK_SIZE)
+                size, _, ct_hash = seal_stream(key, prefix, raw, ct, CHUNK_SIZE)
+                pt_size, pt_hash = raw.size, raw.sha256.hexdigest()
+            else:
+                size, pt_hash, ct_hash = seal_stream(key, prefix, src, ct, CHUNK_SIZE)
+                pt_size = size
+    except Exception:
+        ct.close()
+        if kac_multipart.slot_of(ct):
+            kac_multipart.discard(kac_multipart.slot_of(ct))
+        raise
 
     # --- header for cloud (no plaintext) ---
     header = {
+        "v": FORMAT,
         "class": cls,
-        "nonce": cipher.nonce.hex(),
-        "tag": tag.hex(),
-        "wrap": kac.wrap(key),
-        "pt_sha256": _sha256_hex(data),
-        "ct_sha256": _sha256_hex(ct),
-        "env": env_meta,
+        "nonce": prefix.hex(),
+        "chunk": CHUNK_SIZE,
+        "size": size,   # bytes under the GCM segments (compressed size if "codec" is set)
+        "wrap": wrapped,
+        "pt_sha256": pt_hash,
+        "ct_sha256": ct_hash,
+        "env": env_meta[0],
     }
+    if env_meta[1]:
+        header["env_window"] = env_meta[1]
+    if codec:
+        header.update(codec=codec, pt_size=pt_size)
+    slot = kac_multipart.slot_of(ct)
+    if slot:
+        ct.flush()
+        os.fsync(ct.fileno())
+        kac_multipart.save(slot, {"filename": os.path.basename(path), "class": cls, "header": header,
+                                  "size": os.fstat(ct.fileno()).st_size, "pt_size": pt_size, "cwd": os.getcwd(),
+                                  "part_size": PART_SIZE, "upload_id": None, "done": []})
+    return header, ct, pt_size
 
-    # --- upload to cloud ---
-    filename = os.path.basename(path)
-    requests.post(f"{BASE}/upload",
-                  files={"file": ct},
-                  data={"header": json.dumps(header),
-                        "filename": filename})
+@kac_metrics.timed("encrypt.upload")
+def _upload(sess, filename, header, ct):
+    """Upload to cloud (streamed from the temp file, or in resumable parts from an outbox
+    slot). If the server already holds a blob with this ct_sha256 only the header is sent.
+    Returns True if bytes went out."""
+    if BIN_HEADER:
+        fields = {"header_bin": kac_header.encode(header), "filename": filename}
+    else:
+        fields = {"header": json.dumps(header), "filename": filename}
+    size = ct.seek(0, os.SEEK_END)
+    slot = kac_multipart.slot_of(ct)
+    try:
+        linked = size >= DEDUP_MIN and _link(sess, fields, filename, header)
+    except requests.RequestException as e:
+        if slot:
+            raise kac_multipart.Kept(slot, e) from e
+        raise
+    if linked:
+        if slot:
+            kac_multipart.discard(slot)
+        return False
+    if slot:
+        for _ in range(2):
+            try:
+                kac_multipart.send(sess, BASE, slot, PART_PARALLEL, UPLOAD_TIMEOUT,
+                                   kac_header.to_http(header) if BIN_HEADER else None)
+                return True
+            except kac_multipart.Gone:
+                # usually a /complete that went through with its reply lost: just link the name
+                try:
+                    linked = _link(sess, fields, filename, header)
+                except requests.RequestException as e:
+                    raise kac_multipart.Kept(slot, e) from e
+                if linked:
+                    kac_multipart.discard(slot)
+                    return True
+        raise kac_multipart.Kept(slot, "upload session vanished twice")
+    body = _StreamingForm(fields, filename, ct, size)
+    r = sess.post(f"{BASE}/upload", data=body, timeout=UPLOAD_TIMEOUT,
+                  headers={"Content-Type": body.content_type})
+    r.raise_for_status()
+    return True
+
+def _link(sess, fields, filename, header):
+    """Header-only upload for a blob the server already holds. False if it doesn't."""
+    if sess.head(f"{BASE}/blob/{header['ct_sha256']}", timeout=UPLOAD_TIMEOUT).status_code != 200:
+        return False
+    body = _StreamingForm(fields, filename)
+    r = sess.post(f"{BASE}/upload", data=body, timeout=UPLOAD_TIMEOUT,
+                  headers={"Content-Type": body.content_type})
+    if r.status_code == 404:   # blob was collected meanwhile, send it after all
+        return False
+    r.raise_for_status()
+    return True
 
+def _write_reports(filename, cls, header, size, outdir=""):
     # --- write local hash reports (no plaintext) ---
     ts = datetime.datetime.now().isoformat(timespec="seconds")
     report = {
         "timestamp": ts,
         "file": filename,
-        "size_bytes": len(data),
+        "size_bytes": size,
         "class": cls,
+        "format": FORMAT,
+        "chunk_size": CHUNK_SIZE,
+        "codec": header.get("codec"),
+        "stored_bytes": header["size"],
         "plaintext_sha256": header["pt_sha256"],
         "ciphertext_sha256": header["ct_sha256"],
         "nonce_hex": header["nonce"],
-        "tag_hex": header["tag"],
         "wrapped_key_hex": header["wrap"],
         "cloud_base": BASE,
-        "env": env_meta,
+        "env": header["env"],
+        "env_window": header.get("env_window"),
     }
-    rep_name = f"enc_report_{filename}.json"
+    rep_name = os.path.join(outdir, f"enc_report_{filename}.json")
     with open(rep_name, "w", encoding="utf-8") as f:
         json.dump(report, f, indent=2)
 
-    with open(f"{filename}.sha256", "w", encoding="utf-8") as f:
+    with open(os.path.join(outdir, f"{filename}.sha256"), "w", encoding="utf-8") as f:
         f.write(f"{header['pt_sha256']}  {filename}\n")
+    return rep_name
+
+@kac_metrics.timed("encrypt.total")
+def encrypt_file(path, cls, sess=None, compress=None):
+    kac = get_client()
+    filename = os.path.basename(path)
+    with kac_metrics.span("encrypt.env"):
+        env_meta = _env_meta()
+    header, ct, size = _seal(path, cls, kac, env_meta, compress)
+    with ct:
+        sent = _upload(sess or requests, filename, header, ct)
+    rep_name = _write_reports(filename, cls, header, size)
 
     feedback(True, [f"Encrypted {cls}", filename])
-    print(f"[OK] Uploaded {path} (class {cls})")
+    packed = f", {header['codec']} {header['size'] / max(size, 1):.0%}" if "codec" in header else ""
+    print(f"[OK] Uploaded {path} (class {cls}{packed}){'' if sent else ' - ciphertext already on server'}")
     print(f"[OK] Wrote {rep_name}")
     print(f"[OK] Wrote {filename}.sha256 (plaintext hash)")
 
+def encrypt_batch(paths, cls, workers=4, uploaders=4, depth=16, compress=None):
+    """Read+encrypt in `workers` threads and upload over one pooled session in
+    `uploaders` threads. Bounded queues between the stages keep at most ~depth
+    ciphertexts in flight. Key, BME280 snapshot and HTTP connections are set up once."""
+    kac = get_client()
+    env_meta = _env_meta()
+    sess = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=uploaders * PART_PARALLEL)
+    sess.mount("http://", adapter)
+    sess.mount("https://", adapter)
+
+    todo, done = queue.Queue(maxsize=depth), queue.Queue(maxsize=depth)
+    lock = threading.Lock()
+    stats = {"files": 0, "failed": 0, "bytes": 0, "deduped": 0}
+
+    def fail(path, e):
+        print(f"[ERR] {path}: {e}")
+        with lock:
+            stats["failed"] += 1
+
+    def encrypt_stage():
+        while (path := todo.get()) is not None:
+            try:
+                done.put((path,) + _seal(path, cls, kac, env_meta, compress))
+            except Exception as e:
+                fail(path, e)
+
+    def upload_stage():
+        while (item := done.get()) is not None:
+            path, header, ct, size = item
+            filename = os.path.basename(path)
+            try:
+                with ct:
+                    sent = _upload(sess, filename, header, ct)
+                _write_reports(filename, cls, header, size)
+                with lock:
+                    stats["files"] += 1
+                    stats["bytes"] += size
+                    stats["deduped"] += not sent
+            except Exception as e:
+                fail(path, e)
+
+    enc = [threading.Thread(target=encrypt_stage, daemon=True) for _ in range(workers)]
+    up = [threading.Thread(target=upload_stage, daemon=True) for _ in range(uploaders)]
+    t0 = time.perf_counter()
+    for t in enc + up:
+        t.start()
+    for path in paths:
+        todo.put(path)
+    for _ in enc:
+        todo.put(None)
+    for t in enc:
+        t.join()
+    for _ in up:
+        done.put(None)
+    for t in up:
+        t.join()
+    dt = max(time.perf_counter() - t0, 1e-9)
+
+    n, mb = stats["files"], stats["bytes"] / 1e6
+    ok = stats["failed"] == 0
+    feedback(ok, [f"Encrypted {cls}", f"{n} ok / {stats['failed']} failed", f"{mb / dt:.1f} MB/s"])
+    print(f"[{'OK' if ok else 'WARN'}] Uploaded {n} files ({mb:.1f} MB), "
+          f"{stats['deduped']} already on server, {stats['failed']} failed")
+    print(f"[OK] {n / dt:.1f} files/s, {mb / dt:.2f} MB/s in {dt:.1f}s")
+    return stats
+
+def resume_pending():
+    """Finish uploads left in the outbox by a crash, reboot or dead uplink."""
+    sess, n, failed = requests.Session(), 0, 0
+    for slot, st in kac_multipart.pending():
+        try:
+            with open(os.path.join(slot, "ct"), "rb") as ct:
+                sent = _upload(sess, st["filename"], st["header"], ct)
+            _write_reports(st["filename"], st["class"], st["header"], st["pt_size"], st["cwd"])
+            n += 1
+            print(f"[OK] Resumed {st['filename']} (class {st['class']})"
+                  f"{'' if sent else ' - ciphertext already on server'}")
+        except kac_multipart.Kept as e:
+            failed += 1
+            print(f"[ERR] {st['filename']}: {e.__cause__ or e} (kept in outbox)")
+        except Exception as e:
+            failed += 1
+            print(f"[ERR] {st['filename']}: {e} (kept in outbox)")
+    feedback(failed == 0, ["Resumed uploads", f"{n} ok / {failed} left"])
+    print(f"[{'OK' if not failed else 'WARN'}] {n} resumed, {failed} still pending")
+    return failed
+
+def _iter_paths(args):
+    if args.dir:
+        with os.scandir(args.dir) as it:
+            for e in it:
+                if e.is_file():
+                    yield e.path
+    elif args.glob:
+        for p in glob.iglob(args.glob, recursive=True):
+            if os.path.isfile(p):
+                yield p
+    else:
+        for line in sys.stdin:
+            if line.strip():
+                yield line.strip()
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python3 encrypt.py <file> <class>")
-        sys.exit(1)
-    encrypt_file(sys.argv[1], sys.argv[2])
+    kac_metrics.dump_at_exit()
+    ap = argparse.ArgumentParser(description="Encrypt and upload files under a KAC class")
+    ap.add_argument("file", nargs="?", help="single file to encrypt")
+    ap.add_argument("cls", metavar="class", nargs="?")
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--dir", help="encrypt every regular file in DIR")
+    src.add_argument("--glob", help="encrypt files matching PATTERN (** allowed)")
+    src.add_argument("--stdin", action="store_true", help="read file paths from stdin, one per line")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="encrypt threads")
+    ap.add_argument("--uploaders", type=int, default=4, help="parallel uploads")
+    ap.add_argument("--compress", choices=["none", "auto"] + sorted(kac_codec.CODECS),
+                    help=f"compress before encrypting (default from config.json: {COMPRESS})")
+    ap.add_argument("--resume", action="store_true", help="finish interrupted uploads from the outbox")
+    args = ap.parse_args()
+    if args.cls is None and args.file:   # argparse fills `file` first when only one positional is given
+        args.file, args.cls = None, args.file
+
+    if args.resume:
+        sys.exit(1 if resume_pending() else 0)
+    if not args.cls:
+        ap.error("missing <class>")
+    if args.dir or args.glob or args.stdin:
+        if args.file:
+            ap.error("give either a file or --dir/--glob/--stdin, not both")
+        st = encrypt_batch(_iter_paths(args), args.cls, args.workers, args.uploaders, compress=args.compress)
+        sys.exit(1 if st["failed"] else 0)
+    if not args.file:
+        ap.error("missing <file>")
+    try:
+        encrypt_file(args.file, args.cls, compress=args.compress)
+    except kac_multipart.Kept as e:
+        feedback(False, ["Upload failed", "Kept for --resume"])
+        sys.exit(f"[ERR] Upload of {args.file} failed: {e}")
+    except requests.RequestException as e:
+        feedback(False, ["Upload failed"])
+        sys.exit(f"[ERR] Upload of {args.file} failed: {e}")
@@ -1,7 +1,12 @@
 
-import os, json, argparse, sys, time
-import RPi.GPIO as GPIO
-from mfrc522 import SimpleMFRC522
+import argparse, sys, time
+import tag_store
+import fake_hw
+if fake_hw.ENABLED:
+    from fake_hw import GPIO, FakeReader as SimpleMFRC522
+else:
+    import RPi.GPIO as GPIO
+    from mfrc522 import SimpleMFRC522
 
 
 OLED_OK = False
@@ -15,20 +20,11 @@ try:
 except Exception:
     pass
 
-AUTH_FILE = os.path.join(os.path.dirname(__file__), "authorized_tags.json")
+STORE = tag_store.TagStore()
+AUTH_FILE = STORE.path
 
 def _load():
-    if os.path.exists(AUTH_FILE):
-        try:                       
-            d = json.load(open(AUTH_FILE))
-            return {int(k): v for k, v in d.items()}
-        except Exception:
-            pass
-    return {}
-
-def _save(d):
-    os.makedirs(os.path.dirname(AUTH_FILE), exist_ok=True)
-    json.dump({str(k): v for k, v in d.items()}, open(AUTH_FILE, "w"), indent=2)
+    return dict(STORE.refresh())
 
 def _blink(ok=True, sec=0.8):
     if not OLED_OK:
@@ -40,7 +36,6 @@ def _blink(ok=True, sec=0.8):
     GPIO.output(LED_RED,   0)
 
 def enroll(name=None, force=False, write_back=False):
-    db = _load()
     rdr = SimpleMFRC522()
     try:
         if OLED_OK: show(["RFID Enroll", "Tap card...", "(Ctrl+C=quit)"])
@@ -53,14 +48,13 @@ def enroll(name=None, force=False, write_back=False):
         if name is None:
             name = input("Enter name for this tag: ").strip() or "User"
 
-        if uid in db and not force:
-            print(f"UID {uid} already exists for '{db[uid]}'. Use --force to overwrite.")
-            if OLED_OK: show(["Already enrolled", f"UID: {uid}"])
-            _blink(ok=False)
-            return 1
-
-        db[uid] = name
-        _save(db)
+        with STORE.edit() as db:
+            if uid in db and not force:
+                print(f"UID {uid} already exists for '{db[uid]}'. Use --force to overwrite.")
+                if OLED_OK: show(["Already enrolled", f"UID: {uid}"])
+                _blink(ok=False)
+                return 1
+            db[uid] = name
         print(f"✅ Enrolled UID {uid} -> {name}")
         if OLED_OK: show(["Enroll OK", f"{name}", f"UID:{uid}"])
         _blink(ok=True)
@@ -78,12 +72,11 @@ def enroll(name=None, force=False, write_back=False):
         except Exception: pass
 
 def remove(uid: int):
-    db = _load()
-    if uid not in db:
+    with STORE.edit() as db:
+        who = db.pop(uid, None)
+    if who is None:
         print(f"UID {uid} not found.")
         return 1
-    who = db.pop(uid)
-    _save(db)
     print(f"🗑️ Removed UID {uid} ({who})")
     return 0
 
@@ -97,6 +90,32 @@ def list_all():
         print(f"  {u}  ->  {n}")
     return 0
 
+def import_tags(path, replace=False, force=False):
+    """Bulk enrollment from CSV (uid,name) or JSON. Existing UIDs are kept unless --force;
+    --replace makes the file the whole allow-list."""
+    with (sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")) as f:
+        new = tag_store.read_bulk(f, tag_store.fmt_of(path))
+    with STORE.edit() as db:
+        before = len(db)
+        if replace:
+            db.clear()
+        kept = 0
+        for uid, name in new.items():
+            if uid in db and not force and db[uid] != name:
+                kept += 1
+                continue
+            db[uid] = name
+        after = len(db)
+    print(f"✅ Imported {len(new)} tags ({after - before:+d} enrolled, {kept} existing kept; {after} total)")
+    return 0
+
+def export_tags(path):
+    with (sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")) as f:
+        n = STORE.export(f, tag_store.fmt_of(path))
+    if path != "-":
+        print(f"[OK] Exported {n} tags to {path}")
+    return 0
+
 if __name__ == "__main__":
     ap = argparse.ArgumentParser(description="RFID auto-enroll tool")
     sub = ap.add_subparsers(dest="cmd")
@@ -110,11 +129,22 @@ if __name__ == "__main__":
 
     sub.add_parser("list", help="List enrolled tags")
 
+    p_im = sub.add_parser("import", help="Bulk enroll from CSV (uid,name) or .json; - for stdin")
+    p_im.add_argument("file")
+    p_im.add_argument("--replace", action="store_true", help="Drop tags not in the file")
+
+    p_ex = sub.add_parser("export", help="Write all tags as CSV or .json; - for stdout")
+    p_ex.add_argument("file")
+
     args = ap.parse_args()
 
     if args.cmd == "list":
         sys.exit(list_all())
     elif args.cmd == "remove":
         sys.exit(remove(args.uid))
+    elif args.cmd == "import":
+        sys.exit(import_tags(args.file, args.replace, args.force))
+    elif args.cmd == "export":
+        sys.exit(export_tags(args.file))
     else:
         sys.exit(enroll(name=args.name, force=args.force, write_back=args.write_back))
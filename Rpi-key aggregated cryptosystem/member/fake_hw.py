@@ -0,0 +1,123 @@
+# fake_hw.py
+# In-process stand-ins for the Pi peripherals so the member code (and kacd) can run
+# and be benchmarked on a plain Linux box. Enabled with KAC_FAKE_HW=1; hardware_io,
+# sensors and atecc_attest then build these instead of touching GPIO/I2C/SPI.
+#
+#   KAC_FAKE_UID=<uid>          UID the fake RFID reader returns (default 1)
+#   KAC_FAKE_TAP_DELAY=<sec>    how long the fake reader "waits" for a tap (default 0)
+#   KAC_FAKE_OLED_DELAY=<sec>   per-frame push time of the fake OLED (default 0.025, ~1 KiB at 400 kHz I2C)
+#   KAC_FAKE_BME_DELAY=<sec>    per-reading time of the fake BME280 (default 0)
+#   KAC_FAKE_BME=absent         fake BME280 that fails every read, like an unplugged sensor
+import os, math, time, hashlib
+
+ENABLED = os.environ.get("KAC_FAKE_HW") == "1"
+
+class _FakeGPIO:
+    BCM, OUT, IN = 11, 0, 1
+    HIGH, LOW = 1, 0
+
+    def __init__(self):
+        self.pins = {}
+
+    def setwarnings(self, flag): pass
+    def setmode(self, mode): pass
+
+    def setup(self, pin, mode, initial=0):
+        self.pins[pin] = initial
+
+    def output(self, pin, value):
+        self.pins[pin] = value
+
+    def cleanup(self):
+        self.pins.clear()
+
+GPIO = _FakeGPIO()
+
+class FakeOLED:
+    """Same surface as luma's ssd1306 for our purposes: width/height/display().
+    Records when each frame landed so UI timing can be measured."""
+
+    def __init__(self, width=128, height=64, delay=None):
+        self.width, self.height = width, height
+        self.delay = float(os.environ.get("KAC_FAKE_OLED_DELAY", 0.025) if delay is None else delay)
+        self.frames = 0
+        self.last = None
+        self.shown_at = []
+
+    def display(self, image):
+        if self.delay:
+            time.sleep(self.delay)
+        self.frames += 1
+        self.last = image
+        self.shown_at.append(time.monotonic())
+
+class FakeReader:
+    """SimpleMFRC522 look-alike: read() blocks for KAC_FAKE_TAP_DELAY then returns a UID."""
+
+    def __init__(self, uid=None, delay=None):
+        self.uid = int(os.environ.get("KAC_FAKE_UID", 1) if uid is None else uid)
+        self.delay = float(os.environ.get("KAC_FAKE_TAP_DELAY", 0) if delay is None else delay)
+        self.tapped_at = []
+
+    def read(self):
+        if self.delay:
+            time.sleep(self.delay)
+        self.tapped_at.append(time.monotonic())
+        return self.uid, ""
+
+    def write(self, text):
+        return self.uid, text
+
+class FakeBME280:
+    """Readings drift slowly around 21.5 C / 40 % / 1013 hPa. Each property read takes
+    KAC_FAKE_BME_DELAY s (a slow bus); KAC_FAKE_BME=absent makes every read fail."""
+
+    def __init__(self, delay=None, absent=None):
+        self.delay = float(os.environ.get("KAC_FAKE_BME_DELAY", 0) if delay is None else delay)
+        self.absent = os.environ.get("KAC_FAKE_BME") == "absent" if absent is None else absent
+        self.reads = 0
+
+    def _read(self, base, swing):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.absent:
+            raise OSError("[Errno 121] Remote I/O error")
+        self.reads += 1
+        return base + swing * math.sin(time.time() / 300)
+
+    temperature = property(lambda self: self._read(21.5, 0.5))
+    relative_humidity = property(lambda self: self._read(40.0, 2.0))
+    pressure = property(lambda self: self._read(1013.25, 1.5))
+
+_P256_N = 0xFFFFFFFF00000000FFFFFFFFFFFFFFFFBCE6FAADA7179E84F3B9CAC2FC632551   # group order
+
+class FakeATECC:
+    """Software P-256 key standing in for the ATECC608's slot-0 key. Same seed, same
+    serial and key (KAC_FAKE_ATECC_SEED), so a fake member can be enrolled on a server."""
+
+    def __init__(self, seed: bytes = None):
+        from Cryptodome.PublicKey import ECC
+        seed = seed or os.environ.get("KAC_FAKE_ATECC_SEED", "kac-fake-atecc").encode()
+        self.serial_number = hashlib.sha256(seed).digest()[:9]
+        d = int.from_bytes(hashlib.sha256(seed + b"/key").digest(), "big")
+        self._key = ECC.construct(curve="P-256", d=d % (_P256_N - 1) + 1)
+
+    def public_key_pem(self) -> str:
+        return self._key.public_key().export_key(format="PEM")
+
+    def gen_key(self, key: bytearray, slot_num: int = 0, private_key: bool = False):
+        # adafruit_atecc API: with private_key=False, write slot's public key (x||y) into key
+        q = self._key.pointQ
+        key[:64] = int(q.x).to_bytes(32, "big") + int(q.y).to_bytes(32, "big")
+        return key
+
+    def sign(self, digest: bytes) -> bytes:
+        from Cryptodome.Signature import DSS
+        from Cryptodome.Hash import SHA256
+
+        class _Prehashed:   # DSS wants a hash object; the chip is handed a digest
+            digest_size = 32
+            oid = SHA256.new().oid
+            def __init__(self, d): self._d = d
+            def digest(self): return self._d
+        return DSS.new(self._key, "fips-186-3").sign(_Prehashed(digest))
@@ -1,11 +1,18 @@
-import os, json
-import RPi.GPIO as GPIO
-from time import sleep
-from luma.core.interface.serial import i2c
-from luma.oled.device import ssd1306
 from PIL import Image, ImageDraw, ImageFont
-from mfrc522 import SimpleMFRC522
-from sensors import lines_for_oled
+from sensors import lines_for_oled, sampler
+import fake_hw, kac_metrics
+from ui_worker import UIWorker
+from tag_store import TagStore
+
+if fake_hw.ENABLED:
+    from fake_hw import GPIO, FakeOLED, FakeReader as SimpleMFRC522
+else:
+    import RPi.GPIO as GPIO
+    from luma.core.interface.serial import i2c
+    from luma.oled.device import ssd1306
+    from mfrc522 import SimpleMFRC522
+
+sampler()   # BME280 polled in the background; its first reading lands while the rest comes up
 
 # ---------------- GPIO / LED setup ----------------
 LED_GREEN, LED_RED = 17, 27
@@ -15,8 +22,11 @@ GPIO.setup(LED_GREEN, GPIO.OUT, initial=GPIO.LOW)
 GPIO.setup(LED_RED,   GPIO.OUT, initial=GPIO.LOW)
 
 # ---------------- OLED setup ----------------
-serial = i2c(port=1, address=0x3C)   # common SSD1306 I2C address
-oled = ssd1306(serial, width=128, height=64)
+if fake_hw.ENABLED:
+    oled = FakeOLED(width=128, height=64)
+else:
+    serial = i2c(port=1, address=0x3C)   # common SSD1306 I2C address
+    oled = ssd1306(serial, width=128, height=64)
 
 # Monospace font fits best on 128x64
 try:
@@ -24,57 +34,57 @@ try:
 except Exception:
     font = ImageFont.load_default()
 
-def show(lines):
-    """Display up to 4 lines on the OLED."""
-    image = Image.new("1", (oled.width, oled.height))
-    draw = ImageDraw.Draw(image)
-    for i, line in enumerate((lines if isinstance(lines, list) else [str(lines)])[:4]):
-        draw.text((0, i * 16), str(line), font=font, fill=255)
+def _draw(lines):
+    if isinstance(lines, Image.Image):
+        image = lines
+    else:
+        image = Image.new("1", (oled.width, oled.height))
+        draw = ImageDraw.Draw(image)
+        for i, line in enumerate((lines if isinstance(lines, list) else [str(lines)])[:4]):
+            draw.text((0, i * 16), str(line), font=font, fill=255)
     oled.display(image)
 
-def feedback(granted: bool, lines):
-    """LED + OLED feedback for 2 seconds."""
-    GPIO.output(LED_GREEN, GPIO.HIGH if granted else GPIO.LOW)
-    GPIO.output(LED_RED,   GPIO.LOW  if granted else GPIO.HIGH)
-    show(lines)
-    sleep(2)
-    GPIO.output(LED_GREEN, GPIO.LOW)
-    GPIO.output(LED_RED,   GPIO.LOW)
+def _leds(green, red):
+    GPIO.output(LED_GREEN, GPIO.HIGH if green else GPIO.LOW)
+    GPIO.output(LED_RED,   GPIO.HIGH if red else GPIO.LOW)
 
-# ---------------- Authorized tags (JSON allow-list) ----------------
-AUTH_FILE = os.path.join(os.path.dirname(__file__), "authorized_tags.json")
+# All OLED/LED traffic goes through one worker thread; callers never wait on it.
+ui = UIWorker(_draw, _leds)
 
-def _load_authorized():
-    try:
-        with open(AUTH_FILE, "r", encoding="utf-8") as f:
-            d = json.load(f)
-        return {int(k): v for k, v in d.items()}
-    except Exception:
-        return {}
+def show(lines):
+    """Display up to 4 lines (or a ready PIL image) on the OLED. Returns immediately."""
+    ui.frame(lines)
 
-AUTHORIZED_TAGS = _load_authorized()
+def feedback(granted: bool, lines, hold: float = 2.0):
+    """LED + OLED feedback, held for `hold` seconds by the UI worker. Returns immediately."""
+    ui.status(lines, (granted, not granted), hold)
+
+# ---------------- Authorized tags (JSON allow-list) ----------------
+TAGS = TagStore()
+AUTH_FILE = TAGS.path
 
 def reload_authorized():
-    global AUTHORIZED_TAGS
-    AUTHORIZED_TAGS = _load_authorized()
-    return AUTHORIZED_TAGS
+    # cheap: one stat(), the file is only parsed again after it changed
+    return TAGS.refresh()
 
 # ---------------- RFID reader ----------------
 _reader = SimpleMFRC522()
 
+@kac_metrics.timed("rfid.check")
 def rfid_check():
     """Block until a card is tapped. Returns (True, name) or (False, 'Unknown')."""
     # hot-reload new enrollments
-    reload_authorized()
+    tags = reload_authorized()
 
     env_lines = lines_for_oled()
     base = ["Security Verification", "Tap the card...", "Waiting..."]
     show((env_lines + base)[:4])
 
-    uid, _ = _reader.read()   # blocking read
+    with kac_metrics.span("rfid.wait"):
+        uid, _ = _reader.read()   # blocking read
     uid = int(uid)
 
-    name = AUTHORIZED_TAGS.get(uid)
+    name = tags.get(uid)
     if name:
         feedback(True, [f"Hello {name}", "Access granted"]) 
         return True, name
@@ -86,6 +96,7 @@ def rfid_check():
 import atexit
 @atexit.register
 def _cleanup_gpio():
+    ui.close(timeout=3)   # let the last message be seen before the LEDs are released
     try:
         GPIO.cleanup()
     except Exception:
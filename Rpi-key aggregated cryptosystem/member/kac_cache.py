@@ -0,0 +1,140 @@
+# member/kac_cache.py
+# On-device cache of downloaded objects, keyed by ct_sha256 and bounded in bytes (LRU).
+#
+#   <root>/blobs/<ct_sha256>    cached body (ciphertext by default)
+#   <root>/names/<name>         ct_sha256 last seen under that name
+#
+# decrypt.py sends If-None-Match: "<ct_sha256>" for the name; the server answers 304 with
+# the current header and no body when the blob is unchanged, and the body comes from here.
+# By default the cache holds ciphertext, so nothing readable is kept at rest; opening it
+# still needs the aggregate key, and a tap. With plaintext=True bodies are stored decrypted,
+# which skips AES on a hit but is only allowed on a tmpfs (ideally an encrypted one).
+# Recency is the file mtime, touched on every hit. Entries are hashed when stored and
+# re-hashed as they are read back; a mismatch evicts the entry.
+import os, hashlib, tempfile
+
+class Corrupt(ValueError):
+    """A cached body no longer hashes to what it was stored under (it has been evicted)."""
+
+def on_tmpfs(path: str) -> bool:
+    path, best = os.path.realpath(path), ("", "")
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                _, mnt, fstype = line.split()[:3]
+                if (path == mnt or path.startswith(mnt.rstrip("/") + "/")) and len(mnt) > len(best[0]):
+                    best = (mnt, fstype)
+    except OSError:
+        return False
+    return best[1] in ("tmpfs", "ramfs")
+
+class Cache:
+    def __init__(self, root: str, max_bytes: int, plaintext=False):
+        if plaintext and not on_tmpfs(root):
+            raise ValueError(f"plaintext cache {root} must be on a tmpfs")
+        self.root, self.max_bytes, self.plaintext = root, max_bytes, plaintext
+        self._blobs, self._names = os.path.join(root, "blobs"), os.path.join(root, "names")
+        for d in (self._blobs, self._names):
+            os.makedirs(d, mode=0o700, exist_ok=True)
+
+    def _blob(self, digest: str) -> str:
+        return os.path.join(self._blobs, digest)
+
+    def etag(self, name: str):
+        """ct_sha256 cached for name, or None."""
+        try:
+            with open(os.path.join(self._names, name)) as f:
+                digest = f.read().strip()
+        except OSError:
+            return None
+        return digest if os.path.exists(self._blob(digest)) else None
+
+    def remember(self, name: str, digest: str):
+        fd, tmp = tempfile.mkstemp(dir=self._names)
+        with os.fdopen(fd, "w") as f:
+            f.write(digest)
+        os.replace(tmp, os.path.join(self._names, name))
+
+    def get(self, digest: str):
+        """Path of the cached body (and mark it recently used), or None."""
+        p = self._blob(digest)
+        try:
+            os.utime(p)
+        except OSError:
+            return None
+        return p
+
+    def evict(self, digest: str):
+        try:
+            os.unlink(self._blob(digest))
+        except FileNotFoundError:
+            pass
+
+    def read(self, digest: str, expect: str, start=0, stop=None, blk=64 * 1024):
+        """Generator over the cached body (or bytes [start, stop) of it). A full read is
+        checked against `expect` at the end: Corrupt, and the entry is gone, if it differs."""
+        h = hashlib.sha256() if start == 0 and stop is None else None
+        with open(self._blob(digest), "rb") as f:
+            f.seek(start)
+            left = stop - start if stop is not None else -1
+            while left:
+                b = f.read(blk if left < 0 else min(blk, left))
+                if not b:
+                    break
+                if h:
+                    h.update(b)
+                left -= len(b) if left > 0 else 0
+                yield b
+        if h and h.hexdigest() != expect:
+            self.evict(digest)
+            raise Corrupt("cached object is corrupt (evicted)")
+
+    def fill(self, digest: str, expect: str, pieces):
+        """Pass `pieces` through unchanged while copying them into a temp file; the copy
+        becomes the entry for `digest` only if the stream ends and hashes to `expect`."""
+        fd, tmp = tempfile.mkstemp(prefix=".fill_", dir=self._blobs)
+        h, n = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for p in pieces:
+                    if n + len(p) <= self.max_bytes:
+                        f.write(p)
+                        h.update(p)
+                    n += len(p)
+                    yield p
+            if n <= self.max_bytes and h.hexdigest() == expect:
+                os.replace(tmp, self._blob(digest))
+                tmp = None
+                self._shrink(keep=digest)
+        finally:
+            if tmp:
+                os.unlink(tmp)
+
+    def _shrink(self, keep=None):
+        entries = []
+        with os.scandir(self._blobs) as it:
+            for e in it:
+                try:
+                    st = e.stat()
+                except FileNotFoundError:   # another decrypt evicted it meanwhile
+                    continue
+                if not e.name.startswith("."):
+                    entries.append((st.st_mtime, st.st_size, e.name))
+        total = sum(s for _, s, _ in entries)
+        for _, size, name in sorted(entries):   # least recently used first
+            if total <= self.max_bytes:
+                break
+            if name != keep:
+                self.evict(name)
+                total -= size
+
+    def usage(self):
+        n = total = 0
+        with os.scandir(self._blobs) as it:
+            for e in it:
+                try:
+                    total += 0 if e.name.startswith(".") else e.stat().st_size
+                    n += not e.name.startswith(".")
+                except FileNotFoundError:
+                    pass
+        return n, total
@@ -1,24 +1,122 @@
 from Cryptodome.Random import get_random_bytes
-import json, os
+import json, os, threading, hmac
+from hashlib import sha256
+from functools import lru_cache
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+AGG_FILE = "/etc/kac_agg.json"
+
+# Hierarchical ("kdf": "ggm") keys hold subtree seeds instead of one key; same steps as
+# manager/kac_tree.py. A class key is O(depth) HMACs below the seed covering it.
+def _child(seed: bytes, label: str) -> bytes:
+    return hmac.new(seed, b"kac/node/" + label.encode(), sha256).digest()
+
+def _class_key(seed: bytes) -> bytes:
+    return hmac.new(seed, b"kac/key", sha256).digest()
 
 class KACClient:
-    def __init__(self, agg_file="/etc/kac_agg.json"):
+    def __init__(self, agg_file=AGG_FILE):
         self.path = agg_file
         self.key = None
-        self.classes = []
+        self.seeds = None   # {("iot", "site42"): seed} for tree keys
+        self.classes = frozenset()
+        self.stamp = None   # (inode, mtime_ns, size) of the file this key came from
         try:
-            d = json.load(open(self.path))
-            self.key = bytes.fromhex(d["key"])
-            self.classes = d["classes"]
-        except Exception as e:
-            raise RuntimeError(f"Cannot load aggregate key {agg_file}: {e}")
+            with open(self.path) as f:
+                st = os.fstat(f.fileno())
+                d = json.load(f)
+            if "seeds" in d:
+                self.seeds = {tuple(p.strip("/").split("/")): bytes.fromhex(h) for p, h in d["seeds"].items()}
+                self.key_for = lru_cache(maxsize=4096)(self._tree_key)
+            else:
+                self.key = bytes.fromhex(d["key"])
+            self.classes = frozenset(d["classes"])
+            self.stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            raise RuntimeError(f"Cannot load aggregate key {agg_file}: {e}") from e
 
-    def authorized(self, cls): 
+    def _tree_key(self, cls: str):
+        parts = tuple(cls.strip("/").split("/"))
+        for i in range(len(parts), 0, -1):
+            seed = self.seeds.get(parts[:i])
+            if seed is not None:
+                for label in parts[i:]:
+                    seed = _child(seed, label)
+                return _class_key(seed)
+        return None
+
+    def key_for(self, cls=None) -> bytes:
+        """Wrapping key for class `cls` (None if not covered). Flat keys use one key for all."""
+        return self.key
+
+    def authorized(self, cls):
+        if self.seeds is not None:
+            return bool(cls) and self.key_for(cls) is not None
         return cls in self.classes
 
-    def wrap(self, aes_key: bytes) -> str:
-        return bytes(a ^ b for a, b in zip(aes_key, self.key[:len(aes_key)])).hex()
+    def _key(self, cls):
+        k = self.key_for(cls)
+        if k is None:
+            raise PermissionError(f"class {cls!r} is not covered by this aggregate key")
+        return k
+
+    def _xor(self, b, cls=None) -> bytes:
+        key = self._key(cls)
+        n = len(b)
+        if n > len(key):
+            raise ValueError(f"{n}-byte key is longer than the {len(key)}-byte aggregate key")
+        return (int.from_bytes(b, "little") ^ int.from_bytes(key[:n], "little")).to_bytes(n, "little")
+
+    def wrap(self, aes_key: bytes, cls=None) -> str:
+        return self._xor(aes_key, cls).hex()
+
+    def unwrap(self, wrap_hex: str, cls=None) -> bytes:
+        return self._xor(bytes.fromhex(wrap_hex), cls)
+
+    def _xor_many(self, buf, cls=None) -> bytes:
+        # buf = k_0 || k_1 || ... each exactly len(key) bytes
+        key = self._key(cls)
+        buf = memoryview(buf).cast("B")
+        width = len(key)
+        if len(buf) % width:
+            raise ValueError(f"buffer length {len(buf)} is not a multiple of {width}")
+        if np is not None:
+            a = np.frombuffer(buf, dtype=np.uint8).reshape(-1, width)
+            return (a ^ np.frombuffer(key, dtype=np.uint8)).tobytes()
+        n = len(buf) // width
+        x = int.from_bytes(buf, "little") ^ int.from_bytes(key * n, "little")
+        return x.to_bytes(len(buf), "little")
+
+    def wrap_many(self, keys, cls=None) -> bytes:
+        """Wrap a contiguous buffer of full-width keys (all of class `cls`) in one pass.
+        Hex wraps for headers: out[i*w:(i+1)*w].hex()."""
+        return self._xor_many(keys, cls)
+
+    def unwrap_many(self, wraps, cls=None) -> bytes:
+        """Inverse of wrap_many; for hex wraps pass bytes.fromhex("".join(hex_list))."""
+        return self._xor_many(wraps, cls)
+
+_clients = {}
+_clients_lock = threading.Lock()
 
-    def unwrap(self, wrap_hex: str) -> bytes:
-        w = bytes.fromhex(wrap_hex)
-        return bytes(a ^ b for a, b in zip(w, self.key[:len(w)]))
+def get_client(agg_file=None) -> KACClient:
+    """Process-wide KACClient for agg_file (default AGG_FILE). Costs one stat() per call and
+    reloads only when the file was replaced or modified, so a key rotation is picked up
+    without restarting. A reload builds a new client, never mutates the old one."""
+    agg_file = agg_file or AGG_FILE
+    try:
+        st = os.stat(agg_file)
+    except OSError as e:
+        raise RuntimeError(f"Cannot load aggregate key {agg_file}: {e}") from e
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    c = _clients.get(agg_file)
+    if c is not None and c.stamp == stamp:
+        return c
+    with _clients_lock:
+        c = _clients.get(agg_file)
+        if c is None or c.stamp != stamp:
+            c = _clients[agg_file] = KACClient(agg_file)
+        return c
@@ -0,0 +1,104 @@
+# member/kac_codec.py
+# Optional compression in front of the AES-GCM stream.
+# Codecs are (compressor factory, decompressor factory) pairs of stdlib-style streaming
+# objects (.compress/.flush, .decompress/.eof); register() adds more. "auto" compresses
+# the first few chunks with every candidate, times it on this CPU, and keeps whichever
+# codec (or none) would get the file onto the uplink soonest. The chosen name goes into
+# the header as "codec"; objects without it are uncompressed.
+import zlib, lzma, time, hashlib
+from kac_stream import CHUNK
+
+CODECS = {}
+SAMPLE_CHUNKS = 4
+
+def register(name, compressor, decompressor):
+    CODECS[name] = (compressor, decompressor)
+
+# fast settings: a Pi core manages roughly a quarter of a desktop core's MB/s
+register("zlib", lambda: zlib.compressobj(1), zlib.decompressobj)
+register("lzma", lambda: lzma.LZMACompressor(preset=0), lzma.LZMADecompressor)
+
+def choose(sample: bytes, uplink_bps: float, candidates=None):
+    """Codec name (or None) that minimises compress time + transfer time for `sample`."""
+    if not sample:
+        return None
+    best, best_t = None, len(sample) / uplink_bps
+    for name in candidates or CODECS:
+        t0 = time.perf_counter()
+        c = CODECS[name][0]()
+        n = len(c.compress(sample)) + len(c.flush())
+        t = time.perf_counter() - t0 + n / uplink_bps
+        if t < best_t * 0.95:   # must clearly win, or the stage isn't worth it
+            best, best_t = name, t
+    return best
+
+class CompressReader:
+    """File-like read(n) over src that returns the compressed stream (or src unchanged
+    for codec None), replaying `head` (already-read sample bytes) first. Hashes and
+    counts the raw bytes on the way through."""
+
+    def __init__(self, src, codec=None, head=b"", blk=CHUNK):
+        self._src, self._head, self._blk = src, head, blk
+        self._c = CODECS[codec][0]() if codec else None
+        self._buf = bytearray()
+        self._eof = False
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def _pull(self):
+        data, self._head = self._head or self._src.read(self._blk), b""
+        if data:
+            self.sha256.update(data)
+            self.size += len(data)
+            self._buf += self._c.compress(data) if self._c else data
+        else:
+            self._eof = True
+            if self._c:
+                self._buf += self._c.flush()
+
+    def read(self, n=-1):
+        while (n < 0 or len(self._buf) < n) and not self._eof:
+            self._pull()
+        n = len(self._buf) if n < 0 else n
+        out = bytes(self._buf[:n])
+        del self._buf[:n]
+        return out
+
+def _bounded(d, p, blk):
+    # at most blk bytes per piece, however well p compresses: zlib-style objects keep the
+    # rest of the input in unconsumed_tail, lzma/bz2-style ones buffer it until needs_input
+    if not hasattr(d, "unconsumed_tail") and not hasattr(d, "needs_input"):
+        yield d.decompress(p)   # a register()ed codec without max_length support
+        return
+    while True:
+        out = d.decompress(p, blk)
+        if out:
+            yield out
+        if d.eof:
+            return
+        if hasattr(d, "unconsumed_tail"):
+            p = d.unconsumed_tail
+            if not p and len(out) < blk:
+                return
+        else:
+            p = b""
+            if d.needs_input:
+                return
+
+def decompress(pieces, codec, blk=CHUNK):
+    """Generator: compressed pieces in, plaintext pieces of at most blk bytes out. Raises
+    ValueError if the stream ends early or has trailing data."""
+    d = CODECS[codec][1]()
+    for p in pieces:
+        if d.eof and p:
+            raise ValueError("data after end of compressed stream")
+        yield from _bounded(d, p, blk)
+    flush = getattr(d, "flush", None)
+    if flush:
+        out = flush()
+        if out:
+            yield out
+    if not d.eof:
+        raise ValueError("compressed stream is truncated")
+    if d.unused_data:
+        raise ValueError("data after end of compressed stream")
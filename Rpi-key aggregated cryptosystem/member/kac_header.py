@@ -0,0 +1,123 @@
+# member/kac_header.py
+# Compact binary form of the KAC object header (the JSON dict built by encrypt.py).
+#
+#   b"KH" | version u8 | present u16 | fields in table order | [tail]
+#
+# Known fields are stored raw (hex strings as bytes, numbers as fixed-width ints, env as
+# a marker byte plus three f64); `present` has one bit per table entry. Anything that would not round-trip
+# exactly (an unknown key, uppercase hex, an odd env) goes into a JSON tail, flagged by the
+# top bit, so decode(encode(h)) == h for every header. On the wire it travels base64'd in
+# X-KAC-HEADER-BIN when the client asks for it; JSON X-KAC-HEADER stays the default.
+import json, struct, base64
+
+MAGIC = b"KH"
+VERSION = 1
+_TAIL = 1 << 15
+_ENV = ("temp_c", "humidity_pct", "pressure_hpa")
+
+_FIELDS = (   # order is part of the format: append only
+    ("v", "u8"),
+    ("class", "str"),
+    ("nonce", "hex"),
+    ("tag", "hex"),
+    ("chunk", "u32"),
+    ("size", "u64"),
+    ("wrap", "hex"),
+    ("pt_sha256", "hex"),
+    ("ct_sha256", "hex"),
+    ("env", "env"),
+    ("codec", "str"),
+    ("pt_size", "u64"),
+)
+_KNOWN = frozenset(k for k, _ in _FIELDS)
+_INT = {"u8": struct.Struct(">B"), "u32": struct.Struct(">I"), "u64": struct.Struct(">Q")}
+_F64x3 = struct.Struct(">3d")
+_TABLE = tuple((1 << i, k, kind, _INT.get(kind)) for i, (k, kind) in enumerate(_FIELDS))
+
+def _pack(kind, st, v):
+    """Raw bytes for one field, or None if v would not round-trip through them."""
+    t = type(v)
+    if st is not None:
+        return st.pack(v) if t is int and 0 <= v < 1 << (8 * st.size) else None
+    if kind == "hex":
+        if t is not str or len(v) > 510:
+            return None
+        try:
+            b = bytes.fromhex(v)
+        except ValueError:
+            return None
+        return bytes((len(b),)) + b if b.hex() == v else None
+    if kind == "str":
+        b = v.encode() if t is str else b""
+        return bytes((len(b),)) + b if t is str and len(b) < 256 else None
+    if v is None:   # env: 0 = no sensor, 1 = three readings
+        return b"\0"
+    if t is dict and tuple(v) == _ENV and all(type(x) is float for x in v.values()):
+        return b"\1" + _F64x3.pack(*v.values())
+    return None
+
+def encode(hdr: dict) -> bytes:
+    present, out, extra = 0, [], {}
+    for bit, k, kind, st in _TABLE:
+        if k in hdr:
+            b = _pack(kind, st, hdr[k])
+            if b is None:
+                extra[k] = hdr[k]
+            else:
+                present |= bit
+                out.append(b)
+    if len(hdr) > len(out) + len(extra):
+        extra.update((k, v) for k, v in hdr.items() if k not in _KNOWN)
+    if extra:
+        present |= _TAIL
+        tail = json.dumps(extra, separators=(",", ":")).encode()
+        out.append(struct.pack(">I", len(tail)) + tail)
+    return MAGIC + struct.pack(">BH", VERSION, present) + b"".join(out)
+
+def decode(buf: bytes) -> dict:
+    buf = bytes(buf)
+    if buf[:2] != MAGIC:
+        raise ValueError("not a binary KAC header")
+    try:
+        ver, present = struct.unpack_from(">BH", buf, 2)
+        if ver != VERSION:
+            raise ValueError(f"unsupported binary header version {ver}")
+        hdr, off = {}, 5
+        for bit, k, kind, st in _TABLE:
+            if not present & bit:
+                continue
+            if st is not None:
+                hdr[k], = st.unpack_from(buf, off)
+                off += st.size
+            elif kind == "env":
+                if buf[off]:
+                    hdr[k] = dict(zip(_ENV, _F64x3.unpack_from(buf, off + 1)))
+                    off += 1 + _F64x3.size
+                else:
+                    hdr[k] = None
+                    off += 1
+            else:
+                n = buf[off]
+                b = buf[off + 1:off + 1 + n]
+                if len(b) != n:
+                    raise ValueError("truncated binary header")
+                hdr[k] = b.decode() if kind == "str" else b.hex()
+                off += 1 + n
+        if present & _TAIL:
+            n, = struct.unpack_from(">I", buf, off)
+            tail = buf[off + 4:off + 4 + n]
+            if len(tail) != n:
+                raise ValueError("truncated binary header")
+            off += 4 + n
+            hdr.update(json.loads(tail))
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"truncated binary header: {e}") from e
+    if off != len(buf):
+        raise ValueError("trailing bytes after binary header")
+    return hdr
+
+def to_http(hdr: dict) -> str:
+    return base64.b64encode(encode(hdr)).decode()
+
+def from_http(value: str) -> dict:
+    return decode(base64.b64decode(value, validate=True))
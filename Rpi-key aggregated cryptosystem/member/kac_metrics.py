@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# member/kac_metrics.py
+# Stage timings for the hot paths (encrypt/decrypt stages, RFID, ATECC, OLED, and the cloud
+# server's upload/download), kept as fixed-bucket histograms in memory. Shared with the server
+# like kac_header. A span costs two perf_counter() calls and a locked bucket increment;
+# KAC_METRICS=0 turns every span into a shared no-op.
+#
+#   with kac_metrics.span("decrypt.request"): ...       one observation per block
+#   st = kac_metrics.Stages("seal"); ...; st.lap("aes")  per-chunk loops: time since the last
+#   st.done()                                            lap adds to that stage, one observation each
+#
+# Exposed as Prometheus text (server /metrics), through kacd ("kacctl.py stats") and, for CLI
+# runs, merged into a stats file at exit. add_hook(fn) gets every (name, start, seconds), e.g.
+# for profiling; KAC_TRACE=<file> appends one JSON line per span.
+#   python3 kac_metrics.py [--prom] [--reset]     print (or clear) the member stats file
+import os, sys, json, time, fcntl, atexit, bisect, argparse, threading
+
+ENABLED = os.environ.get("KAC_METRICS", "1") != "0"
+BUCKETS = (1e-5, 2.5e-5, 1e-4, 2.5e-4, 1e-3, 2.5e-3, 0.01, 0.025, 0.1, 0.25, 1, 2.5, 10, 30, 60, 300)
+STATS_FILE = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or os.path.dirname(os.path.abspath(__file__)),
+                          "kac_stats.json")
+
+_lock = threading.Lock()
+_hist = {}   # name -> [bucket counts..., +Inf count, sum]
+_hooks = []
+
+def observe(name: str, seconds: float, start: float = None):
+    with _lock:
+        h = _hist.get(name)
+        if h is None:
+            h = _hist[name] = [0] * (len(BUCKETS) + 1) + [0.0]
+        h[bisect.bisect_left(BUCKETS, seconds)] += 1
+        h[-1] += seconds
+    for fn in _hooks:
+        fn(name, start, seconds)
+
+class _Span:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.t0, self.t0)
+
+class _Null:
+    def __enter__(self): return self
+    def __exit__(self, *exc): pass
+    def lap(self, stage): pass
+    def done(self): pass
+    def iter(self, it, stage): return it
+
+_NULL = _Null()
+
+def span(name: str):
+    return _Span(name) if ENABLED else _NULL
+
+def timed(name: str):
+    """Decorator form of span()."""
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+        def inner(*a, **kw):
+            with _Span(name):
+                return fn(*a, **kw)
+        inner.__name__, inner.__doc__ = fn.__name__, fn.__doc__
+        return inner
+    return wrap
+
+class _Stages:
+    __slots__ = ("prefix", "acc", "t")
+
+    def __init__(self, prefix):
+        self.prefix, self.acc, self.t = prefix, {}, time.perf_counter()
+
+    def lap(self, stage):
+        t = time.perf_counter()
+        self.acc[stage] = self.acc.get(stage, 0.0) + t - self.t
+        self.t = t
+
+    def iter(self, it, stage):
+        """Pass `it` through, charging the wait for each item to `stage`."""
+        for x in it:
+            self.lap(stage)
+            yield x
+
+    def done(self):
+        for stage, s in self.acc.items():
+            observe(f"{self.prefix}.{stage}", s)
+        self.acc = {}
+
+def Stages(prefix: str):
+    return _Stages(prefix) if ENABLED else _NULL
+
+def add_hook(fn):
+    _hooks.append(fn)
+
+def remove_hook(fn):
+    _hooks.remove(fn)
+
+def snapshot() -> dict:
+    with _lock:
+        return {k: list(v) for k, v in _hist.items()}
+
+def reset():
+    with _lock:
+        _hist.clear()
+
+def merge(into: dict, other: dict):
+    for k, v in other.items():
+        into[k] = [a + b for a, b in zip(into[k], v)] if k in into and len(into[k]) == len(v) else list(v)
+    return into
+
+def quantile(h, q):
+    """Upper bound of the bucket holding the q-quantile (Prometheus-style estimate)."""
+    n = sum(h[:-1])
+    if not n:
+        return None
+    seen = 0
+    for i, c in enumerate(h[:-1]):
+        seen += c
+        if seen >= q * n:
+            return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+
+def prometheus(hist=None, metric="kac_stage_seconds") -> str:
+    hist = snapshot() if hist is None else hist
+    out = [f"# HELP {metric} Time spent per stage.", f"# TYPE {metric} histogram"]
+    for name in sorted(hist):
+        h, cum = hist[name], 0
+        for le, c in zip(BUCKETS + ("+Inf",), h[:-1]):
+            cum += c
+            out.append(f'{metric}_bucket{{stage="{name}",le="{le}"}} {cum}')
+        out.append(f'{metric}_sum{{stage="{name}"}} {h[-1]:.6f}')
+        out.append(f'{metric}_count{{stage="{name}"}} {cum}')
+    return "\n".join(out) + "\n"
+
+def table(hist=None) -> str:
+    hist = snapshot() if hist is None else hist
+    out = [f"{'stage':28s} {'count':>7s} {'mean ms':>10s} {'p50 <=':>8s} {'p99 <=':>8s} {'total s':>9s}"]
+    for name in sorted(hist):
+        h = hist[name]
+        n = sum(h[:-1])
+        p50, p99 = quantile(h, .5), quantile(h, .99)
+        out.append(f"{name:28s} {n:7d} {h[-1] / n * 1000:10.3f} {_ms(p50):>8s} {_ms(p99):>8s} {h[-1]:9.3f}")
+    return "\n".join(out) + "\n"
+
+def _ms(s):
+    return "inf" if s == float("inf") else f"{s * 1000:g}ms"
+
+def _locked_update(path, fn):
+    with open(path + ".lock", "a") as lk:
+        fcntl.flock(lk, fcntl.LOCK_EX)
+        try:
+            with open(path) as f:
+                d = json.load(f)
+        except (OSError, ValueError):
+            d = {"since": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": {}}
+        d = fn(d)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(d, f)
+        os.replace(tmp, path)
+    return d
+
+def dump(path=STATS_FILE):
+    """Add this process's histograms to the stats file (and clear them, so a second dump
+    doesn't count them twice)."""
+    with _lock:
+        mine = {k: list(v) for k, v in _hist.items()}
+        _hist.clear()
+    if mine:
+        _locked_update(path, lambda d: dict(d, stages=merge(d.get("stages", {}), mine)))
+
+def dump_at_exit(path=STATS_FILE):
+    """For short-lived member processes (CLI runs, kacd on shutdown)."""
+    if ENABLED:
+        atexit.register(lambda: _safe_dump(path))
+
+def _safe_dump(path):
+    try:
+        dump(path)
+    except OSError as e:
+        print(f"[WARN] stats not saved to {path}: {e}")
+
+def load(path=STATS_FILE) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f).get("stages", {})
+    except (OSError, ValueError):
+        return {}
+
+def _trace_to(path):
+    f = open(path, "a", buffering=1)
+    def hook(name, start, seconds):
+        f.write(json.dumps({"name": name, "start": start, "s": round(seconds, 7),
+                            "thread": threading.get_ident()}) + "\n")
+    add_hook(hook)
+
+if ENABLED and os.environ.get("KAC_TRACE"):
+    _trace_to(os.environ["KAC_TRACE"])
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Member stage timings (merged from every CLI run)")
+    ap.add_argument("--file", default=STATS_FILE)
+    ap.add_argument("--prom", action="store_true", help="Prometheus text format")
+    ap.add_argument("--reset", action="store_true")
+    args = ap.parse_args()
+    if args.reset:
+        _locked_update(args.file, lambda d: {"since": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": {}})
+        print(f"[OK] Cleared {args.file}")
+        sys.exit(0)
+    stages = load(args.file)
+    sys.stdout.write(prometheus(stages) if args.prom else table(stages))
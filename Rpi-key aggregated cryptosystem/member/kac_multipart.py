@@ -0,0 +1,183 @@
+# member/kac_multipart.py
+# Resumable upload of one large ciphertext through the server's /uploads sessions.
+#
+#   outbox/<slot>/ct            sealed ciphertext, written by encrypt.py
+#   outbox/<slot>/state.json    filename, class, header, sizes, upload_id, parts done
+#
+# The ciphertext is sealed straight into its slot and state.json is written before any
+# byte goes out, so after a crash, a lost uplink or a reboot `encrypt.py --resume` picks
+# the upload up again: it asks the server which parts it already verified and only sends
+# the rest. A slot without state.json was interrupted while sealing and is just removed.
+# The process sealing or sending a slot holds an flock on its ct for as long as it has it
+# open, and pending() passes over locked slots, so --resume never touches live work.
+import os, json, time, uuid, fcntl, shutil, hashlib, threading, requests
+from concurrent.futures import ThreadPoolExecutor
+
+OUTBOX = os.path.join(os.path.dirname(os.path.abspath(__file__)), "outbox")
+RETRIES = 6
+BACKOFF = 1.0   # seconds, doubled per attempt, capped at 30
+
+class Kept(Exception):
+    """An upload failed part way; its slot stays in the outbox for `encrypt.py --resume`."""
+
+    def __init__(self, slot, cause):
+        super().__init__(f"{cause} - kept in {slot}, finish it with: python3 encrypt.py --resume")
+        self.slot = slot
+
+class Gone(Exception):
+    """/complete found no session: it was completed already (and only the reply got lost),
+    or it expired. The caller checks HEAD /blob/<ct_sha256> to tell which."""
+
+def _outbox_lock():
+    # held around creating a slot and around scanning the outbox, so pending() never sees
+    # a slot that exists but isn't locked yet
+    os.makedirs(OUTBOX, exist_ok=True)
+    fd = os.open(os.path.join(OUTBOX, ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    return fd
+
+def _try_lock(f) -> bool:
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+def new_slot():
+    """A new slot's ct, open for writing and locked until it is closed."""
+    fd = _outbox_lock()
+    try:
+        slot = os.path.join(OUTBOX, uuid.uuid4().hex)
+        os.mkdir(slot, mode=0o700)
+        ct = open(os.path.join(slot, "ct"), "w+b")
+        fcntl.flock(ct, fcntl.LOCK_EX)
+        return ct
+    finally:
+        os.close(fd)
+
+def slot_of(f):
+    """Slot directory of an open ciphertext file, or None if it is not in the outbox."""
+    name = getattr(f, "name", None)
+    if isinstance(name, str) and os.path.dirname(os.path.dirname(name)) == OUTBOX:
+        return os.path.dirname(name)
+    return None
+
+def save(slot: str, state: dict):
+    tmp = os.path.join(slot, "state.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(slot, "state.json"))
+
+def load(slot: str) -> dict:
+    with open(os.path.join(slot, "state.json")) as f:
+        return json.load(f)
+
+def discard(slot: str):
+    shutil.rmtree(slot, ignore_errors=True)
+
+def pending():
+    """Yield (slot, state) for every unfinished upload no other process is working on,
+    oldest first. Each slot stays locked until the caller asks for the next one."""
+    if not os.path.isdir(OUTBOX):
+        return
+    slots = []
+    fd = _outbox_lock()
+    try:
+        for name in os.listdir(OUTBOX):
+            slot = os.path.join(OUTBOX, name)
+            if not os.path.isdir(slot):
+                continue
+            try:
+                f = open(os.path.join(slot, "ct"), "rb")
+            except FileNotFoundError:
+                discard(slot)
+                continue
+            if not _try_lock(f):   # being sealed or sent right now
+                f.close()
+                continue
+            try:
+                slots.append((os.path.getmtime(os.path.join(slot, "state.json")), slot, f))
+            except OSError:
+                f.close()
+                discard(slot)   # crashed while sealing: nothing was sent, the source is still there
+    finally:
+        os.close(fd)
+    slots.sort(key=lambda x: x[:2])
+    try:
+        while slots:
+            _, slot, f = slots.pop(0)
+            with f:
+                yield slot, load(slot)
+    finally:
+        for *_, f in slots:
+            f.close()
+
+def _retry(call):
+    for attempt in range(RETRIES):
+        try:
+            r = call()
+            if r.status_code < 500 and r.status_code != 408:
+                return r
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == RETRIES - 1:
+                raise
+        time.sleep(min(30, BACKOFF * 2 ** attempt))
+    return r
+
+def send(sess, base, slot, parallel=4, timeout=60, header_bin=None):
+    """Upload outbox/<slot> part by part, then complete it. Raises Kept on failure and leaves
+    the slot in place for the next attempt, or Gone (see there); removes it once the server
+    has the object."""
+    try:
+        return _send(sess, base, slot, parallel, timeout, header_bin)
+    except (requests.RequestException, OSError) as e:
+        raise Kept(slot, e) from e
+
+def _send(sess, base, slot, parallel, timeout, header_bin):
+    st = load(slot)
+    path, ps, size = os.path.join(slot, "ct"), st["part_size"], st["size"]
+    received = set()
+    if st.get("upload_id"):
+        r = _retry(lambda: sess.get(f"{base}/uploads/{st['upload_id']}", timeout=timeout))
+        if r.status_code == 404:   # expired or aborted server-side: start over
+            st["upload_id"] = None
+        else:
+            r.raise_for_status()
+            received = {int(n) for n in r.json()["received"]}
+    if not st.get("upload_id"):
+        r = _retry(lambda: sess.post(f"{base}/uploads", timeout=timeout, json={
+            "filename": st["filename"], "size": size, "part_size": ps}))
+        r.raise_for_status()
+        st["upload_id"] = r.json()["id"]
+    st["done"] = sorted(received)
+    save(slot, st)
+
+    url, lock = f"{base}/uploads/{st['upload_id']}", threading.Lock()
+
+    def put(n):
+        with open(path, "rb") as f:
+            f.seek(n * ps)
+            data = f.read(ps)
+        digest = hashlib.sha256(data).hexdigest()
+        r = _retry(lambda: sess.put(f"{url}/{n}", data=data, timeout=timeout,
+                                    headers={"X-Part-SHA256": digest}))
+        r.raise_for_status()
+        with lock:
+            st["done"].append(n)
+            save(slot, st)
+
+    todo = [n for n in range(max(1, -(-size // ps))) if n not in received]
+    with ThreadPoolExecutor(parallel) as pool:
+        list(pool.map(put, todo))   # re-raises the first failed part
+
+    body = {"header_bin": header_bin} if header_bin else {"header": st["header"]}
+    r = _retry(lambda: sess.post(f"{url}/complete", json=body, timeout=timeout))
+    if r.status_code == 404:
+        st["upload_id"] = None   # a fresh session if it turns out the object isn't there
+        save(slot, st)
+        raise Gone(st["header"].get("ct_sha256"))
+    r.raise_for_status()
+    discard(slot)
+    return len(todo)
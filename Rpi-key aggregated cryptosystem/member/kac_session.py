@@ -0,0 +1,92 @@
+# member/kac_session.py
+# Session token from the server's attestation handshake (cloud/attest.py): fetch a nonce,
+# sign it once on the ATECC, trade the signature for a short-lived bearer token, then send
+# that with every download until it is about to expire. The token is kept in memory (kacd,
+# batch decrypt) and in a 0600 file under $XDG_RUNTIME_DIR (or a 0700 kac-<uid> directory
+# in the temp dir when that is unset, as under sudo, cron or systemd), so back-to-back CLI
+# runs skip the chip too. Servers without /auth just get no token.
+import os, json, stat, time, tempfile, threading
+import atecc_attest
+
+def _token_dir():
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.environ["XDG_RUNTIME_DIR"]
+    d = os.path.join(tempfile.gettempdir(), f"kac-{os.getuid()}")
+    try:
+        os.mkdir(d, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+    st = os.lstat(d)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        return None   # someone else's (or a symlink): keep the token in memory only
+    return d
+
+_dir = _token_dir()
+TOKEN_FILE = os.path.join(_dir, ".kac_session") if _dir else None
+RENEW_BEFORE = 60   # seconds: don't start a download on a token that is about to lapse
+RETRY_AFTER = 300 + RENEW_BEFORE   # after a failed handshake
+
+_lock = threading.Lock()
+_token = None   # {"base", "token", "expires"}
+
+def message(nonce: bytes, serial: str) -> bytes:
+    # same bytes as cloud/attest.py message()
+    return b"kac/attest/v1\0" + nonce + bytes.fromhex(serial)
+
+def _load(base):
+    if not TOKEN_FILE:
+        return None
+    try:
+        with open(TOKEN_FILE) as f:
+            t = json.load(f)
+        return t if t.get("base") == base else None
+    except (OSError, ValueError):
+        return None
+
+def _save(t):
+    if not TOKEN_FILE:
+        return
+    tmp = TOKEN_FILE + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(t, f)
+    os.replace(tmp, TOKEN_FILE)
+
+def attest(sess, base):
+    """Run the handshake (one chip signature). Returns the token dict."""
+    r = sess.post(f"{base}/auth/challenge", timeout=10)
+    r.raise_for_status()
+    nonce = bytes.fromhex(r.json()["nonce"])
+    serial = atecc_attest.device_serial_hex()
+    sig = atecc_attest.sign_challenge(message(nonce, serial))
+    r = sess.post(f"{base}/auth/session", timeout=10,
+                  json={"serial": serial, "nonce": nonce.hex(), "sig": sig.hex()})
+    r.raise_for_status()
+    return dict(r.json(), base=base)
+
+def headers(sess, base) -> dict:
+    """{"Authorization": ...} with a live token, attesting first if needed; {} if that fails."""
+    global _token
+    with _lock:
+        t = _token if _token and _token["base"] == base else _load(base)
+        if not t or t["expires"] - RENEW_BEFORE < time.time():
+            try:
+                t = attest(sess, base)
+                _save(t)
+            except Exception:   # no /auth on this server or no chip: let the server decide, retry later
+                t = {"base": base, "token": None, "expires": time.time() + RETRY_AFTER}
+        _token = t
+        return {"Authorization": f"Bearer {t['token']}"} if t["token"] else {}
+
+def forget():
+    """Drop the token (the server refused it); the next headers() attests again."""
+    global _token
+    with _lock:
+        _token = None
+        try:
+            if TOKEN_FILE:
+                os.unlink(TOKEN_FILE)
+        except FileNotFoundError:
+            pass
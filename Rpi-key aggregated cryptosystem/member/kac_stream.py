@@ -0,0 +1,100 @@
+# member/kac_stream.py
+# Segmented AES-GCM ("STREAM" construction).
+# The plaintext is cut into fixed-size chunks and every chunk is sealed on its own
+# under nonce = prefix(7) || counter(4, big-endian) || last(1). The blob is simply
+# ct_0||tag_0 || ct_1||tag_1 || ... ; the "last" byte authenticates end-of-stream,
+# so a truncated or reordered blob fails a tag check instead of decrypting short.
+import struct, hashlib
+import kac_metrics
+from Cryptodome.Cipher import AES
+
+FORMAT = 2                 # header "v" for segmented objects (legacy single-shot = 1)
+CHUNK = 64 * 1024          # default plaintext bytes per segment
+TAG_LEN = 16
+PREFIX_LEN = 7
+_MAX_SEGMENTS = 1 << 32
+
+def _nonce(prefix: bytes, i: int, last: bool) -> bytes:
+    if i >= _MAX_SEGMENTS:
+        raise ValueError("too many segments for nonce counter")
+    return prefix + struct.pack(">IB", i, 1 if last else 0)
+
+def _read_full(src, n):
+    buf = src.read(n)
+    while buf and len(buf) < n:
+        more = src.read(n - len(buf))
+        if not more:
+            break
+        buf += more
+    return buf
+
+def seal_stream(key: bytes, prefix: bytes, src, dst, chunk: int = CHUNK):
+    """Encrypt file object src into dst in one pass.
+    Returns (pt_size, pt_sha256_hex, ct_sha256_hex); memory stays at ~2 chunks."""
+    pt_h, ct_h = hashlib.sha256(), hashlib.sha256()
+    size, i = 0, 0
+    st = kac_metrics.Stages("encrypt")   # read (incl. compression) / aes / hash / write
+    cur = _read_full(src, chunk)
+    while True:
+        nxt = _read_full(src, chunk) if len(cur) == chunk else b""
+        last = not nxt
+        st.lap("read")
+        c = AES.new(key, AES.MODE_GCM, nonce=_nonce(prefix, i, last))
+        ct, tag = c.encrypt_and_digest(cur)
+        st.lap("aes")
+        pt_h.update(cur); ct_h.update(ct); ct_h.update(tag)
+        st.lap("hash")
+        dst.write(ct); dst.write(tag)
+        st.lap("write")
+        size += len(cur); i += 1
+        if last:
+            st.done()
+            return size, pt_h.hexdigest(), ct_h.hexdigest()
+        cur = nxt
+
+def segment_count(pt_size: int, chunk: int = CHUNK) -> int:
+    # an empty file still has one (empty, final) segment
+    return max(1, -(-pt_size // chunk))
+
+def ct_size(pt_size: int, chunk: int = CHUNK) -> int:
+    return pt_size + segment_count(pt_size, chunk) * TAG_LEN
+
+def segment_span(start: int, end: int, pt_size: int, chunk: int = CHUNK):
+    """Map plaintext bytes [start, end) to the segments that hold them.
+    Returns (first_index, ct_start, ct_end_inclusive, ends_on_final_segment)."""
+    if not 0 <= start < end <= pt_size:
+        raise ValueError(f"range {start}-{end} outside 0-{pt_size}")
+    first, last = start // chunk, (end - 1) // chunk
+    seg_len = chunk + TAG_LEN
+    ct_end = min((last + 1) * seg_len, ct_size(pt_size, chunk)) - 1
+    return first, first * seg_len, ct_end, last == segment_count(pt_size, chunk) - 1
+
+class SegmentOpener:
+    """Incremental decryptor: feed() ciphertext pieces of any size, get plaintext
+    chunks back as soon as each segment authenticates. finish() opens the tail."""
+
+    def __init__(self, key: bytes, prefix: bytes, chunk: int = CHUNK, index: int = 0):
+        self.key, self.prefix, self.chunk, self.index = key, prefix, chunk, index
+        self.seg_len = chunk + TAG_LEN
+        self.buf = bytearray()
+
+    def _open(self, seg, last):
+        if len(seg) < TAG_LEN:
+            raise ValueError("truncated segment")
+        c = AES.new(self.key, AES.MODE_GCM, nonce=_nonce(self.prefix, self.index, last))
+        pt = c.decrypt_and_verify(seg[:-TAG_LEN], seg[-TAG_LEN:])
+        self.index += 1
+        return pt
+
+    def feed(self, data):
+        self.buf += data
+        out = []
+        # a full segment is only known to be non-final once more bytes follow it
+        while len(self.buf) > self.seg_len:
+            out.append(self._open(bytes(self.buf[:self.seg_len]), False))
+            del self.buf[:self.seg_len]
+        return out
+
+    def finish(self, last: bool = True):
+        seg, self.buf = bytes(self.buf), bytearray()
+        return self._open(seg, last)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# kacctl.py - thin client for kacd. Deliberately imports only the stdlib so a call
+# costs an interpreter start plus one Unix-socket round trip; the daemon already
+# holds the GPIO/OLED/RFID/ATECC handles, the HTTP pool and the aggregate key.
+#
+#   python3 kacctl.py encrypt <file> <class>
+#   python3 kacctl.py decrypt <file or file.sha256> [--range START-END]
+#   python3 kacctl.py ping
+#   python3 kacctl.py stats [--prom]     stage timings since kacd started
+import os, sys, json, socket, argparse
+
+CONF = json.load(open(os.path.join(os.path.dirname(__file__), "config.json")))
+SOCKET = CONF.get("kacd_socket") or os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"), "kacd.sock")
+
+def call(req: dict, path: str = SOCKET) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall(json.dumps(req).encode() + b"\n")
+        line = s.makefile("rb").readline()
+    if not line:
+        raise ConnectionError("kacd closed the connection")
+    return json.loads(line)
+
+def _range(s: str):
+    a, _, b = s.partition("-")
+    return [int(a), int(b) + 1]
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Client for the kacd member daemon")
+    ap.add_argument("--socket", default=SOCKET)
+    sub = ap.add_subparsers(dest="op", required=True)
+    p_e = sub.add_parser("encrypt")
+    p_e.add_argument("path")
+    p_e.add_argument("cls", metavar="class")
+    p_d = sub.add_parser("decrypt")
+    p_d.add_argument("file")
+    p_d.add_argument("--range", metavar="START-END", type=_range)
+    sub.add_parser("ping")
+    sub.add_parser("stats").add_argument("--prom", action="store_true", help="Prometheus text format")
+    args = ap.parse_args()
+
+    req = {"op": args.op, "cwd": os.getcwd()}
+    if args.op == "encrypt":
+        req.update(path=os.path.abspath(args.path), **{"class": args.cls})
+    elif args.op == "decrypt":
+        req.update(file=args.file, range=args.range)
+    elif args.op == "stats":
+        req.update(prom=args.prom)
+    try:
+        resp = call(req, args.socket)
+    except (OSError, ConnectionError) as e:
+        print(f"kacd not reachable at {args.socket}: {e}")
+        sys.exit(2)
+    sys.stdout.write(resp.get("output", ""))
+    if args.op == "ping":
+        print(json.dumps(resp))
+    sys.exit(0 if resp.get("ok") else 1)
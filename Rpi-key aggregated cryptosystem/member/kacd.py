@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# kacd.py - long-running member daemon.
+# Pays the cold-start cost once: GPIO + SSD1306 + MFRC522 (hardware_io), the BME280
+# probe, the ATECC bus, a pooled requests.Session and the aggregate key. Then serves
+# encrypt/decrypt requests from kacctl.py as line-delimited JSON on a Unix socket.
+# Operations run one at a time (there is one OLED, one reader and one cwd).
+#
+#   python3 kacd.py [--socket PATH]          # KAC_FAKE_HW=1 for a plain Linux box
+import os, io, sys, json, time, socketserver, threading, argparse, contextlib
+import requests
+from requests.adapters import HTTPAdapter
+import hardware_io, sensors, atecc_attest, kac_metrics   # importing hardware_io sets up GPIO/OLED/RFID
+from kac_client import get_client
+from encrypt import encrypt_file
+from decrypt import decrypt_file, decrypt_prefetched, PREFETCH
+from kacctl import SOCKET
+
+def _warm():
+    sensors.sampler()
+    try:
+        atecc_attest._get_chip()
+    except Exception as e:
+        print(f"[WARN] ATECC not available: {e}")
+    get_client()
+    sess = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+    sess.mount("http://", adapter)
+    sess.mount("https://", adapter)
+    return sess
+
+class _ThreadStdout(io.TextIOBase):
+    """The daemon's sys.stdout: what a thread prints while serving a request goes into that
+    request's reply, everything else (UI worker, sensor sampler, other clients) to the real
+    stdout. contextlib.redirect_stdout would swap it for every thread at once."""
+
+    def __init__(self, real):
+        self.real, self._local = real, threading.local()
+
+    def _target(self):
+        buf = getattr(self._local, "buf", None)
+        return self.real if buf is None else buf
+
+    def write(self, s):
+        return self._target().write(s)
+
+    def flush(self):
+        self._target().flush()
+
+    @contextlib.contextmanager
+    def capture(self):
+        self._local.buf = buf = io.StringIO()
+        try:
+            yield buf
+        finally:
+            self._local.buf = None
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                resp = self.server.dispatch(json.loads(line))
+            except ValueError as e:
+                resp = {"ok": False, "output": f"bad request: {e}\n"}
+            self.wfile.write(json.dumps(resp).encode() + b"\n")
+
+class KacDaemon(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, sess):
+        if os.path.exists(path):
+            os.unlink(path)   # stale socket from a previous run
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)   # the daemon holds the key: owner only
+        self.sess = sess
+        self.started = time.time()
+        self.op_lock = threading.Lock()
+        if not isinstance(sys.stdout, _ThreadStdout):
+            sys.stdout = _ThreadStdout(sys.stdout)
+
+    def dispatch(self, req):
+        op = req.get("op")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "uptime_s": round(time.time() - self.started, 1)}
+        if op == "stats":
+            stats = kac_metrics.snapshot()
+            return {"ok": True, "output": kac_metrics.prometheus(stats) if req.get("prom") else kac_metrics.table(stats)}
+        if op not in ("encrypt", "decrypt"):
+            return {"ok": False, "output": f"unknown op {op!r}\n"}
+        with self.op_lock, sys.stdout.capture() as buf:
+            home = os.getcwd()
+            try:
+                os.chdir(req.get("cwd") or home)
+                if op == "encrypt":
+                    encrypt_file(req["path"], req["class"], self.sess)
+                    ok = True
+                else:
+                    rng = tuple(req["range"]) if req.get("range") else None
+                    if PREFETCH and not rng:
+                        ok = decrypt_prefetched(req["file"], self.sess, view=False) is not None
+                    else:
+                        ok = decrypt_file(req["file"], rng, self.sess, view=False) is not None
+            except Exception as e:
+                ok = False
+                print(f"[ERR] {op}: {e}")
+            finally:
+                os.chdir(home)
+        return {"ok": ok, "output": buf.getvalue()}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="KAC member daemon")
+    ap.add_argument("--socket", default=SOCKET)
+    args = ap.parse_args()
+    kac_metrics.dump_at_exit()
+    t0 = time.perf_counter()
+    srv = KacDaemon(args.socket, _warm())
+    print(f"✅ kacd ready on {args.socket} (device warm-up {time.perf_counter() - t0:.2f}s)")
+    sys.stdout.flush()
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.unlink(args.socket)
@@ -1,9 +1,27 @@
 # sensors.py
-import board, busio
-try:
-    import adafruit_bme280
-except Exception:
+# BME280 sampled on a background thread into a fixed-size ring buffer, so callers (the
+# header's env block, the tap screen) get the latest reading without touching the I2C bus.
+# A slow or missing sensor then only slows the sampler, never an encrypt or a tap.
+import os, json, time, threading
+from array import array
+import fake_hw
+if fake_hw.ENABLED:
     adafruit_bme280 = None
+else:
+    import board, busio
+    try:
+        import adafruit_bme280
+    except Exception:
+        adafruit_bme280 = None
+
+try:
+    CONF = json.load(open(os.path.join(os.path.dirname(__file__), "config.json")))
+except (OSError, ValueError):
+    CONF = {}
+RATE_HZ = float(CONF.get("sensor_hz", 1))
+WINDOW_S = float(CONF.get("env_window_s", 60))   # header env_window summary; 0 = latest only
+FIRST_WAIT = 0.5   # seconds a first read_bme280() waits for the sampler's first poll
+MAX_BACKOFF = 30
 
 _bme = None
 
@@ -11,6 +29,9 @@ def _get_bme():
     global _bme
     if _bme is not None:
         return _bme
+    if fake_hw.ENABLED:
+        _bme = fake_hw.FakeBME280()
+        return _bme
     if adafruit_bme280 is None:
         return None
     i2c = busio.I2C(board.SCL, board.SDA)
@@ -23,8 +44,8 @@ def _get_bme():
             _bme = None
     return _bme
 
-def read_bme280():
-    bme = _get_bme()
+def poll(bme):
+    """One synchronous (t, h, p) from a BME280-like object, or None."""
     if not bme:
         return None
     try:
@@ -35,8 +56,107 @@ def read_bme280():
     except Exception:
         return None
 
+class Sampler:
+    """Polls read() -> (t, h, p) or None every 1/rate_hz s on a daemon thread. Samples
+    live in one array of doubles, (time, t, h, p) per slot, overwritten oldest first."""
+
+    def __init__(self, read, rate_hz=RATE_HZ, size=None):
+        self.read, self.period = read, 1.0 / rate_hz
+        self.size = size or max(2, int(max(WINDOW_S, 1) * rate_hz))
+        self._buf = array("d", bytes(8 * 4 * self.size))
+        self._n = 0   # samples ever written; the newest is in slot (_n - 1) % size
+        self._lock = threading.Lock()
+        self._tried = threading.Event()   # first poll finished, good or not
+        self._stop = threading.Event()
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="bme280", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        fails = 0
+        while not self._stop.is_set():
+            t0 = time.monotonic()
+            v = self.read()
+            if v is None:
+                self.errors += 1
+                fails += 1
+            else:
+                fails = 0
+                i = 4 * (self._n % self.size)
+                with self._lock:
+                    self._buf[i:i + 4] = array("d", (t0, *v))
+                    self._n += 1
+            self._tried.set()
+            wait = min(self.period * (1 << min(fails, 16)), MAX_BACKOFF) if fails else self.period
+            self._stop.wait(max(0.0, wait - (time.monotonic() - t0)))
+
+    def latest(self, max_age=None):
+        """Newest (t, h, p), or None if there is none younger than max_age seconds
+        (default three periods plus a second)."""
+        with self._lock:
+            if not self._n:
+                return None
+            i = 4 * ((self._n - 1) % self.size)
+            ts, t, h, p = self._buf[i:i + 4]
+        if time.monotonic() - ts > (3 * self.period + 1 if max_age is None else max_age):
+            return None
+        return t, h, p
+
+    def summary(self, window=WINDOW_S):
+        """{"s", "n", "temp_c": [min, mean, max], "humidity_pct": [...], "pressure_hpa": [...]}
+        over the samples from the last `window` seconds, or None."""
+        since = time.monotonic() - window
+        with self._lock:
+            n = min(self._n, self.size)
+            rows = [self._buf[j:j + 4] for j in (4 * ((self._n - 1 - k) % self.size) for k in range(n))]
+        rows = [r for r in rows if r[0] >= since]
+        if not rows:
+            return None
+        out = {"s": window, "n": len(rows)}
+        for col, (key, nd) in enumerate((("temp_c", 2), ("humidity_pct", 1), ("pressure_hpa", 1)), 1):
+            xs = [r[col] for r in rows]
+            out[key] = [round(min(xs), nd), round(sum(xs) / len(xs), nd), round(max(xs), nd)]
+        return out
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+def sampler():
+    """The process-wide sampler on the BME280, started on first use."""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = Sampler(lambda: poll(_get_bme())).start()
+        return _sampler
+
+def use(sensor, rate_hz=RATE_HZ, size=None):
+    """Sample `sensor` (anything with temperature/relative_humidity/pressure, e.g.
+    fake_hw.FakeBME280) instead of the BME280, or a callable returning (t, h, p) or None."""
+    global _sampler
+    read = sensor if callable(sensor) else (lambda: poll(sensor))
+    with _sampler_lock:
+        if _sampler is not None:
+            _sampler.stop()
+        _sampler = Sampler(read, rate_hz, size).start()
+        return _sampler
+
+def read_bme280(wait=FIRST_WAIT):
+    s = sampler()
+    s._tried.wait(wait)
+    return s.latest()
+
+def env_summary(window=WINDOW_S):
+    return sampler().summary(window) if window > 0 else None
+
 def lines_for_oled():
-    v = read_bme280()
+    v = read_bme280(wait=0)   # never hold up the tap screen
     if not v:
         return []
     t, h, p = v
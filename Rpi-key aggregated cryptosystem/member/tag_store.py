@@ -0,0 +1,94 @@
+# member/tag_store.py
+# RFID allow-list (authorized_tags.json, {"uid": "name"}) held as an in-memory dict.
+# A tap costs one stat(): the file is parsed again only when its (mtime, size, inode)
+# changes. Writers replace it atomically (temp file + fsync + rename) under an flock, so a
+# tap never sees a half-written file, and concurrent enroll runs don't lose each other's
+# changes. If the file is ever unreadable the last good snapshot stays in use.
+import os, csv, json, fcntl, threading, contextlib
+
+AUTH_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "authorized_tags.json")
+
+def _parse(d: dict) -> dict:
+    return {int(k): str(v) for k, v in d.items()}
+
+class TagStore:
+    def __init__(self, path=AUTH_FILE):
+        self.path = path
+        self._sig = None
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def refresh(self) -> dict:
+        """Current tags; reparses only if the file changed since the last call."""
+        sig = self._signature()
+        if sig != self._sig:
+            with self._lock:
+                if sig != self._sig:
+                    try:
+                        if sig is None:
+                            self._tags = {}
+                        else:
+                            with open(self.path, "r", encoding="utf-8") as f:
+                                self._tags = _parse(json.load(f))
+                        self._sig = sig
+                    except (OSError, ValueError, AttributeError) as e:
+                        print(f"[WARN] {self.path}: {e}; keeping {len(self._tags)} known tags")
+        return self._tags
+
+    def lookup(self, uid: int):
+        return self.refresh().get(uid)
+
+    def __len__(self):
+        return len(self.refresh())
+
+    @contextlib.contextmanager
+    def edit(self):
+        """Read-modify-write: yields a copy of the tags, saved atomically on exit."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + ".lock", "a") as lk:
+            fcntl.flock(lk, fcntl.LOCK_EX)
+            self._sig = None   # re-read under the lock, another writer may have just finished
+            before = self.refresh()
+            tags = dict(before)
+            yield tags
+            if tags != before:
+                self._write(tags)
+
+    def _write(self, tags: dict):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({str(k): v for k, v in sorted(tags.items())}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def export(self, fp, fmt="csv"):
+        tags = self.refresh()
+        if fmt == "json":
+            json.dump({str(k): v for k, v in sorted(tags.items())}, fp, indent=2)
+            return len(tags)
+        w = csv.writer(fp)
+        w.writerow(["uid", "name"])
+        w.writerows(sorted(tags.items()))
+        return len(tags)
+
+def read_bulk(fp, fmt="csv") -> dict:
+    """uid -> name from a CSV (uid,name; header optional) or JSON export."""
+    if fmt == "json":
+        return _parse(json.load(fp))
+    out = {}
+    for row in csv.reader(fp):
+        if not row or row[0].strip().lower() == "uid" or row[0].lstrip().startswith("#"):
+            continue
+        out[int(row[0])] = row[1].strip() if len(row) > 1 else "User"
+    return out
+
+def fmt_of(path: str) -> str:
+    return "json" if path.lower().endswith(".json") else "csv"
@@ -0,0 +1,3 @@
+# member/tests/conftest.py - the member modules import each other flat, as when run from member/
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
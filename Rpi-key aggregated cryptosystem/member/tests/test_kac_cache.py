@@ -0,0 +1,63 @@
+# member/tests/test_kac_cache.py
+import os, hashlib
+import pytest
+import kac_cache
+from kac_cache import Cache
+
+def _sha(b):
+    return hashlib.sha256(b).hexdigest()
+
+def _fill(cache, data, expect=None, piece=1000):
+    d = _sha(data)
+    out = b"".join(cache.fill(d, expect or d, (data[i:i + piece] for i in range(0, len(data), piece))))
+    assert out == data   # the caller always gets the bytes, stored or not
+    return d
+
+@pytest.fixture
+def cache(tmp_path):
+    return Cache(str(tmp_path / "cache"), max_bytes=10_000)
+
+def test_fill_then_read(cache):
+    data = os.urandom(5000)
+    d = _fill(cache, data)
+    cache.remember("a.bin", d)
+    assert cache.etag("a.bin") == d and cache.get(d)
+    assert b"".join(cache.read(d, d, blk=333)) == data
+    assert b"".join(cache.read(d, d, 100, 2100)) == data[100:2100]
+    assert cache.usage() == (1, 5000)
+
+def test_corrupt_entry_is_rejected_and_evicted(cache):
+    data = os.urandom(5000)
+    d = _fill(cache, data)
+    with open(cache.get(d), "r+b") as f:
+        f.write(b"\0")
+    with pytest.raises(kac_cache.Corrupt):
+        b"".join(cache.read(d, d))
+    assert cache.get(d) is None
+
+def test_unverified_or_oversized_stream_is_not_kept(cache):
+    d = _fill(cache, os.urandom(100), expect="00" * 32)
+    assert cache.get(d) is None
+    d = _fill(cache, os.urandom(cache.max_bytes + 1))
+    assert cache.get(d) is None
+    assert cache.usage() == (0, 0)
+    assert not os.listdir(os.path.join(cache.root, "blobs"))   # no .fill_ leftovers
+
+def test_least_recently_used_goes_first(cache):
+    a = _fill(cache, os.urandom(4000))
+    b = _fill(cache, os.urandom(4000))
+    os.utime(cache.get(b), (1, 1))   # b is now the oldest
+    cache.get(a)
+    c = _fill(cache, os.urandom(4000))
+    assert cache.get(a) and cache.get(c) and cache.get(b) is None
+
+def test_etag_forgets_evicted_blobs(cache):
+    d = _fill(cache, b"x" * 10)
+    cache.remember("a.bin", d)
+    cache.evict(d)
+    assert cache.etag("a.bin") is None and cache.etag("never.bin") is None
+
+def test_plaintext_cache_needs_tmpfs(tmp_path, monkeypatch):
+    monkeypatch.setattr(kac_cache, "on_tmpfs", lambda p: False)
+    with pytest.raises(ValueError, match="tmpfs"):
+        Cache(str(tmp_path / "pt"), 1000, plaintext=True)
@@ -0,0 +1,57 @@
+# member/tests/test_kac_codec.py
+import io, os, hashlib
+import pytest
+from kac_codec import CompressReader, CODECS, choose, decompress
+from kac_stream import CHUNK
+
+def _compress(data, codec, head=b""):
+    r = CompressReader(io.BytesIO(data[len(head):]), codec, head=head)
+    out = b"".join(iter(lambda: r.read(1000), b""))
+    return r, out
+
+@pytest.mark.parametrize("codec", sorted(CODECS))
+@pytest.mark.parametrize("size", [0, 1, CHUNK - 1, CHUNK, CHUNK + 1])
+def test_round_trip(codec, size):
+    data = os.urandom(size // 2) + bytes(size - size // 2)
+    r, z = _compress(data, codec, head=data[:100])
+    assert r.size == size and r.sha256.hexdigest() == hashlib.sha256(data).hexdigest()
+    pieces = [z[i:i + 777] for i in range(0, len(z), 777)]
+    assert b"".join(decompress(pieces, codec)) == data
+
+def test_no_codec_passes_through():
+    r, out = _compress(b"abc" * 1000, None, head=b"abc")
+    assert out == b"abc" * 1000 and r.size == 3000
+
+@pytest.mark.parametrize("codec", sorted(CODECS))
+def test_output_pieces_are_bounded(codec):
+    _, z = _compress(bytes(20 * CHUNK), codec)   # compresses to almost nothing
+    pieces = list(decompress([z], codec))
+    assert sum(map(len, pieces)) == 20 * CHUNK
+    assert max(map(len, pieces)) <= CHUNK
+
+@pytest.mark.parametrize("codec", sorted(CODECS))
+def test_truncated_stream_is_rejected(codec):
+    _, z = _compress(os.urandom(3 * CHUNK), codec)
+    with pytest.raises(ValueError, match="truncated"):
+        list(decompress([z[:-10]], codec))
+
+@pytest.mark.parametrize("codec", sorted(CODECS))
+def test_trailing_data_is_rejected(codec):
+    _, z = _compress(b"hello" * 100, codec)
+    with pytest.raises(ValueError, match="after end"):
+        list(decompress([z + b"junk"], codec))
+    with pytest.raises(ValueError, match="after end"):
+        list(decompress([z, b"junk"], codec))
+
+def test_choose_skips_incompressible_data():
+    assert choose(b"", 1e6) is None
+    assert choose(os.urandom(4 * CHUNK), 1e6) is None
+
+def test_choose_compresses_on_a_slow_link():
+    assert choose(bytes(4 * CHUNK), 1e3) in CODECS
+
+def test_registered_codec_is_usable(monkeypatch):
+    import zlib
+    monkeypatch.setitem(CODECS, "zlib9", (lambda: zlib.compressobj(9), zlib.decompressobj))
+    _, z = _compress(b"x" * 5000, "zlib9")
+    assert b"".join(decompress([z], "zlib9")) == b"x" * 5000
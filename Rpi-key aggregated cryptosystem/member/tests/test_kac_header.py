@@ -0,0 +1,49 @@
+# member/tests/test_kac_header.py
+import os, json
+import pytest
+import kac_header
+
+FULL = {
+    "v": 2, "class": "iot", "nonce": os.urandom(12).hex(), "tag": os.urandom(16).hex(),
+    "chunk": 65536, "size": 5 << 30, "wrap": os.urandom(60).hex(),
+    "pt_sha256": os.urandom(32).hex(), "ct_sha256": os.urandom(32).hex(),
+    "env": {"temp_c": 21.5, "humidity_pct": 40.0, "pressure_hpa": 1013.25},
+    "codec": "zstd", "pt_size": 123,
+}
+
+@pytest.mark.parametrize("hdr", [
+    FULL,
+    {},
+    {"v": 1, "env": None},
+    {**FULL, "nonce": FULL["nonce"].upper()},          # would not survive bytes.fromhex
+    {**FULL, "env": {"temp_c": 20}},                   # odd env goes to the tail
+    {**FULL, "size": -1, "chunk": True},               # ints that do not fit / are not ints
+    {**FULL, "added_later": [1, "x"]},                 # unknown key
+])
+def test_round_trip(hdr):
+    assert kac_header.decode(kac_header.encode(hdr)) == hdr
+    assert kac_header.from_http(kac_header.to_http(hdr)) == hdr
+
+def test_known_fields_beat_json():
+    assert len(kac_header.encode(FULL)) < len(json.dumps(FULL)) // 2
+
+def test_truncated_header_is_rejected():
+    buf = kac_header.encode({**FULL, "added_later": 1})
+    for n in range(len(buf)):
+        with pytest.raises(ValueError):
+            kac_header.decode(buf[:n])
+
+def test_trailing_bytes_are_rejected():
+    with pytest.raises(ValueError, match="trailing"):
+        kac_header.decode(kac_header.encode(FULL) + b"\0")
+
+def test_wrong_magic_or_version_is_rejected():
+    buf = kac_header.encode(FULL)
+    with pytest.raises(ValueError):
+        kac_header.decode(b"XX" + buf[2:])
+    with pytest.raises(ValueError, match="version"):
+        kac_header.decode(buf[:2] + b"\x09" + buf[3:])
+
+def test_http_value_must_be_base64():
+    with pytest.raises(ValueError):
+        kac_header.from_http("not base64!")
@@ -0,0 +1,84 @@
+# member/tests/test_kac_stream.py
+import io, os, hashlib
+import pytest
+from kac_stream import CHUNK, TAG_LEN, SegmentOpener, seal_stream, ct_size, segment_span
+
+KEY, PREFIX = bytes(range(32)), bytes(7)
+
+def _seal(pt, chunk=CHUNK):
+    dst = io.BytesIO()
+    size, pt_hash, ct_hash = seal_stream(KEY, PREFIX, io.BytesIO(pt), dst, chunk)
+    ct = dst.getvalue()
+    assert size == len(pt) and pt_hash == hashlib.sha256(pt).hexdigest()
+    assert ct_hash == hashlib.sha256(ct).hexdigest() and len(ct) == ct_size(len(pt), chunk)
+    return ct
+
+def _open(ct, piece=4096, chunk=CHUNK):
+    op = SegmentOpener(KEY, PREFIX, chunk)
+    out = []
+    for i in range(0, len(ct), piece):
+        out += op.feed(ct[i:i + piece])
+    out.append(op.finish())
+    return b"".join(out)
+
+@pytest.mark.parametrize("n", [0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 3 * CHUNK])
+def test_round_trip_at_segment_boundaries(n):
+    pt = os.urandom(n)
+    assert _open(_seal(pt)) == pt
+
+def test_pieces_of_any_size():
+    pt = os.urandom(2 * CHUNK + 5)
+    ct = _seal(pt)
+    for piece in (1, TAG_LEN, CHUNK + TAG_LEN, len(ct)):
+        assert _open(ct, piece) == pt
+
+@pytest.mark.parametrize("pos", [0, CHUNK + TAG_LEN - 1, CHUNK + TAG_LEN + 3])
+def test_tampered_segment_is_rejected(pos):
+    ct = bytearray(_seal(os.urandom(CHUNK + 10)))
+    ct[pos] ^= 1
+    with pytest.raises(ValueError):
+        _open(bytes(ct))
+
+def test_truncation_at_a_segment_boundary_is_rejected():
+    # the remaining segments all authenticate, but the new tail was not sealed as the last one
+    ct = _seal(os.urandom(3 * CHUNK))
+    with pytest.raises(ValueError):
+        _open(ct[:2 * (CHUNK + TAG_LEN)])
+
+def test_truncated_tail_is_rejected():
+    ct = _seal(os.urandom(CHUNK + 100))
+    with pytest.raises(ValueError):
+        _open(ct[:-1])
+    with pytest.raises(ValueError):
+        _open(ct[:CHUNK + TAG_LEN + 5])   # tail shorter than a tag
+
+def test_reordered_segments_are_rejected():
+    seg = CHUNK + TAG_LEN
+    ct = _seal(os.urandom(3 * CHUNK))
+    with pytest.raises(ValueError):
+        _open(ct[seg:2 * seg] + ct[:seg] + ct[2 * seg:])
+
+def test_empty_stream_is_one_final_segment():
+    ct = _seal(b"")
+    assert len(ct) == TAG_LEN and _open(ct) == b""
+    op = SegmentOpener(KEY, PREFIX)
+    op.feed(ct)
+    with pytest.raises(ValueError):
+        op.finish(last=False)   # was sealed as the final segment
+    with pytest.raises(ValueError):
+        _open(b"")
+
+def test_range_opens_from_the_middle():
+    pt = os.urandom(3 * CHUNK + 7)
+    ct = _seal(pt)
+    start, end = CHUNK + 3, 2 * CHUNK + 9
+    first, ct_start, ct_end, last = segment_span(start, end, len(pt))
+    op = SegmentOpener(KEY, PREFIX, CHUNK, index=first)
+    out = b"".join(op.feed(ct[ct_start:ct_end + 1])) + op.finish(last)
+    lead = start - first * CHUNK
+    assert out[lead:lead + end - start] == pt[start:end]
+
+def test_segment_span_rejects_bad_ranges():
+    for start, end in ((0, 0), (5, 4), (-1, 3), (0, 11)):
+        with pytest.raises(ValueError):
+            segment_span(start, end, 10)
@@ -1,6 +1,12 @@
 # text_oled_viewer.py
-import curses, textwrap, os, time
-from hardware_io import Image, ImageDraw, ImageFont, oled
+# Pager for decrypted text. The document is mmap'd and only wrapped as far as the pager
+# has scrolled: LazyText keeps an index of display line -> source line (a few bytes per line)
+# and re-wraps source lines from the buffer on demand, so the first page of a multi-MB log
+# shows as fast as that of a short note. Rendered page bitmaps are kept in a small LRU, so
+# paging back and forth redraws nothing.
+import curses, textwrap, os, mmap, shutil, functools, collections
+from array import array
+from hardware_io import Image, ImageDraw, ImageFont, oled, ui
 
 # monospace fits best on 128x64
 try:
@@ -10,23 +16,109 @@ except Exception:
 
 _COLS = 21
 _LINES_PER_PAGE = 5  # 5 * 12px ≈ 60px usable
+_MAX_RAW = 1 << 14   # a source line longer than this is wrapped in pieces
+_PAGE_CACHE = 32     # rendered page bitmaps kept
 
-def _render_page(lines, start, title=None):
-    img = Image.new("1", (oled.width, oled.height))
-    d = ImageDraw.Draw(img)
-    y = 0
-    if title:
-        d.text((0, y), title[:_COLS], font=_font, fill=255)
-        y += 12
-    page = lines[start:start+_LINES_PER_PAGE]
-    for ln in page:
-        d.text((0, y), ln, font=_font, fill=255)
-        y += 12
-    total = len(lines)
-    footer = f"{start+1}-{min(start+_LINES_PER_PAGE,total)}/{total}"
-    d.rectangle((0, oled.height-12, oled.width, oled.height), fill=0)
-    d.text((0, oled.height-12), footer, font=_font, fill=255)
-    oled.display(img)
+def _wrap_para(para):
+    wrapped = textwrap.wrap(
+        para, width=_COLS,
+        replace_whitespace=False, drop_whitespace=False,
+        break_long_words=True, break_on_hyphens=False
+    )
+    return wrapped if wrapped else [""]
+
+class LazyText:
+    """Display lines of a UTF-8 buffer (bytes or mmap), wrapped to _COLS on demand."""
+
+    def __init__(self, buf):
+        self._buf = buf
+        self._starts, self._ends = array("Q"), array("Q")   # source line byte spans
+        self._pos = 0                                       # where the next source line starts
+        self._lines, self._subs = array("I"), array("H")    # display line -> (source line, piece)
+        self.complete = False
+        self._wrapped = functools.lru_cache(256)(self._wrap)
+
+    def _wrap(self, r):
+        b = self._buf[self._starts[r]:self._ends[r]]
+        return _wrap_para(b.decode("utf-8", "replace").rstrip("\r"))
+
+    def _more(self) -> bool:
+        """Index one more source line. False at the end of the buffer."""
+        buf, start, n = self._buf, self._pos, len(self._buf)
+        if self.complete or (start >= n and self._starts):
+            self.complete = True
+            return False
+        end = buf.find(b"\n", start, start + _MAX_RAW)
+        if end < 0:
+            end = min(n, start + _MAX_RAW)
+            while start < end < n and buf[end] & 0xC0 == 0x80:   # don't split a UTF-8 sequence
+                end -= 1
+            self._pos = end + (buf[end:end + 1] == b"\n")
+        else:
+            self._pos = end + 1
+        r = len(self._starts)
+        self._starts.append(start)
+        self._ends.append(end)
+        k = len(self._wrapped(r))
+        self._lines.extend([r] * k)
+        self._subs.extend(range(k))
+        return True
+
+    def ensure(self, n):
+        """Index until there are at least n display lines (or the text ends)."""
+        while len(self._lines) < n and self._more():
+            pass
+        return len(self._lines)
+
+    def __len__(self):
+        return len(self._lines)
+
+    def line(self, i) -> str:
+        self.ensure(i + 1)
+        return self._wrapped(self._lines[i])[self._subs[i]] if i < len(self._lines) else ""
+
+    def slice(self, start, stop):
+        return [self.line(i) for i in range(start, min(stop, self.ensure(stop)))]
+
+class _Pages:
+    """LRU of one document's rendered page bitmaps; one per _pager() call, so a page
+    is never served from another file's cache."""
+
+    def __init__(self, doc, size=_PAGE_CACHE):
+        self.doc, self._size, self._imgs = doc, size, collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, start, title):
+        doc = self.doc
+        doc.ensure(start + _LINES_PER_PAGE + 1)   # one past the page: is there more?
+        total = len(doc)
+        # total only once known, so a page keeps its key (and cache entry) while indexing grows
+        footer = f"{start+1}-{min(start+_LINES_PER_PAGE,total)}/{total if doc.complete else '...'}"
+        key = (start, title, footer)
+        img = self._imgs.get(key)
+        if img is not None:
+            self._imgs.move_to_end(key)
+            self.hits += 1
+            return img
+        self.misses += 1
+        img = Image.new("1", (oled.width, oled.height))
+        d = ImageDraw.Draw(img)
+        y = 0
+        if title:
+            d.text((0, y), title[:_COLS], font=_font, fill=255)
+            y += 12
+        for ln in doc.slice(start, start + _LINES_PER_PAGE):
+            d.text((0, y), ln, font=_font, fill=255)
+            y += 12
+        d.rectangle((0, oled.height-12, oled.width, oled.height), fill=0)
+        d.text((0, oled.height-12), footer, font=_font, fill=255)
+        self._imgs[key] = img
+        if len(self._imgs) > self._size:
+            self._imgs.popitem(last=False)
+        return img
+
+def _render_page(pages, start, title=None):
+    ui.frame(pages.get(start, title))
 
 def _flash(msg, title=None):
     img = Image.new("1", (oled.width, oled.height))
@@ -36,24 +128,42 @@ def _flash(msg, title=None):
         d.text((0, y), title[:_COLS], font=_font, fill=255)
         y += 12
     d.text((0, y), msg[:_COLS], font=_font, fill=255)
-    oled.display(img)
-    time.sleep(1)
+    ui.status(img, hold=1.0)   # the page redraw queued after this waits out the hold
 
 def _wrap_text(s):
+    # eager wrap of a whole string (the old pager did this before showing page 1)
     out = []
     for para in s.splitlines() or [""]:
-        wrapped = textwrap.wrap(
-            para, width=_COLS,
-            replace_whitespace=False, drop_whitespace=False,
-            break_long_words=True, break_on_hyphens=False
-        )
-        out.extend(wrapped if wrapped else [""])
+        out.extend(_wrap_para(para))
     return out or [""]
 
+def looks_like_text(path, sample=1 << 16) -> bool:
+    """UTF-8 judged from the first `sample` bytes (a sequence cut at the end is fine)."""
+    with open(path, "rb") as f:
+        b = f.read(sample)
+    try:
+        b.decode("utf-8")
+    except UnicodeDecodeError as e:
+        return len(b) == sample and e.start >= len(b) - 3 and e.reason == "unexpected end of data"
+    return True
+
+def view_file_on_oled(path: str, title: str = "Decrypted", export_path: str | None = None):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return view_text_on_oled("", title, export_path)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            _pager(LazyText(buf), title, export_path, lambda dst: shutil.copyfile(path, dst))
+
 def view_text_on_oled(text: str, title: str = "Decrypted", export_path: str | None = None):
-    lines = _wrap_text(text)
+    def save(dst):
+        with open(dst, "w", encoding="utf-8") as f:
+            f.write(text)
+    _pager(LazyText(text.encode("utf-8")), title, export_path, save)
+
+def _pager(doc, title, export_path, save):
+    pages = _Pages(doc)
     start = 0
-    max_start = max(0, len(lines) - _LINES_PER_PAGE)
+    max_start = 0
 
     if not export_path:
         safe_title = "".join(c for c in (title or "text") if c.isalnum() or c in ("-", "_", "."))
@@ -73,10 +183,13 @@ def view_text_on_oled(text: str, title: str = "Decrypted", export_path: str | No
 
         def clamp():
             nonlocal start, max_start
+            # only index as far as the requested page (End indexes everything)
+            total = doc.ensure(start + _LINES_PER_PAGE)
+            max_start = max(0, total - _LINES_PER_PAGE)
             if start < 0: start = 0
             if start > max_start: start = max_start
 
-        _render_page(lines, start, title)
+        _render_page(pages, start, title)
         while True:
             ch = stdscr.getch()
             if ch in (ord('q'), 27): break
@@ -85,11 +198,10 @@ def view_text_on_oled(text: str, title: str = "Decrypted", export_path: str | No
             elif ch == curses.KEY_NPAGE: start += _LINES_PER_PAGE
             elif ch == curses.KEY_PPAGE: start -= _LINES_PER_PAGE
             elif ch == curses.KEY_HOME:  start  = 0
-            elif ch == curses.KEY_END:   start  = max_start
+            elif ch == curses.KEY_END:   start  = doc.ensure(1 << 62)
             elif ch == ord('s'):
                 try:
-                    with open(export_path, "w", encoding="utf-8") as f:
-                        f.write(text)
+                    save(export_path)
                     _flash(f"Saved: {os.path.basename(export_path)}", title)
                 except Exception:
                     _flash("Save err", title)
@@ -101,6 +213,6 @@ def view_text_on_oled(text: str, title: str = "Decrypted", export_path: str | No
                 except Exception:
                     pass
             clamp()
-            _render_page(lines, start, title)
+            _render_page(pages, start, title)
 
     curses.wrapper(main)
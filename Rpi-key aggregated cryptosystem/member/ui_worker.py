@@ -0,0 +1,109 @@
+# ui_worker.py
+# Background OLED/LED worker. Callers post and return at once; the worker thread owns
+# the display and does the rendering, the I2C push and the "hold for N seconds" waits
+# that used to sit in the crypto path.
+#
+#  - status(lines, leds, hold): LED + text shown for at least `hold` seconds, then LEDs
+#    off. A newer status replaces the current one immediately.
+#  - frame(lines): plain screen (prompt, viewer page). Waits for a running status hold
+#    to end; rapid frames coalesce so only the newest is drawn.
+import time, threading
+import kac_metrics
+
+class UIWorker:
+    def __init__(self, render, leds):
+        self._render = render   # render(lines_or_image) -> pushes one frame
+        self._leds = leds       # leds(green: bool, red: bool)
+        self._cv = threading.Condition()
+        self._status = None
+        self._frame = None
+        self._hold_until = 0.0
+        self._lit = False
+        self._idle = True
+        self._closed = False
+        self._warned = set()
+        self.posted = self.drawn = 0
+        self._t = threading.Thread(target=self._run, name="ui-worker", daemon=True)
+        self._t.start()
+
+    def status(self, lines, leds=(False, False), hold=2.0):
+        with self._cv:
+            self._status = (lines, leds, hold)
+            self.posted += 1
+            self._idle = False
+            self._cv.notify_all()
+
+    def frame(self, lines):
+        with self._cv:
+            self._frame = lines
+            self.posted += 1
+            self._idle = False
+            self._cv.notify_all()
+
+    def flush(self, timeout=None) -> bool:
+        """Wait until everything posted has been shown and any hold has run out."""
+        with self._cv:
+            return self._cv.wait_for(lambda: self._idle, timeout)
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+        self._t.join(timeout)
+
+    def _next(self):
+        with self._cv:
+            while True:
+                if self._status is not None:
+                    item, self._status = ("status", self._status), None
+                    return item
+                wait = self._hold_until - time.monotonic()
+                if wait > 0:
+                    self._cv.wait(wait)
+                    continue
+                if self._lit:
+                    return ("off", None)
+                if self._frame is not None:
+                    item, self._frame = ("frame", self._frame), None
+                    return item
+                if self._closed:
+                    return None
+                self._idle = True
+                self._cv.notify_all()
+                self._cv.wait()
+
+    def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            kind, arg = item
+            if kind == "off":
+                self._lit = False   # cleared first: a failing GPIO must not bring "off" back forever
+                self._set_leds(False, False)
+                continue
+            if kind == "status":
+                arg, (green, red), hold = arg
+                self._lit = green or red
+                self._hold_until = time.monotonic() + hold
+                self._set_leds(green, red)
+            try:
+                with kac_metrics.span("oled.frame"):   # draw + I2C push
+                    self._render(arg)
+                self.drawn += 1
+            except Exception as e:   # a flaky display must not kill the worker
+                self._warn("display", e)
+
+    def _set_leds(self, green, red):
+        try:
+            self._leds(green, red)
+        except Exception as e:
+            self._warn("leds", e)
+
+    def _warn(self, what, e):
+        # once per distinct error, not once per frame
+        key = (what, type(e).__name__, str(e))
+        if key not in self._warned:
+            self._warned.add(key)
+            print(f"[WARN] {what}: {e}")